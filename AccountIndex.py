@@ -0,0 +1,117 @@
+import os  # Index directory
+import struct  # Record fields of the logs
+from KeyTable import KeyTable  # Key digests of the accounts
+from PostingLog import PostingLog  # On-disk logs of the index
+
+
+class AccountIndex():
+    """
+    Optional secondary indexes of the chain for account history queries.
+
+    Keeps, on disk next to the block archive, the position (height and index in the
+    block) of every transaction of an account, and a log of the stake changes of every
+    validator. The entries of a block are added when the block joins the chain and
+    removed again when it is reverted, so the indexes always describe the current chain.
+    Looking up the history of an account takes time proportional to the number of
+    entries read, see PostingLog.
+    """
+    postingFields = struct.Struct('<QI')  # Height of the block and index of the transaction in it
+    stakeFields = struct.Struct('<QIqq')  # Height, transaction index, staked amount and stake afterwards
+
+    def __init__(self, directory):
+        """
+        Initializes empty indexes, creating their directory if needed.
+
+        :param directory: The directory holding the index files
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.postings = PostingLog(os.path.join(directory, 'postings'), AccountIndex.postingFields)
+        self.stakes = PostingLog(os.path.join(directory, 'stakes'), AccountIndex.stakeFields)
+        self.blockLengths = {}  # Maps the heights of the last blocks to the log lengths before them
+
+    def addBlock(self, block, stakeOf):
+        """
+        Adds the transactions of a block that joined the chain.
+
+        :param block: The block
+        :param stakeOf: Returns the stake of a public key after the block
+        """
+        self.blockLengths[block.blockCount] = (self.postings.length, self.stakes.length)
+        stakeChanges = []
+        for index, transaction in enumerate(block.transactions):
+            sender = KeyTable.digest(transaction.senderPublicKey)
+            receiver = KeyTable.digest(transaction.receiverPublicKey)
+            self.postings.append(sender, (block.blockCount, index))
+            if receiver != sender:
+                self.postings.append(receiver, (block.blockCount, index))
+            elif transaction.type == 'STAKE':
+                stakeChanges.append((index, transaction))
+        stakes = {}  # Stake of the validators before each stake change of the block
+        for index, transaction in reversed(stakeChanges):
+            publicKey = transaction.senderPublicKey
+            stakes[publicKey] = stakes.get(publicKey, stakeOf(publicKey) or 0) - transaction.amount
+        for index, transaction in stakeChanges:
+            publicKey = transaction.senderPublicKey
+            stakes[publicKey] += transaction.amount
+            self.stakes.append(KeyTable.digest(publicKey),
+                               (block.blockCount, index, transaction.amount, stakes[publicKey]))
+        self.postings.flush()
+        self.stakes.flush()
+
+    def revertBlock(self, blockCount):
+        """
+        Removes the entries of the last block, which was reverted.
+
+        :param blockCount: The height of the block
+        """
+        postingsLength, stakesLength = self.blockLengths.pop(blockCount)
+        self.postings.truncate(postingsLength)
+        self.stakes.truncate(stakesLength)
+
+    def finalize(self, finalHeight):
+        """
+        Forgets the log lengths of a block that can no longer be reverted.
+
+        :param finalHeight: The height of the block
+        """
+        self.blockLengths.pop(finalHeight, None)
+
+    def transactions(self, digest, cursor=None, limit=None):
+        """
+        Looks up the transactions of an account, newest first.
+
+        :param digest: The key digest of the account
+        :param cursor: The cursor returned with the previous page, None for the first page
+        :param limit: The maximum number of transactions
+        :return: A tuple (positions, next) with the [height, index] of the transactions and the cursor
+                 of the next page, or None if there is none
+        """
+        records, cursor = self.postings.records(digest, cursor, limit)
+        return [list(record) for record in records], cursor
+
+    def stakeChanges(self, digest, cursor=None, limit=None):
+        """
+        Looks up the stake changes of a validator, newest first.
+
+        :param digest: The key digest of the validator
+        :param cursor: The cursor returned with the previous page, None for the first page
+        :param limit: The maximum number of stake changes
+        :return: A tuple (changes, next) with a dictionary per change and the cursor of the next page,
+                 or None if there is none
+        """
+        records, cursor = self.stakes.records(digest, cursor, limit)
+        changes = []
+        for blockCount, index, amount, stake in records:
+            changes.append({'blockCount': blockCount, 'index': index, 'amount': amount, 'stake': stake})
+        return changes, cursor
+
+    def toJson(self):
+        """
+        :return: The number of indexed accounts, transactions and stake changes as a dictionary
+        """
+        data = {}
+        data['accounts'] = len(self.postings.heads)
+        data['postings'] = self.postings.length // self.postings.recordSize
+        data['validators'] = len(self.stakes.heads)
+        data['stakeChanges'] = self.stakes.length // self.stakes.recordSize
+        return data
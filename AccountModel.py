@@ -1,27 +1,34 @@
+from KeyTable import KeyTable  # Imports the table of interned public keys
+
+
 class AccountModel():
     def __init__(self):
         """
         Initializes a new account model.
 
-        This model stores a list of accounts (public keys) and a dictionary of balances.
-        Each account is identified by its unique public key, which is used to track
-        its associated balance.
+        This model stores the accounts and their balances in dictionaries keyed by the
+        digest of the account's public key (see KeyTable.digest), so that every balance
+        operation is a constant time lookup regardless of the number of accounts.
         """
-        self.accounts = []  # List to store public keys of accounts
-        self.balances = {}  # Dictionary to map public keys to their respective balances
+        self.accounts = {}  # Dictionary to map key digests to the public keys of the accounts
+        self.balances = {}  # Dictionary to map key digests to their respective balances
+        self.nonces = {}  # Dictionary to map key digests to the nonce of their next transaction, absent for 0
 
     def addAccount(self, publicKeyString):
         """
         Adds a new account to the model if the public key is not already present.
 
-        If the public key is new, it will be appended to the `accounts` list
+        If the public key is new, it will be added to the `accounts` dictionary
         and initialized with a balance of 0 in the `balances` dictionary.
 
         :param publicKeyString: The public key of the account to be added
+        :return: The digest identifying the account
         """
-        if not publicKeyString in self.accounts:  # Check if the account already exists
-            self.accounts.append(publicKeyString)  # Add the public key to the accounts list
-            self.balances[publicKeyString] = 0  # Initialize the account balance to 0
+        digest = KeyTable.digest(publicKeyString)  # Compact identifier of the account
+        if digest not in self.balances:  # Check if the account already exists
+            self.accounts[digest] = publicKeyString  # Add the public key to the accounts
+            self.balances[digest] = 0  # Initialize the account balance to 0
+        return digest
 
     def getBalance(self, publicKeyString):
         """
@@ -33,9 +40,8 @@ class AccountModel():
         :param publicKeyString: The public key of the account
         :return: The balance of the account
         """
-        if publicKeyString not in self.accounts:  # Check if the account exists
-            self.addAccount(publicKeyString)  # Add the account if it does not exist
-        return self.balances[publicKeyString]  # Return the balance of the account
+        digest = self.addAccount(publicKeyString)  # Add the account if it does not exist
+        return self.balances[digest]  # Return the balance of the account
 
     def updateBalance(self, publicKeyString, amount):
         """
@@ -48,6 +54,96 @@ class AccountModel():
         :param publicKeyString: The public key of the account
         :param amount: The amount to be added to (or subtracted from) the balance
         """
-        if publicKeyString not in self.accounts:  # Check if the account exists
-            self.addAccount(publicKeyString)  # Add the account if it does not exist
-        self.balances[publicKeyString] += amount  # Update the account balance by the specified amount
+        digest = self.addAccount(publicKeyString)  # Add the account if it does not exist
+        self.balances[digest] += amount  # Update the account balance by the specified amount
+
+    def getNonce(self, digest):
+        """
+        Returns the nonce the next transaction of an account must have.
+
+        :param digest: The key digest of the account
+        :return: The number of confirmed transactions the account sent
+        """
+        return self.nonces.get(digest, 0)
+
+    def applyNonces(self, nonces):
+        """
+        Sets the nonces of the senders of a block.
+
+        :param nonces: Dictionary mapping public keys to the nonce of their next transaction
+        """
+        for publicKeyString, nonce in nonces.items():
+            self.nonces[KeyTable.digest(publicKeyString)] = nonce
+
+    def previousNonces(self, publicKeys):
+        """
+        Records the nonces of the given accounts, so a change can be undone with `restoreNonces`.
+
+        :param publicKeys: The public keys of the accounts about to send transactions
+        :return: Dictionary mapping the public keys to their nonce, None for accounts that never sent one
+        """
+        return {publicKeyString: self.nonces.get(KeyTable.digest(publicKeyString)) for publicKeyString in publicKeys}
+
+    def restoreNonces(self, previousNonces):
+        """
+        Puts back nonces recorded by `previousNonces`.
+
+        :param previousNonces: Dictionary mapping public keys to their recorded nonce
+        """
+        for publicKeyString, nonce in previousNonces.items():
+            digest = KeyTable.digest(publicKeyString)
+            if nonce is None:  # The account never sent a transaction
+                self.nonces.pop(digest, None)
+            else:
+                self.nonces[digest] = nonce
+
+    def applyDeltas(self, deltas):
+        """
+        Applies the balance changes of a whole block in one pass.
+
+        The changes of an account are added to its balance one after the other, like
+        `updateBalance` would, so float amounts lead to the same balance.
+
+        :param deltas: Dictionary mapping public keys to the list of their balance changes, in order
+        """
+        for publicKeyString, amounts in deltas.items():
+            digest = self.addAccount(publicKeyString)  # Add the account if it does not exist
+            balance = self.balances[digest]
+            for amount in amounts:
+                balance += amount
+            self.balances[digest] = balance
+
+    def previousValues(self, publicKeys):
+        """
+        Records the balances of the given accounts, so a change can be undone with `restore`.
+
+        :param publicKeys: The public keys of the accounts about to change
+        :return: Dictionary mapping the public keys to their balance, None for accounts that do not exist
+        """
+        return {publicKeyString: self.balances.get(KeyTable.digest(publicKeyString)) for publicKeyString in publicKeys}
+
+    def restore(self, previousValues):
+        """
+        Puts back balances recorded by `previousValues`.
+
+        :param previousValues: Dictionary mapping public keys to their recorded balance
+        """
+        for publicKeyString, balance in previousValues.items():
+            digest = KeyTable.digest(publicKeyString)
+            if balance is None:  # The account did not exist
+                self.accounts.pop(digest, None)
+                self.balances.pop(digest, None)
+            else:
+                self.accounts[digest] = publicKeyString
+                self.balances[digest] = balance
+
+    def orderedAccounts(self):
+        """
+        Iterates over the accounts in the order of their digests.
+
+        The order is the same on every node, independent of when the accounts were created.
+
+        :return: An iterator of (digest, publicKeyString, balance) tuples
+        """
+        for digest in sorted(self.balances):
+            yield digest, self.accounts[digest], self.balances[digest]
@@ -0,0 +1,121 @@
+import asyncio  # Coroutines of the client
+import functools  # Calls handed to the request threads
+from concurrent.futures import ThreadPoolExecutor  # Request threads
+from NodeClient import NodeClient  # Pooled connections, failover and signing
+
+
+class AsyncNodeClient():
+    """
+    asyncio variant of NodeClient, for services that talk to nodes from an event loop.
+
+    The requests run on a pool of threads sharing the keep-alive connections, failover
+    and signing workers of a NodeClient, so the client behaves the same and needs no
+    asyncio HTTP library. As many requests as there are pooled connections per node are
+    sent at the same time.
+    """
+
+    def __init__(self, urls, timeout=5.0, poolSize=10, signingWorkers=None):
+        """
+        Initializes a client.
+
+        :param urls: The base URLs of the node APIs, in order of preference, see NodeClient
+        :param timeout: Seconds to wait for a node to connect and to answer
+        :param poolSize: Number of keep-alive connections kept per node, and of requests sent at the same time
+        :param signingWorkers: Number of signing workers (defaults to the number of CPUs)
+        """
+        self.client = NodeClient(urls, timeout, poolSize, signingWorkers)
+        self.executor = ThreadPoolExecutor(max_workers=poolSize, thread_name_prefix='asyncClient')
+
+    async def call(self, method, *arguments):
+        """
+        Runs a method of the NodeClient on the request threads.
+
+        :param method: The method
+        :param arguments: Its arguments
+        :return: The result of the method
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *arguments))
+
+    async def get(self, path, **params):
+        """
+        :param path: The path of the route, starting with '/'
+        :param params: The query parameters
+        :return: The JSON of the response, see NodeClient.get
+        """
+        return await self.call(functools.partial(self.client.get, path, **params))
+
+    async def nonce(self, digest):
+        """
+        :param digest: The key digest of an account
+        :return: The nonce the next transaction of the account must have, see NodeClient.nonce
+        """
+        return await self.call(self.client.nonce, digest)
+
+    async def syncNonce(self, wallet):
+        """
+        :param wallet: The wallet whose nonce counter continues after its key's transactions, see NodeClient.syncNonce
+        """
+        await self.call(self.client.syncNonce, wallet)
+
+    async def createTransactions(self, requests):
+        """
+        :param requests: List of (wallet, receiverPublicKeyString, amount, type) tuples
+        :return: The signed transactions, see NodeClient.createTransactions
+        """
+        return await self.call(self.client.createTransactions, requests)
+
+    async def submit(self, transaction):
+        """
+        :param transaction: The signed transaction
+        :return: True if a node received it, False if all nodes were busy, see NodeClient.submit
+        """
+        return await self.call(self.client.submit, transaction)
+
+    async def submitBatch(self, transactions):
+        """
+        :param transactions: The signed transactions
+        :return: The status of every transaction, see NodeClient.submitBatch
+        """
+        return await self.call(self.client.submitBatch, transactions)
+
+    async def submitAll(self, transactions, batchSize=100, inFlight=4):
+        """
+        Submits transactions in batches, with several batches in flight at the same time, see NodeClient.submitAll.
+
+        :param transactions: The signed transactions
+        :param batchSize: Number of transactions per request
+        :param inFlight: Number of requests sent at the same time
+        :return: The status of every transaction, in order
+        """
+        slots = asyncio.Semaphore(inFlight)
+
+        async def submitBatch(batch):
+            async with slots:
+                return await self.submitBatch(batch)
+        batches = [transactions[start:start + batchSize] for start in range(0, len(transactions), batchSize)]
+        results = await asyncio.gather(*(submitBatch(batch) for batch in batches))
+        return [status for batchStatuses in results for status in batchStatuses]
+
+    async def events(self, types=('block', 'transaction'), fromHeight=None):
+        """
+        Follows the events of the nodes, see NodeClient.events.
+
+        :param types: The topics of the events
+        :param fromHeight: The height of the first block to send, None for new blocks only
+        :return: An asynchronous generator of (eventType, data) tuples
+        """
+        events = self.client.events(types, fromHeight)
+        try:
+            while True:
+                yield await self.call(next, events)
+        finally:
+            if not events.gi_running:  # Otherwise a request thread is still waiting for the next event
+                events.close()
+
+    def close(self):
+        """
+        Closes the connections and stops the workers.
+        """
+        self.executor.shutdown()
+        self.client.close()
@@ -0,0 +1,663 @@
+from ProofOfStake import ProofOfStake  # Forger election
+from Lottery import Lottery  # Search for the winning lot
+from Wallet import Wallet  # Signing and signature verification
+from Keyring import Keyring  # Batch signing
+from Transaction import Transaction  # Synthetic transactions
+from TransactionPool import TransactionPool  # Pool add/remove
+from Blockchain import Blockchain  # Chain lookups and sync
+from Block import Block  # Synthetic blocks
+from BlockStore import BlockStore  # Block eviction and fault-in
+from BlockArchive import BlockArchive  # Archived blocks
+from AccountIndex import AccountIndex  # Account history lookups
+from KeyTable import KeyTable  # Key digests of the indexed accounts
+from BlockchainUtils import BlockchainUtils  # Encoding and hashing
+from Message import Message  # Chain sync messages
+from SocketConnector import SocketConnector  # Sender of the chain sync messages
+from Node import Node  # Chain sync target
+from NodeAPI import NodeAPI  # Cached API responses
+from StateTree import StateTree  # State root updates
+from ExecutionEngine import ExecutionEngine  # Parallel block execution
+from MerkleTree import MerkleTree  # Transaction inclusion proofs
+import argparse  # Command-line options
+import json  # Results file
+import os  # Working directory handling
+import platform  # Environment details stored with the results
+import statistics  # Median of the measured runs
+import subprocess  # Reads the current git commit
+import sys  # Exit code on regressions
+import tempfile  # Directory of the archived blocks
+import time  # Timers
+import tracemalloc  # Memory measurements
+
+BENCHMARKS = []  # Registered benchmark cases as (name, setup, sizes, fullSizes)
+
+
+def benchmark(name, sizes, fullSizes=None):
+    """
+    Registers a benchmark case.
+
+    The decorated setup function receives the size of the case and returns a tuple
+    `(run, operations)`, where `run` is the callable being timed and `operations`
+    the number of operations a single call performs. A third element, a dictionary of
+    additional metrics, is stored with the result.
+
+    :param name: The name of the benchmark case
+    :param sizes: Sizes measured by default
+    :param fullSizes: Sizes measured with --full (defaults to `sizes`)
+    :return: The decorator
+    """
+    def decorator(setup):
+        BENCHMARKS.append((name, setup, sizes, fullSizes or sizes))
+        return setup
+    return decorator
+
+
+def genesisWallet():
+    """
+    Loads the genesis wallet, the only staker of a fresh chain.
+
+    :return: The genesis wallet
+    """
+    return Wallet('keys/genesisPrivateKey.pem')
+
+
+def syntheticTransactions(count, sender, receiver, signature=''):
+    """
+    Creates unsigned transactions quickly, optionally with a placeholder signature
+    so that their encoded size matches real transactions.
+
+    :param count: Number of transactions to create
+    :param sender: Public key string of the sender
+    :param receiver: Public key string of the receiver
+    :param signature: Signature attached to every transaction
+    :return: A list of transactions
+    """
+    transactions = []
+    for _ in range(count):
+        transaction = Transaction(sender, receiver, 1, 'TRANSFER')
+        transaction.sign(signature)
+        transactions.append(transaction)
+    return transactions
+
+
+def signatureSizes(wallet):
+    """
+    Measures the space the signature scheme of a wallet takes in every transaction.
+
+    :param wallet: The wallet
+    :return: A dictionary with the length of the public key string and of a hex signature
+    """
+    return {'publicKeyChars': len(wallet.publicKeyString()), 'signatureChars': len(wallet.sign('placeholder'))}
+
+
+class Fixtures():
+    # Lazily created objects shared between benchmark cases
+
+    wallets = None
+    ed25519Wallet = None
+
+    @staticmethod
+    def ed25519():
+        """
+        Returns a wallet signing with Ed25519, creating it once.
+
+        :return: The wallet
+        """
+        if Fixtures.ed25519Wallet is None:
+            Fixtures.ed25519Wallet = Wallet(scheme='ed25519')
+        return Fixtures.ed25519Wallet
+
+    @staticmethod
+    def pair():
+        """
+        Returns the genesis wallet and a second wallet, creating them once.
+
+        :return: A tuple (genesisWallet, otherWallet)
+        """
+        if Fixtures.wallets is None:
+            Fixtures.wallets = (genesisWallet(), Wallet('keys/stakerPrivateKey.pem'))
+        return Fixtures.wallets
+
+    @staticmethod
+    def signedTransactions(count):
+        """
+        Creates `count` transactions carrying a real-sized signature.
+
+        :param count: Number of transactions to create
+        :return: A list of transactions
+        """
+        sender, receiver = Fixtures.pair()
+        signature = sender.sign('placeholder')
+        return syntheticTransactions(count, sender.publicKeyString(), receiver.publicKeyString(), signature)
+
+
+class LegacyTransaction():
+    # Layout of a transaction before Transaction used __slots__ and the key table
+
+    def __init__(self, data):
+        self.__dict__.update(data)
+
+
+def receivedCopy(data):
+    """
+    Copies a transaction dictionary the way decoding a received message does,
+    with every string being a separate object.
+
+    :param data: The transaction dictionary
+    :return: The copy
+    """
+    return {key: value.encode().decode() if isinstance(value, str) else value for key, value in data.items()}
+
+
+def bytesPerObject(build, count):
+    """
+    Measures the memory retained by objects.
+
+    :param build: Function creating a list of `count` objects
+    :param count: Number of objects
+    :return: Retained bytes per object
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build(count)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return retained / count
+
+
+@benchmark('transactionMemory', [10000, 100000])
+def transactionMemory(size):
+    """Builds `size` received transactions; reports bytes per transaction now and with the former dict layout."""
+    data = Fixtures.signedTransactions(1)[0].toJson()
+
+    def build(count):
+        transactions = []
+        for _ in range(count):
+            transaction = Transaction.__new__(Transaction)
+            transaction.__setstate__(receivedCopy(data))  # Same path as decoding a received transaction
+            transactions.append(transaction)
+        return transactions
+
+    def buildLegacy(count):
+        return [LegacyTransaction(receivedCopy(data)) for _ in range(count)]
+
+    metrics = {
+        'bytesPerTransaction': bytesPerObject(build, size),
+        'bytesPerTransactionLegacy': bytesPerObject(buildLegacy, size)}
+
+    def run():
+        build(size)
+    return run, size, metrics
+
+
+@benchmark('forgerElection', [10, 100, 1000], [10, 100, 1000, 10000])
+def forgerElection(size):
+    """Forger election with `size` units of total stake spread over ten validators."""
+    pos = ProofOfStake()
+    for validator in range(10):
+        pos.update('validator' + str(validator), max(size // 10, 1))
+    seeds = [BlockchainUtils.hash(str(seed)).hexdigest() for seed in range(10)]
+
+    def run():
+        for seed in seeds:
+            pos.forger(seed)
+    return run, len(seeds)
+
+
+@benchmark('lotteryWinner', [10000, 100000])
+def lotteryWinner(size):
+    """Finds the lot closest to the reference hash among `size` lots, with NumPy when it is installed."""
+    pos = ProofOfStake()
+    for validator in range(10):
+        pos.update('validator' + str(validator), size // 10)
+    seed = BlockchainUtils.hash('seed').hexdigest()
+    buffer, _ = Lottery.digests(pos.stakers, pos.validators, seed)
+    reference = BlockchainUtils.hash(seed).digest()
+
+    def run():
+        Lottery.winnerIndex(buffer, reference)
+    return run, 1, {'numpy': Lottery.useNumpy}
+
+
+@benchmark('sign', [10, 50])
+def sign(size):
+    """Signs the payloads of `size` transactions."""
+    wallet = Fixtures.pair()[0]
+    payloads = [transaction.payload() for transaction in Fixtures.signedTransactions(size)]
+
+    def run():
+        for payload in payloads:
+            wallet.sign(payload)
+    return run, size, signatureSizes(Fixtures.pair()[0])
+
+
+@benchmark('signEd25519', [10, 50])
+def signEd25519(size):
+    """Signs the payloads of `size` transactions with an Ed25519 key, to compare with sign."""
+    wallet = Fixtures.ed25519()
+    payloads = [transaction.payload() for transaction in Fixtures.signedTransactions(size)]
+
+    def run():
+        for payload in payloads:
+            wallet.sign(payload)
+    return run, size, signatureSizes(Fixtures.ed25519())
+
+
+@benchmark('signBatch', [10, 50])
+def signBatch(size):
+    """Signs the payloads of `size` transactions on the keyring's signing workers."""
+    keyring = Keyring()
+    publicKeyString = keyring.add(Fixtures.pair()[0])
+    requests = [(publicKeyString, transaction.payload()) for transaction in Fixtures.signedTransactions(size)]
+
+    def run():
+        keyring.signAll(requests)
+    return run, size
+
+
+@benchmark('signatureValid', [10, 50])
+def signatureValid(size):
+    """Verifies the signatures of `size` transactions."""
+    wallet = Fixtures.pair()[0]
+    transactions = [wallet.createTransaction(wallet.publicKeyString(), 1, 'EXCHANGE') for _ in range(size)]
+
+    def run():
+        for transaction in transactions:
+            Wallet.signatureValid(transaction.payload(), transaction.signature, transaction.senderPublicKey)
+    return run, size
+
+
+@benchmark('signatureValidEd25519', [10, 50])
+def signatureValidEd25519(size):
+    """Verifies the Ed25519 signatures of `size` transactions, to compare with signatureValid."""
+    wallet = Fixtures.ed25519()
+    transactions = [wallet.createTransaction(wallet.publicKeyString(), 1, 'EXCHANGE') for _ in range(size)]
+
+    def run():
+        for transaction in transactions:
+            Wallet.signatureValid(transaction.payload(), transaction.signature, transaction.senderPublicKey)
+    return run, size
+
+
+@benchmark('encodeBlock', [10, 100, 1000])
+def encodeBlock(size):
+    """Encodes a block with `size` transactions."""
+    block = Block(Fixtures.signedTransactions(size), 'lastHash', Fixtures.pair()[0].publicKeyString(), 1)
+
+    def run():
+        BlockchainUtils.encode(block)
+    return run, size
+
+
+@benchmark('decodeBlock', [10, 100, 1000])
+def decodeBlock(size):
+    """Decodes a block with `size` transactions."""
+    block = Block(Fixtures.signedTransactions(size), 'lastHash', Fixtures.pair()[0].publicKeyString(), 1)
+    encodedBlock = BlockchainUtils.encode(block)
+
+    def run():
+        BlockchainUtils.decode(encodedBlock)
+    return run, size
+
+
+@benchmark('hashBlock', [10, 100, 1000])
+def hashBlock(size):
+    """Recomputes the transactions root of a block with `size` transactions and hashes its header."""
+    block = Block(Fixtures.signedTransactions(size), 'lastHash', Fixtures.pair()[0].publicKeyString(), 1)
+
+    def run():
+        block.transactionsRootValid()
+        block.hash()
+    return run, size
+
+
+@benchmark('transactionProof', [100, 1000])
+def transactionProof(size):
+    """Builds and verifies the inclusion proof of the last transaction of a block with `size` transactions."""
+    block = Block(Fixtures.signedTransactions(size), 'lastHash', Fixtures.pair()[0].publicKeyString(), 1)
+    leafHash = MerkleTree.leafHash(block.transactions[-1].toJson())
+
+    def run():
+        siblings = block.transactionProof(size - 1)
+        MerkleTree.verifyProof(block.transactionsRoot, leafHash, size - 1, size, siblings)
+    return run, 1
+
+
+def archivedStore(size, directory):
+    """
+    Builds a block store of `size` blocks with ten transactions each, all of them archived.
+
+    :param size: Number of blocks after the genesis block
+    :param directory: The directory of the archive
+    :return: The block store
+    """
+    sender, receiver = Fixtures.pair()
+    store = BlockStore(Block.genesis(), 1, BlockArchive(directory))
+    for blockCount in range(1, size + 1):
+        transactions = syntheticTransactions(10, sender.publicKeyString(), receiver.publicKeyString(), 'ab' * 128)
+        store.append(Block(transactions, 'lastHash', sender.publicKeyString(), blockCount))
+    return store
+
+
+@benchmark('readArchivedBlock', [100, 1000])
+def readArchivedBlock(size):
+    """Reads 100 evicted blocks of ten transactions from the archive of a chain of `size` blocks, past the LRU cache."""
+    directory = tempfile.TemporaryDirectory()  # Removed once the case is garbage collected
+    store = archivedStore(size, directory.name)
+    heights = [(number * 7919) % size for number in range(100)]
+
+    def run():
+        directory.name  # Keeps the archive alive while the case runs
+        for height in heights:
+            store.block(height)
+    return run, len(heights), {'archiveBytesPerBlock': store.archive.size // size}
+
+
+@benchmark('blockRequest', [10, 100])
+def blockRequest(size):
+    """Encodes the response to a block request for `size` archived blocks of ten transactions."""
+    directory = tempfile.TemporaryDirectory()
+    store = archivedStore(size, directory.name)
+    connector = SocketConnector('localhost', 10001)
+
+    def run():
+        directory.name
+        message = Message(connector, 'BLOCKS', [])
+        BlockchainUtils.encodeWithList(message, store.serialized(1, size + 1, wire=True))
+    return run, size
+
+
+@benchmark('blockchainResponse', [100, 1000])
+def blockchainResponse(size):
+    """Answers 10 API requests for a chain of `size` archived blocks of ten transactions that does not change in between."""
+    directory = tempfile.TemporaryDirectory()
+    node = Node('localhost', 10001)
+    node.blockchain.blocks = archivedStore(size, directory.name)
+    node.blockchain.version = next(Blockchain.versions)  # The blocks changed
+    api = NodeAPI()
+    NodeAPI.register(api.app, route_base='/')
+    client = api.app.test_client()
+
+    def run():
+        directory.name
+        api.injectNode(node)  # The API serves a single node
+        for _ in range(10):
+            client.get('/blockchain').get_data()
+    return run, 10
+
+
+@benchmark('accountHistory', [1000, 10000])
+def accountHistory(size):
+    """Reads the last 50 transactions of an account from the index of a chain of `size` blocks with ten transactions each."""
+    sender, receiver = Fixtures.pair()
+    directory = tempfile.TemporaryDirectory()
+    accountIndex = AccountIndex(directory.name)
+    for blockCount in range(1, size + 1):
+        transactions = syntheticTransactions(10, sender.publicKeyString(), receiver.publicKeyString())
+        accountIndex.addBlock(Block(transactions, 'lastHash', sender.publicKeyString(), blockCount), lambda publicKey: 0)
+    digest = KeyTable.digest(receiver.publicKeyString())
+
+    def run():
+        directory.name
+        accountIndex.transactions(digest, None, 50)
+    return run, 50
+
+
+@benchmark('poolAdd', [10000, 100000], [10000, 100000, 1000000])
+def poolAdd(size):
+    """Admits 100 new transactions (existence check and insert) into a pool holding `size` transactions."""
+    sender, receiver = Fixtures.pair()
+    pool = TransactionPool()
+    for transaction in syntheticTransactions(size, sender.publicKeyString(), receiver.publicKeyString()):
+        pool.addTransaction(transaction)
+
+    def run():
+        for transaction in syntheticTransactions(100, sender.publicKeyString(), receiver.publicKeyString()):
+            if not pool.transactionExists(transaction):
+                pool.addTransaction(transaction)
+    return run, 100
+
+
+@benchmark('poolRemove', [10000, 100000], [10000, 100000, 1000000])
+def poolRemove(size):
+    """Removes a block of 100 transactions from a pool holding `size` transactions."""
+    sender, receiver = Fixtures.pair()
+    transactions = syntheticTransactions(size, sender.publicKeyString(), receiver.publicKeyString())
+    pool = TransactionPool()
+    for transaction in transactions:
+        pool.addTransaction(transaction)
+    blockTransactions = transactions[:100]
+
+    def run():
+        pool.removeFromPool(blockTransactions)
+        for transaction in blockTransactions:
+            pool.addTransaction(transaction)  # Restores the pool for the next run
+    return run, 1
+
+
+@benchmark('transactionExists', [100, 1000], [100, 1000, 10000])
+def transactionExists(size):
+    """Looks up a missing transaction in a chain of `size` blocks with ten transactions each."""
+    sender, receiver = Fixtures.pair()
+    blockchain = Blockchain()
+    for blockCount in range(1, size + 1):
+        transactions = syntheticTransactions(10, sender.publicKeyString(), receiver.publicKeyString())
+        blockchain.blocks.append(Block(transactions, 'lastHash', sender.publicKeyString(), blockCount))
+    missing = syntheticTransactions(1, sender.publicKeyString(), receiver.publicKeyString())[0]
+
+    def run():
+        blockchain.transactionExists(missing)
+    return run, 1
+
+
+@benchmark('executeBlock', [1000, 10000], [1000, 10000, 100000])
+def executeBlock(size):
+    """Executes a block of `size` transfers between `size` distinct accounts."""
+    blockchain = Blockchain()
+    accounts = ['account' + str(number) for number in range(size)]
+    transactions = [Transaction(accounts[number], accounts[(number * 7 + 1) % size], 1, 'TRANSFER')
+                    for number in range(size)]
+
+    def run():
+        blockchain.executeTransactions(transactions)
+    return run, size
+
+
+@benchmark('executeBlockParallel', [10000, 100000])
+def executeBlockParallel(size):
+    """Computes the changes of a block of `size` transfers on two or more workers, checked against one worker."""
+    accounts = ['account' + str(number) for number in range(size)]
+    transactions = [Transaction(accounts[number], accounts[(number * 7 + 1) % size], 1, 'TRANSFER')
+                    for number in range(size)]
+    engine = ExecutionEngine(max(2, os.cpu_count() or 1))
+    expected = ExecutionEngine(1).transactionDeltas(transactions)
+    groups = len(ExecutionEngine.conflictGroups(ExecutionEngine.rows(transactions)))
+
+    def run():
+        if engine.transactionDeltas(transactions) != expected:
+            raise RuntimeError('Parallel execution differs from sequential execution')
+    return run, size, {'groups': groups, 'workers': engine.workerCount}
+
+
+@benchmark('rollbackBlock', [1000, 10000], [1000, 10000, 100000])
+def rollbackBlock(size):
+    """Executes a block of `size` transfers between `size` distinct accounts and restores the state from its undo record."""
+    blockchain = Blockchain()
+    accounts = ['account' + str(number) for number in range(size)]
+    transactions = [Transaction(accounts[number], accounts[(number * 7 + 1) % size], 1, 'TRANSFER')
+                    for number in range(size)]
+
+    def run():
+        blockchain.restore(blockchain.executeTransactions(transactions))
+    return run, size
+
+
+@benchmark('stateTreeUpdate', [10000, 100000])
+def stateTreeUpdate(size):
+    """Updates 100 leaves of a state tree of `size` accounts and recomputes its root."""
+    tree = StateTree()
+    digests = ['%040x' % (number * 0x9e3779b97f4a7c15f39cc0605cedc8341 % (1 << 160)) for number in range(size)]
+    tree.update({digest: [1, 0] for digest in digests})
+    touched = digests[::size // 100]
+    rounds = [0]
+
+    def run():
+        rounds[0] += 1
+        tree.update({digest: [rounds[0], 0] for digest in touched})
+        tree.root()
+    return run, len(touched)
+
+
+@benchmark('chainSync', [10, 50], [10, 50, 200])
+def chainSync(size):
+    """Decodes and applies a received chain of `size` forged blocks on a fresh node."""
+    forger = genesisWallet()  # The only staker, so its blocks pass forger validation
+    blockchain = Blockchain()
+    for _ in range(size):
+        transaction = forger.createTransaction(forger.publicKeyString(), 1, 'EXCHANGE')
+        blockchain.createBlock([transaction], forger)
+    encodedMessage = BlockchainUtils.encode(Message(SocketConnector('localhost', 10001), 'BLOCKCHAIN', blockchain))
+    node = Node('localhost', 10001, 'keys/stakerPrivateKey.pem')
+
+    def run():
+        node.blockchain = Blockchain()
+        message = BlockchainUtils.decode(encodedMessage)
+        node.handleBlockchain(message.data)
+        if len(node.blockchain.blocks) != size + 1:
+            raise RuntimeError('Received chain was not applied')
+    return run, size
+
+
+@benchmark('startNode', [10, 50])
+def startNode(size):
+    """Builds `size` nodes without key files, as a simulator or a test spinning up a network does."""
+    def run():
+        for port in range(size):
+            Node('localhost', 20000 + port)
+    return run, size
+
+
+def measure(run, minTime, repeat):
+    """
+    Times a benchmark run until both `repeat` runs and `minTime` seconds are reached.
+
+    :param run: The callable being timed
+    :param minTime: Minimum total measuring time in seconds
+    :param repeat: Minimum number of runs
+    :return: The list of run durations in seconds
+    """
+    run()  # Warm-up run
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < repeat or time.perf_counter() - started < minTime:
+        start = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def gitCommit():
+    """
+    Reads the commit the benchmarks are run against.
+
+    :return: The commit hash, or None outside of a git checkout
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runBenchmarks(only=None, full=False, minTime=0.2, repeat=3):
+    """
+    Runs the registered benchmark cases.
+
+    :param only: Optional list of case names to run
+    :param full: Also runs the large sizes
+    :param minTime: Minimum measuring time per case and size
+    :param repeat: Minimum number of runs per case and size
+    :return: A list of result dictionaries
+    """
+    results = []
+    for name, setup, sizes, fullSizes in BENCHMARKS:
+        if only and name not in only:
+            continue
+        for size in (fullSizes if full else sizes):
+            run, operations, *metrics = setup(size)
+            durations = measure(run, minTime, repeat)
+            median = statistics.median(durations)
+            result = {
+                'name': name,
+                'size': size,
+                'runs': len(durations),
+                'seconds': median,
+                'best': min(durations),
+                'opsPerSecond': operations / median if median > 0 else None}
+            if metrics:
+                result['metrics'] = metrics[0]
+            results.append(result)
+            print('%-22s %10d %12.6fs %14.1f ops/s %s' % (
+                name, size, median, result['opsPerSecond'] or 0, json.dumps(metrics[0]) if metrics else ''))
+    return results
+
+
+def compareResults(results, baseline, threshold):
+    """
+    Compares results against a baseline results file.
+
+    :param results: The current results
+    :param baseline: The baseline results document
+    :param threshold: Relative slowdown reported as a regression (0.1 = 10%)
+    :return: A list of (name, size, ratio) tuples for the regressions
+    """
+    baselineTimes = {(result['name'], result['size']): result['seconds'] for result in baseline['results']}
+    regressions = []
+    print('\nComparison against ' + str(baseline.get('commit')))
+    for result in results:
+        key = (result['name'], result['size'])
+        if key not in baselineTimes or not baselineTimes[key]:
+            continue
+        ratio = result['seconds'] / baselineTimes[key]
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append((result['name'], result['size'], ratio))
+            flag = '  REGRESSION'
+        print('%-22s %10d %8.2fx%s' % (result['name'], result['size'], ratio, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the node hot paths')
+    parser.add_argument('--output', help='Writes the results to this JSON file')
+    parser.add_argument('--compare', help='Compares the results against this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown reported as a regression')
+    parser.add_argument('--only', help='Comma separated list of cases to run')
+    parser.add_argument('--full', action='store_true', help='Also runs the large sizes (up to 1M pool entries)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum measuring time per case')
+    parser.add_argument('--repeat', type=int, default=3, help='Minimum number of runs per case')
+    parser.add_argument('--list', action='store_true', help='Lists the available cases')
+    arguments = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Key files are read relative to the repository
+    if arguments.list:
+        for name, setup, sizes, fullSizes in BENCHMARKS:
+            print(name + ': ' + setup.__doc__)
+        sys.exit(0)
+
+    only = arguments.only.split(',') if arguments.only else None
+    results = runBenchmarks(only, arguments.full, arguments.min_time, arguments.repeat)
+    document = {
+        'commit': gitCommit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results}
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            json.dump(document, outputFile, indent=2)
+    if arguments.compare:
+        with open(arguments.compare, 'r') as baselineFile:
+            regressions = compareResults(results, json.load(baselineFile), arguments.threshold)
+        if regressions:
+            sys.exit(1)
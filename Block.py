@@ -1,8 +1,15 @@
 import time  # Imports the time module for working with timestamps
-import copy  # Imports the copy module for creating deep copies of objects
+from KeyTable import KeyTable  # Imports the table of interned public keys
+from Transaction import Transaction  # Imports the Transaction class to decode stored blocks
+from MerkleTree import MerkleTree  # Imports the Merkle tree over the block's transactions
+from BlockchainUtils import BlockchainUtils  # Imports the hash function of the block headers
 
 class Block():
-    def __init__(self, transactions, lastHash, forger, blockCount):
+    # Uses __slots__, a forger key interned once the block joins the chain and a raw signature like Transaction
+    __slots__ = ('blockCount', 'transactions', 'lastHash', 'timestamp', 'forgerKeyId', 'stateRoot', 'transactionsRoot',
+                 'signatureBytes')
+
+    def __init__(self, transactions, lastHash, forger, blockCount, stateRoot=''):
         """
         Initializes a new block in the blockchain.
 
@@ -10,14 +17,67 @@ class Block():
         :param lastHash: Hash of the previous block in the chain
         :param forger: The forger (miner) who created this block
         :param blockCount: Total number of blocks in the chain up to this block
+        :param stateRoot: Root of the state tree after executing the block's transactions
         """
         self.blockCount = blockCount  # The block number in the chain
         self.transactions = transactions  # Transactions included in this block
         self.lastHash = lastHash  # Hash of the previous block
         self.timestamp = time.time()  # Time when the block was created (current timestamp)
         self.forger = forger  # Identifier of the forger who created this block
+        self.stateRoot = stateRoot  # Commits the block to the resulting balances and stakes
+        self.transactionsRoot = self.computeTransactionsRoot()  # Commits the header to the transactions
         self.signature = ''  # Digital signature for the block, initially empty
 
+    @property
+    def forger(self):
+        keyId = self.forgerKeyId
+        return KeyTable.keys[keyId] if keyId.__class__ is int else keyId  # Resolves the key once interned
+
+    @forger.setter
+    def forger(self, publicKeyString):
+        self.forgerKeyId = publicKeyString if isinstance(publicKeyString, str) else None  # Fails signature checks
+
+    def intern(self):
+        """
+        Interns the forger key of a block that joined the chain, which then refers to it by id.
+
+        The keys of the transactions are interned when they are executed, see ExecutionEngine.rows.
+        """
+        if self.forgerKeyId.__class__ is not int:
+            self.forgerKeyId = KeyTable.keyId(self.forgerKeyId)
+
+    @property
+    def signature(self):
+        signature = self.signatureBytes
+        return signature if isinstance(signature, str) else signature.hex()  # Signatures travel as hex strings
+
+    @signature.setter
+    def signature(self, signature):
+        try:
+            self.signatureBytes = bytes.fromhex(signature)  # Half the size of the hex string
+        except (TypeError, ValueError):
+            self.signatureBytes = signature  # Kept as received, signature verification rejects it
+
+    def __getstate__(self):
+        state = {}  # Same fields the encoded blocks have always carried
+        state['blockCount'] = self.blockCount
+        state['transactions'] = self.transactions
+        state['lastHash'] = self.lastHash
+        state['timestamp'] = self.timestamp
+        state['forger'] = self.forger
+        state['stateRoot'] = self.stateRoot
+        state['transactionsRoot'] = self.transactionsRoot
+        state['signature'] = self.signature
+        return state
+
+    def __setstate__(self, state):
+        self.stateRoot = ''  # Blocks encoded before state roots were committed have none
+        self.transactionsRoot = ''  # Same for transaction roots, such blocks fail validation
+        for field in ('blockCount', 'transactions', 'lastHash', 'timestamp', 'forger', 'stateRoot',
+                      'transactionsRoot', 'signature'):
+            if field in state:
+                setattr(self, field, state[field])
+
     @staticmethod
     def genesis():
         """
@@ -48,6 +108,11 @@ class Block():
         data['signature'] = self.signature  # Adds the block's signature
         data['forger'] = self.forger  # Adds the forger's identifier
         data['timestamp'] = self.timestamp  # Adds the block's timestamp
+        data['stateRoot'] = self.stateRoot  # Adds the root of the resulting state
+        data['transactionsRoot'] = self.transactionsRoot  # Adds the root of the transactions
+        if self.transactions is None:
+            data['transactions'] = None  # Pruned block, only the header is left
+            return data
         jsonTransactions = []  # List to store transactions in JSON format
         
         # Converts each transaction to JSON and appends it to the list
@@ -57,19 +122,110 @@ class Block():
         data['transactions'] = jsonTransactions  # Adds the list of transactions to the dictionary
         return data  # Returns the dictionary representing the block
 
+    @staticmethod
+    def fromJson(data):
+        """
+        Creates a block from its JSON-like dictionary representation.
+
+        :param data: A dictionary returned by `toJson`
+        :return: The block, header only if the dictionary has no transactions
+        """
+        state = dict(data)
+        if state.get('transactions') is None:
+            state['transactions'] = None
+        else:
+            state['transactions'] = [Transaction.fromJson(transaction) for transaction in state['transactions']]
+        block = Block.__new__(Block)
+        block.__setstate__(state)
+        return block
+
+    def headerOnly(self):
+        """
+        Copies the block without its transactions.
+
+        The copy keeps the header, so it still has the block's hash and signature, and
+        takes little memory however many transactions the block has.
+
+        :return: The header-only block, whose transactions are None
+        """
+        block = Block.__new__(Block)
+        for field in Block.__slots__:
+            setattr(block, field, getattr(self, field))
+        block.transactions = None
+        return block
+
+    def header(self):
+        """
+        Converts the block header into a JSON-like dictionary representation.
+
+        The header holds every field except the transactions, which it commits to through
+        the transactions root. It is all a node needs to follow and verify the chain.
+
+        :return: A dictionary representing the block header
+        """
+        data = {}
+        data['blockCount'] = self.blockCount
+        data['lastHash'] = self.lastHash
+        data['signature'] = self.signature
+        data['forger'] = self.forger
+        data['timestamp'] = self.timestamp
+        data['stateRoot'] = self.stateRoot
+        data['transactionsRoot'] = self.transactionsRoot
+        return data
+
     def payload(self):
         """
-        Creates a representation of the block without its signature.
+        Creates a representation of the block header without its signature.
 
-        This payload is useful for operations where the signature should not be included,
-        such as verifying the block's integrity or generating a new signature.
+        This payload is what the forger signs and what the block hash is computed from.
+        The transactions are only included through the transactions root, so hashing a
+        block does not serialize its transactions.
 
-        :return: A dictionary with block data, excluding the signature
+        :return: A dictionary with the header data, excluding the signature
         """
-        jsonRepresentation = copy.deepcopy(self.toJson())  # Creates a deep copy of the block's JSON representation
+        jsonRepresentation = self.header()  # Creates a fresh copy of the block's header
         jsonRepresentation['signature'] = ''  # Clears the signature field in the copy
         return jsonRepresentation  # Returns the representation without the signature
 
+    def hash(self):
+        """
+        Computes the hash identifying the block, which the next block refers to as its lastHash.
+
+        :return: The hex hash of the block header
+        """
+        return BlockchainUtils.hash(self.payload()).hexdigest()
+
+    def transactionHashes(self):
+        """
+        :return: The Merkle leaf hashes of the block's transactions in order
+        """
+        return [MerkleTree.leafHash(transaction.toJson()) for transaction in self.transactions]
+
+    def computeTransactionsRoot(self):
+        """
+        Computes the Merkle root of the block's transactions.
+
+        :return: The hex transactions root
+        """
+        return MerkleTree.root(self.transactionHashes())
+
+    def transactionsRootValid(self):
+        """
+        Checks that the transactions root in the header matches the block's transactions.
+
+        :return: True if the root matches, False otherwise
+        """
+        return self.transactionsRoot == self.computeTransactionsRoot()
+
+    def transactionProof(self, index):
+        """
+        Builds the inclusion proof of one of the block's transactions.
+
+        :param index: The position of the transaction in the block
+        :return: The sibling hashes in hex, see MerkleTree.verifyProof
+        """
+        return MerkleTree.proof(self.transactionHashes(), index)
+
     def sign(self, signature):
         """
         Adds a digital signature to the block.
@@ -0,0 +1,139 @@
+import json  # Archived blocks are served as JSON
+import mmap  # Segments are read through memory maps
+import os  # Archive files
+import struct  # Records of the offset index
+import threading  # Maps are read by the API threads
+from Block import Block  # Decoding the archived blocks
+from BlockStore import BlockStore  # Serialized forms of the archived blocks
+
+
+class BlockArchive():
+    """
+    On-disk store of the blocks whose bodies were evicted from memory.
+
+    Blocks are kept in their final serialized forms, the JSON served by the API and the
+    jsonpickle encoding sent to peers, appended one after the other to segment files.
+    An index file holds one fixed-size record per height with the segment and offset of
+    the block, so a block is found without scanning. Segments are read through memory
+    maps, and old blocks are served by slicing the maps rather than by decoding and
+    re-encoding them.
+
+    Only final blocks are archived, in order of their heights, so the archive is only
+    ever appended to. The chain is rebuilt from the genesis block when a node starts,
+    so the archive starts out empty as well.
+    """
+    segmentSize = 64 * 1024 * 1024  # Size after which a new segment file is started
+    indexRecord = struct.Struct('<IQII')  # Segment, offset, length of the JSON and length of the wire encoding
+
+    def __init__(self, directory):
+        """
+        Initializes an empty archive, creating its directory if needed.
+
+        :param directory: The directory holding the segment and index files
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        for fileName in os.listdir(directory):
+            if fileName == 'index' or fileName.startswith('segment-'):
+                os.remove(os.path.join(directory, fileName))  # Left by a previous run
+        self.records = []  # Index record of every archived height
+        self.index = open(os.path.join(directory, 'index'), 'ab')
+        self.segment = 0  # Segment blocks are appended to
+        self.segmentFile = open(self.path(0), 'ab')
+        self.segmentLength = 0
+        self.size = 0  # Bytes in all segments
+        self.maps = {}  # Memory maps of the segments
+        self.lock = threading.Lock()  # A map is not closed while it is being read
+
+    def __len__(self):
+        return len(self.records)
+
+    def path(self, segment):
+        """
+        :param segment: The number of a segment
+        :return: The path of the segment's file
+        """
+        return os.path.join(self.directory, f'segment-{segment:05d}')
+
+    def write(self, height, block):
+        """
+        Archives a block.
+
+        :param height: The height of the block, the next height of the archive
+        :param block: The block, with its transactions
+        """
+        if height != len(self.records):
+            raise ValueError('Block ' + str(height) + ' is not the next block of the archive')
+        jsonBytes = BlockStore.serialize(block)
+        wireBytes = BlockStore.serialize(block, wire=True)
+        if self.segmentLength and self.segmentLength + len(jsonBytes) + len(wireBytes) > BlockArchive.segmentSize:
+            self.segmentFile.close()  # Full, its map never changes again
+            self.segment += 1
+            self.segmentFile = open(self.path(self.segment), 'ab')
+            self.segmentLength = 0
+        record = (self.segment, self.segmentLength, len(jsonBytes), len(wireBytes))
+        self.segmentFile.write(jsonBytes)
+        self.segmentFile.write(wireBytes)
+        self.segmentFile.flush()  # Visible to the memory map
+        self.segmentLength += len(jsonBytes) + len(wireBytes)
+        self.size += len(jsonBytes) + len(wireBytes)
+        self.index.write(BlockArchive.indexRecord.pack(*record))
+        self.index.flush()
+        self.records.append(record)
+
+    def map(self, segment, end):
+        """
+        Returns the memory map of a segment, mapping it again if it grew past the old map.
+
+        :param segment: The number of the segment
+        :param end: Offset the map has to reach
+        :return: The memory map
+        """
+        segmentMap = self.maps.get(segment)
+        if segmentMap is None or len(segmentMap) < end:
+            if segmentMap is not None:
+                segmentMap.close()
+            with open(self.path(segment), 'rb') as segmentFile:
+                segmentMap = mmap.mmap(segmentFile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = segmentMap
+        return segmentMap
+
+    def serialized(self, height, wire=False):
+        """
+        Reads the serialized form of an archived block.
+
+        :param height: The height of the block
+        :param wire: Reads the jsonpickle encoding sent to peers instead of the JSON served by the API
+        :return: The UTF-8 encoded block, or None if it was not archived
+        """
+        if not 0 <= height < len(self.records):
+            return None
+        segment, offset, jsonLength, wireLength = self.records[height]
+        if wire:
+            offset, length = offset + jsonLength, wireLength
+        else:
+            length = jsonLength
+        with self.lock:
+            return self.map(segment, offset + length)[offset:offset + length]
+
+    def read(self, height):
+        """
+        Reads an archived block.
+
+        :param height: The height of the block
+        :return: The block, or None if it was not archived
+        """
+        jsonBytes = self.serialized(height)
+        if jsonBytes is None:
+            return None
+        return Block.fromJson(json.loads(jsonBytes))
+
+    def toJson(self):
+        """
+        :return: The number of archived blocks, segments and bytes as a dictionary
+        """
+        data = {}
+        data['blocks'] = len(self.records)
+        data['segments'] = self.segment + 1
+        data['bytes'] = self.size
+        return data
@@ -0,0 +1,191 @@
+from collections import OrderedDict  # Least recently used cache of faulted-in blocks
+import json  # Serialized form of the resident blocks
+from BlockchainUtils import BlockchainUtils  # Wire encoding of the resident blocks
+
+
+class BlockStore():
+    """
+    The blocks of the main chain, indexed by height.
+
+    Only the blocks of the last heights are kept in memory with their transactions. Older
+    blocks keep their header and hash resident, which is all following and validating the
+    chain needs; their bodies are evicted to a BlockArchive on disk, or dropped on a pruned
+    node. Reading an evicted block faults it in from the archive through a small LRU cache,
+    so the resident memory of a long-running node stays bounded.
+
+    Supports the list operations the chain uses: len, indexing and slicing, iteration,
+    append and pop.
+    """
+
+    def __init__(self, genesisBlock, retention=None, archive=None, cacheSize=64):
+        """
+        Initializes a store holding the genesis block.
+
+        :param genesisBlock: The genesis block
+        :param retention: Number of recent blocks kept in memory with their transactions, None keeps every block
+        :param archive: The BlockArchive evicted blocks are written to, None drops their transactions
+        :param cacheSize: Number of faulted-in blocks cached
+        """
+        self.blocks = []  # Block of every height, header only (without transactions) once evicted
+        self.hashes = []  # Hash of the block of every height
+        self.retention = retention
+        self.archive = archive
+        self.cache = OrderedDict()  # Maps heights to blocks read back from the archive
+        self.cacheSize = cacheSize
+        self.evictedHeight = 0  # Blocks below this height have their transactions evicted
+        self.append(genesisBlock)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.block(height) for height in range(*index.indices(len(self.blocks)))]
+        if index < 0:
+            index += len(self.blocks)
+        if not 0 <= index < len(self.blocks):
+            raise IndexError('Block height out of range')
+        return self.block(index)
+
+    def __iter__(self):
+        for height in range(len(self.blocks)):
+            yield self.block(height)
+
+    def __reversed__(self):
+        for height in reversed(range(len(self.blocks))):
+            yield self.block(height)
+
+    def block(self, height):
+        """
+        Returns the block of a height, reading it from the archive if it was evicted.
+
+        :param height: The height of the block
+        :return: The block, header only if its transactions were dropped
+        """
+        if height >= self.evictedHeight:
+            return self.blocks[height]
+        block = self.cache.get(height)
+        if block is not None:
+            self.cache.move_to_end(height)
+            return block
+        if self.archive is not None:
+            block = self.archive.read(height)
+        if block is None:
+            return self.blocks[height]  # Pruned, only the header is left
+        self.cache[height] = block
+        if len(self.cache) > self.cacheSize:
+            self.cache.popitem(last=False)  # Drops the least recently used block
+        return block
+
+    def header(self, height):
+        """
+        Returns the block of a height without reading it from the archive.
+
+        :param height: The height of the block
+        :return: The block, header only if its transactions were evicted
+        """
+        return self.blocks[height]
+
+    def hasTransactions(self, height):
+        """
+        :param height: The height of a block
+        :return: False if the transactions of the block were dropped, True otherwise
+        """
+        return height >= self.evictedHeight or self.archive is not None
+
+    def hash(self, height):
+        """
+        :param height: The height of a block, negative heights count from the end
+        :return: The hash of the block
+        """
+        return self.hashes[height]
+
+    def serialized(self, start=0, stop=None, wire=False):
+        """
+        Serializes a range of blocks, taking archived blocks as they are stored.
+
+        The resident blocks of the range are taken when the method is called, so the
+        blocks can be serialized later without holding the chain's lock; archived blocks
+        never change.
+
+        :param start: The height of the first block
+        :param stop: The height after the last block, the end of the chain by default
+        :param wire: Serializes the blocks with the jsonpickle encoding sent to peers instead of the JSON of the API
+        :return: A generator of the UTF-8 encoded blocks
+        """
+        start, stop, _ = slice(start, stop).indices(len(self.blocks))
+        evictedHeight = self.evictedHeight
+        archive = self.archive
+        resident = self.blocks[max(start, evictedHeight):stop]
+
+        def generate():
+            for height in range(start, min(stop, evictedHeight)):
+                serializedBlock = archive.serialized(height, wire) if archive is not None else None
+                if serializedBlock is None:
+                    serializedBlock = BlockStore.serialize(self.blocks[height], wire)  # Pruned header
+                yield serializedBlock
+            for block in resident:
+                yield BlockStore.serialize(block, wire)
+        return generate()
+
+    @staticmethod
+    def serialize(block, wire=False):
+        """
+        :param block: A block
+        :param wire: Uses the jsonpickle encoding sent to peers instead of the JSON of the API
+        :return: The UTF-8 encoded block, the same bytes BlockArchive stores
+        """
+        if wire:
+            return BlockchainUtils.encode(block).encode('utf-8')
+        return json.dumps(block.toJson(), separators=(',', ':')).encode('utf-8')
+
+    def append(self, block, blockHash=None):
+        """
+        Adds a block at the next height and evicts the transactions of the blocks that left the retention window.
+
+        :param block: The block
+        :param blockHash: The hash of the block, if already computed
+        """
+        self.blocks.append(block)
+        self.hashes.append(blockHash or block.hash())
+        if self.retention is not None:
+            while len(self.blocks) - self.evictedHeight > self.retention:
+                self.evict(self.evictedHeight)
+                self.evictedHeight += 1
+
+    def evict(self, height):
+        """
+        Archives a block and keeps only its header in memory.
+
+        :param height: The height of the block
+        """
+        block = self.blocks[height]
+        if self.archive is not None:
+            self.archive.write(height, block)
+        self.blocks[height] = block.headerOnly()
+
+    def pop(self):
+        """
+        Removes the last block.
+
+        :return: The removed block
+        """
+        if len(self.blocks) <= self.evictedHeight:
+            raise ValueError('Block ' + str(len(self.blocks) - 1) + ' was evicted and cannot be removed')
+        self.hashes.pop()
+        return self.blocks.pop()
+
+    def toJson(self):
+        """
+        :return: The retention settings and the number of resident, evicted and cached blocks as a dictionary
+        """
+        data = {}
+        data['height'] = len(self.blocks) - 1
+        data['retention'] = self.retention
+        data['archived'] = self.archive is not None
+        data['evicted'] = self.evictedHeight
+        data['resident'] = len(self.blocks) - self.evictedHeight
+        data['cached'] = len(self.cache)
+        if self.archive is not None:
+            data['archive'] = self.archive.toJson()
+        return data
@@ -0,0 +1,231 @@
+from collections import OrderedDict  # Orphans are evicted oldest first
+
+
+class BlockTree():
+    """
+    Every block a node knows about, organized as a tree rooted at the genesis block.
+
+    Besides the main chain, the tree keeps competing branches, so the node can switch to
+    one of them when it becomes the better chain, and orphan blocks whose parent has not
+    arrived yet, which are connected as soon as it does.
+
+    Fork choice: the best chain is the one with the most blocks, ties are broken by the
+    lowest block hash. Every node picks the same chain out of the same set of blocks,
+    whatever order they arrived in.
+
+    Once blocks are final, the tree forgets them: its root moves up to the last final block
+    of the main chain, so the tree only ever holds the recent blocks. Blocks of competing
+    branches are not validated until the node switches to them, so their number is
+    bounded too: beyond `maxSideBlocks`, the tips of the worst branches are dropped.
+    """
+
+    def __init__(self, genesisBlock, maxOrphans=1024, maxSideBlocks=1024):
+        """
+        Initializes a tree holding only the genesis block.
+
+        :param genesisBlock: The genesis block
+        :param maxOrphans: Number of orphan blocks kept at most
+        :param maxSideBlocks: Number of connected blocks off the main chain kept at most
+        """
+        genesisHash = genesisBlock.hash()
+        self.blocks = {genesisHash: genesisBlock}  # Maps hashes to the blocks connected to the tree
+        self.children = {}  # Maps hashes to the hashes of their child blocks
+        self.tips = {genesisHash}  # Hashes of the connected blocks without children
+        self.invalid = set()  # Hashes of blocks that failed validation, and of their descendants
+        self.orphans = OrderedDict()  # Maps hashes to blocks whose parent is unknown
+        self.orphansByParent = {}  # Maps missing parent hashes to the hashes of the orphans waiting for them
+        self.maxOrphans = maxOrphans
+        self.maxSideBlocks = maxSideBlocks
+        self.rootHeight = 0  # Height of the oldest main chain block still in the tree
+
+    def known(self, blockHash):
+        """
+        :param blockHash: A block hash
+        :return: True if the block is connected, orphaned or known to be invalid
+        """
+        return blockHash in self.blocks or blockHash in self.orphans or blockHash in self.invalid
+
+    def insert(self, block, blockHash=None):
+        """
+        Adds a block to the tree.
+
+        A block whose parent is unknown is kept as an orphan. A connected block also
+        connects the orphans waiting for it, and recursively theirs.
+
+        :param block: The block to add
+        :param blockHash: The hash of the block, if already computed
+        :return: The hashes of the newly connected blocks, parents first, an empty list if
+                 the block was known or invalid, or None if the block is an orphan
+        """
+        if blockHash is None:
+            blockHash = block.hash()
+        if self.known(blockHash):
+            return []
+        if block.lastHash in self.invalid:
+            self.invalid.add(blockHash)  # Descendants of invalid blocks are invalid
+            return []
+        if block.lastHash not in self.blocks:
+            self.addOrphan(block, blockHash)
+            return None
+        connected = []
+        pending = [(block, blockHash)]
+        while pending:
+            block, blockHash = pending.pop()
+            if not self.connect(block, blockHash):
+                continue
+            connected.append(blockHash)
+            for orphanHash in self.orphansByParent.pop(blockHash, []):
+                orphan = self.orphans.pop(orphanHash, None)
+                if orphan is not None:
+                    pending.append((orphan, orphanHash))
+        return connected
+
+    def connect(self, block, blockHash):
+        """
+        Connects a block to its parent.
+
+        :param block: The block, whose parent must be connected
+        :param blockHash: The hash of the block
+        :return: True if the block was connected, False if its height does not follow its parent's
+        """
+        parent = self.blocks[block.lastHash]
+        if block.blockCount != parent.blockCount + 1:
+            self.invalid.add(blockHash)
+            return False
+        self.blocks[blockHash] = block
+        self.children.setdefault(block.lastHash, []).append(blockHash)
+        self.tips.discard(block.lastHash)
+        self.tips.add(blockHash)
+        return True
+
+    def addOrphan(self, block, blockHash):
+        """
+        Keeps a block whose parent is unknown, evicting the oldest orphan if there are too many.
+
+        :param block: The orphan block
+        :param blockHash: The hash of the block
+        """
+        if len(self.orphans) >= self.maxOrphans:
+            evictedHash, evicted = self.orphans.popitem(last=False)
+            waiting = self.orphansByParent.get(evicted.lastHash, [])
+            if evictedHash in waiting:
+                waiting.remove(evictedHash)
+                if not waiting:
+                    del self.orphansByParent[evicted.lastHash]
+        self.orphans[blockHash] = block
+        self.orphansByParent.setdefault(block.lastHash, []).append(blockHash)
+
+    def markInvalid(self, blockHash):
+        """
+        Removes a block that failed validation from the tree, together with its descendants.
+
+        :param blockHash: The hash of the invalid block
+        """
+        self.remove(blockHash, True)
+
+    def remove(self, blockHash, invalid=False):
+        """
+        Removes a block from the tree, together with its descendants.
+
+        :param blockHash: The hash of the block
+        :param invalid: True to remember the blocks as invalid, False to accept them again later
+        """
+        block = self.blocks.get(blockHash)
+        if block is None:
+            return
+        siblings = self.children.get(block.lastHash, [])
+        if blockHash in siblings:
+            siblings.remove(blockHash)
+        if not siblings and block.lastHash in self.blocks:
+            self.tips.add(block.lastHash)  # The parent is a tip again
+        pending = [blockHash]
+        while pending:
+            currentHash = pending.pop()
+            self.blocks.pop(currentHash, None)
+            self.tips.discard(currentHash)
+            if invalid:
+                self.invalid.add(currentHash)
+            pending.extend(self.children.pop(currentHash, []))
+
+    def limitSideBlocks(self, chain):
+        """
+        Drops the tips of the worst competing branches while more than `maxSideBlocks` blocks are off the chain.
+
+        :param chain: The BlockStore of the chain, whose blocks from the root of the tree on are in the tree
+        """
+        sideBlocks = len(self.blocks) - (len(chain) - self.rootHeight)
+        if sideBlocks <= self.maxSideBlocks:
+            return
+        chainTip = chain.hash(-1)
+        while sideBlocks > self.maxSideBlocks:
+            worstHash = min((tipHash for tipHash in self.tips if tipHash != chainTip),
+                            key=lambda tipHash: BlockTree.preferred(self.blocks[tipHash], tipHash))
+            self.remove(worstHash)
+            sideBlocks -= 1
+
+    def prune(self, finalHeight, chain):
+        """
+        Drops the branches that fork from the chain below its final height, and the final
+        blocks of the chain except the last one, which becomes the root of the tree.
+
+        The chain can no longer switch to those branches, so their blocks are marked invalid.
+
+        :param finalHeight: Height of the last block of the chain that cannot be reverted
+        :param chain: The BlockStore of the chain
+        """
+        for tipHash in list(self.tips):
+            if tipHash not in self.tips:
+                continue  # Dropped together with another branch
+            forkHeight, blocks = self.branch(tipHash, chain)
+            if blocks and forkHeight < finalHeight:
+                self.markInvalid(blocks[0].hash())
+        for height in range(self.rootHeight, finalHeight):
+            blockHash = chain.hash(height)
+            self.blocks.pop(blockHash, None)
+            self.children.pop(blockHash, None)
+        self.rootHeight = max(self.rootHeight, finalHeight)
+
+    @staticmethod
+    def preferred(block, blockHash):
+        """
+        :param block: A block
+        :param blockHash: The hash of the block
+        :return: The fork choice sort key of a chain ending in this block, the best chain has the largest
+        """
+        return block.blockCount, -int(blockHash, 16)
+
+    def bestTip(self):
+        """
+        :return: The hash of the last block of the best chain in the tree
+        """
+        return max(self.tips, key=lambda tipHash: BlockTree.preferred(self.blocks[tipHash], tipHash))
+
+    def branch(self, blockHash, chain):
+        """
+        Finds where a block's branch leaves a chain.
+
+        :param blockHash: The hash of a connected block
+        :param chain: The BlockStore of the chain
+        :return: A tuple (forkHeight, blocks) with the height of the last common block and
+                 the blocks of the branch after it, parents first
+        """
+        blocks = []
+        block = self.blocks[blockHash]
+        while not (block.blockCount < len(chain) and chain.hash(block.blockCount) == blockHash):
+            blocks.append(block)
+            blockHash = block.lastHash
+            block = self.blocks[blockHash]
+        blocks.reverse()
+        return block.blockCount, blocks
+
+    def toJson(self):
+        """
+        :return: A summary of the branches and orphans as a dictionary
+        """
+        data = {}
+        data['blocks'] = len(self.blocks)
+        data['tips'] = [{'hash': tipHash, 'blockCount': self.blocks[tipHash].blockCount}
+                        for tipHash in sorted(self.tips, key=lambda tipHash: self.blocks[tipHash].blockCount)]
+        data['orphans'] = len(self.orphans)
+        data['invalid'] = len(self.invalid)
+        return data
@@ -1,28 +1,114 @@
+from collections import OrderedDict  # Imports the ordered dictionary for the bounded forger cache
+import itertools  # Imports the counter of chain versions
 from Block import Block  # Imports the Block class
-from BlockchainUtils import BlockchainUtils  # Imports utilities for blockchain operations
+from BlockTree import BlockTree  # Imports the tree of known blocks and branches
+from BlockStore import BlockStore  # Imports the store of the main chain's blocks
 from AccountModel import AccountModel  # Imports the account management system
 from ProofOfStake import ProofOfStake  # Imports the Proof-of-Stake system
+from PendingState import PendingState  # Imports the overlay of unconfirmed balance changes
+from StateTree import StateTree  # Imports the Merkle tree committing to the balances and stakes
+from KeyTable import KeyTable  # Imports the table of interned public keys
+from UndoRecord import UndoRecord  # Imports the record of the state a block changed
+from ExecutionEngine import ExecutionEngine  # Imports the engine computing the changes of a block
+from Tracer import tracer  # Imports the process-wide tracer for hot-path timings
 
 class Blockchain():
-    def __init__(self):
+    finalityDepth = 100  # Number of recent blocks that can still be reverted
+    maxRememberedForgers = 64  # Number of elected forgers kept
+    executionEngine = ExecutionEngine()  # Shared by the chains of the process, like its worker pool
+    versions = itertools.count()  # Versions of the chains of the process, never handed out twice
+
+    def __init__(self, retention=None, archive=None, accountIndex=None):
         """
         Initializes a new instance of the blockchain.
 
         The constructor sets up the genesis block, an account model for balance management,
-        and a Proof of Stake (PoS) system to determine block forgers.
+        and a Proof of Stake (PoS) system to determine block forgers, and the state tree
+        whose root every block commits to.
+
+        :param retention: Number of recent blocks kept in memory with their transactions, None keeps every
+                          block; at least the blocks that can still be reverted are kept
+        :param archive: The BlockArchive the transactions of older blocks are moved to, None drops them
+        :param accountIndex: Optional AccountIndex kept up to date with the chain
         """
-        self.blocks = [Block.genesis()]  # Creates a list of blocks starting with the genesis block
+        if retention is not None:
+            retention = max(retention, Blockchain.finalityDepth + 1)  # Reverted blocks go back to the pool
+        self.blocks = BlockStore(Block.genesis(), retention, archive)  # Stores the blocks starting with the genesis block
+        self.blockTree = BlockTree(self.blocks[0])  # Keeps competing branches and orphans next to the main chain
         self.accountModel = AccountModel()  # Initializes the account model for managing balances
         self.pos = ProofOfStake()  # Sets up the Proof-of-Stake mechanism
+        self.stateTree = StateTree()  # Merkle tree over the balances and stakes
+        self.updateStateTree(self.pos.validators.values())  # Adds the genesis stake
+        self.undoRecords = {}  # Maps the heights of the last blocks to their undo records
+        self.forgers = OrderedDict()  # Maps hashes of chain tips to the elected forger of the block after them
+        self.accountIndex = accountIndex  # Transactions and stake changes of every account
+        self.version = next(Blockchain.versions)  # Changes whenever a block joins or leaves the chain
 
     def addBlock(self, block):
         """
         Adds a new block to the blockchain and executes its transactions.
 
+        The block is only added if the state its transactions lead to has the state
+        root the block commits to. Otherwise the state is restored from the block's undo record.
+
         :param block: The block to be added
+        :return: True if the block was added, False otherwise
+        """
+        undoRecord = self.executeTransactions(block.transactions)  # Executes the block's transactions
+        if self.stateRoot() != block.stateRoot:
+            print('State root of the block does not match')
+            self.restore(undoRecord)  # Restores the previous state
+            return False
+        blockHash = block.hash()
+        block.intern()  # Its forger key is shared with the forger's other blocks from now on
+        self.blocks.append(block, blockHash)  # Appends the block to the blockchain
+        self.version = next(Blockchain.versions)
+        self.blockTree.insert(block, blockHash)  # Known to the tree already unless added directly
+        self.keepUndoRecord(block, undoRecord)
+        return True
+
+    def keepUndoRecord(self, block, undoRecord):
+        """
+        Keeps the undo record of a block added to the chain and drops the one that became final.
+
+        Branches forking below the final height are pruned from the block tree from time to time.
+
+        :param block: The block added to the chain
+        :param undoRecord: The undo record returned by executeTransactions
+        """
+        self.undoRecords[block.blockCount] = undoRecord
+        finalHeight = block.blockCount - Blockchain.finalityDepth
+        self.undoRecords.pop(finalHeight, None)
+        if self.accountIndex is not None:
+            self.accountIndex.addBlock(block, self.pos.get)
+            self.accountIndex.finalize(finalHeight)
+        if finalHeight > 0 and finalHeight % Blockchain.finalityDepth == 0:
+            self.blockTree.prune(finalHeight, self.blocks)
+
+    def revertBlock(self):
         """
-        self.executeTransactions(block.transactions)  # Executes the block's transactions
-        self.blocks.append(block)  # Appends the block to the blockchain
+        Removes the last block from the blockchain and restores the state before it.
+
+        Takes time proportional to the number of accounts the block changed.
+
+        :return: The removed block
+        """
+        undoRecord = self.undoRecords.get(self.blocks[-1].blockCount)
+        if undoRecord is None:
+            raise ValueError('Block ' + str(self.blocks[-1].blockCount) + ' is final and cannot be reverted')
+        del self.undoRecords[self.blocks[-1].blockCount]
+        self.restore(undoRecord)
+        if self.accountIndex is not None:
+            self.accountIndex.revertBlock(self.blocks[-1].blockCount)
+        self.version = next(Blockchain.versions)
+        return self.blocks.pop()
+
+    def __getstate__(self):
+        # A blockchain sent to a peer only carries its blocks, the receiver replays them
+        return {'blocks': list(self.blocks)}
+
+    def __setstate__(self, state):
+        self.blocks = state['blocks']
 
     def toJson(self):
         """
@@ -37,6 +123,171 @@ class Blockchain():
         data['blocks'] = jsonBlocks  # Stores all blocks in the 'data' dictionary
         return data
 
+    def blockValid(self, block):
+        """
+        Runs the checks of a block that depend on the chain it extends.
+
+        :param block: The block to be validated, extending the last block
+        :return: True if the block is valid on top of the current chain, False otherwise
+        """
+        return (self.blockCountValid(block) and self.lastBlockHashValid(block) and self.forgerValid(block)
+                and self.transactionsValid(block.transactions))
+
+    def receiveBlock(self, block):
+        """
+        Adds a received block to the block tree and follows the best chain.
+
+        The block may extend the chain, start or extend a competing branch, or be an
+        orphan. If the best chain changes, only the blocks after the fork point are
+        reverted and the blocks of the new branch are validated and applied.
+
+        :param block: The received block, with a valid signature and transactions root
+        :return: A tuple (status, reverted, applied) where status is 'extended', 'reorg', 'side', 'orphan',
+                 'known' or 'invalid', and reverted and applied are the blocks that left and joined the chain
+        """
+        blockHash = block.hash()
+        if block.blockCount <= self.blockTree.rootHeight:
+            # Final heights, which the tree no longer holds
+            if block.blockCount < len(self.blocks) and self.blocks.hash(block.blockCount) == blockHash:
+                return 'known', [], []
+            return 'invalid', [], []
+        if self.blockTree.known(blockHash):
+            return 'known', [], []
+        connected = self.blockTree.insert(block, blockHash)
+        if connected is None:
+            return 'orphan', [], []
+        if not connected:
+            return 'invalid', [], []
+        tipHash = self.blocks.hash(-1)
+        self.chooseFork()
+        self.blockTree.limitSideBlocks(self.blocks)
+        if blockHash in self.blockTree.invalid:
+            return 'invalid', [], []
+        forkHeight, reverted = self.blockTree.branch(tipHash, self.blocks)
+        applied = self.blocks[forkHeight + 1:]
+        if reverted:
+            return 'reorg', reverted, applied
+        if applied:
+            return 'extended', reverted, applied
+        return 'side', reverted, applied
+
+    def chooseFork(self):
+        """
+        Switches to the best valid chain of the block tree.
+
+        Branches that turn out to contain invalid blocks are dropped from the tree and the
+        next best chain is tried.
+        """
+        while True:
+            bestHash = self.blockTree.bestTip()
+            if bestHash == self.blocks.hash(-1):
+                return
+            self.switchBranch(bestHash)
+
+    def switchBranch(self, tipHash):
+        """
+        Replaces the blocks after the fork point with the branch ending in the given block.
+
+        Branches that would revert final blocks are dropped, and so are branches whose first
+        block was not forged by the forger elected at the fork point, which is checked before
+        any block is reverted: the branch's blocks are not validated when they are received,
+        so anyone could otherwise make the node revert and replay its recent blocks.
+
+        :param tipHash: The hash of the last block of the branch
+        :return: True if the branch was applied, False if one of its blocks is invalid and the chain was restored
+        """
+        forkHeight, branch = self.blockTree.branch(tipHash, self.blocks)
+        if len(self.blocks) - 1 - forkHeight > Blockchain.finalityDepth:
+            print('Branch forks below the final blocks')
+            self.blockTree.markInvalid(branch[0].hash())
+            return False
+        if forkHeight < len(self.blocks) - 1 and branch[0].forger != self.forkForger(forkHeight):
+            print('Branch starts with a block of a forger that was not elected')
+            self.blockTree.markInvalid(branch[0].hash())
+            return False
+        reverted = []
+        while len(self.blocks) > forkHeight + 1:
+            reverted.append(self.revertBlock())
+        reverted.reverse()
+        for index, block in enumerate(branch):
+            if not self.blockValid(block) or not self.addBlock(block):
+                self.blockTree.markInvalid(block.hash())  # Drops the block and its descendants
+                for _ in range(index):
+                    self.revertBlock()
+                for revertedBlock in reverted:
+                    self.addBlock(revertedBlock)  # Was valid on this chain before
+                return False
+        return True
+
+    def locator(self):
+        """
+        Describes the chain to a peer that should send the blocks this node is missing.
+
+        :return: A list of [blockCount, hash] pairs, the last blocks first, then exponentially sparser back to genesis
+        """
+        locator = []
+        height = len(self.blocks) - 1
+        step = 1
+        while height > 0:
+            locator.append([height, self.blocks.hash(height)])
+            if len(locator) >= 10:
+                step *= 2
+            height -= step
+        locator.append([0, self.blocks.hash(0)])
+        return locator
+
+    def heightsAfter(self, locator, limit):
+        """
+        Finds the heights of the blocks a peer is missing, according to its locator.
+
+        :param locator: A list of [blockCount, hash] pairs from the peer's Blockchain.locator
+        :param limit: The maximum number of blocks
+        :return: The range of heights after the highest block the peer also has, empty if the
+                 transactions of the first of these blocks were pruned
+        """
+        for height, blockHash in locator:
+            if 0 <= height < len(self.blocks) and self.blocks.hash(height) == blockHash:
+                if not self.blocks.hasTransactions(height + 1):
+                    return range(0)  # Pruned, peers cannot validate the blocks without their transactions
+                return range(height + 1, min(height + 1 + limit, len(self.blocks)))
+        return range(0)
+
+    def blocksAfter(self, locator, limit):
+        """
+        Returns the blocks a peer is missing, according to its locator.
+
+        :param locator: A list of [blockCount, hash] pairs from the peer's Blockchain.locator
+        :param limit: The maximum number of blocks to return
+        :return: The blocks of this chain after the highest block the peer also has
+        """
+        heights = self.heightsAfter(locator, limit)
+        return self.blocks[heights.start:heights.stop]
+
+    def serializedJson(self, chunkSize=65536):
+        """
+        Serializes the blockchain into the JSON of `toJson`, in chunks.
+
+        Archived blocks are copied as they are stored instead of being decoded and
+        encoded again. The blocks are taken when the method is called, see BlockStore.serialized.
+
+        :param chunkSize: Size of the chunks in bytes, a chunk holds at least one block
+        :return: A generator of UTF-8 encoded chunks
+        """
+        serializedBlocks = self.blocks.serialized()
+
+        def generate():
+            chunk = bytearray(b'{"blocks":[')
+            for index, serializedBlock in enumerate(serializedBlocks):
+                if index:
+                    chunk += b','
+                chunk += serializedBlock
+                if len(chunk) >= chunkSize:
+                    yield bytes(chunk)
+                    chunk.clear()
+            chunk += b']}'
+            yield bytes(chunk)
+        return generate()
+
     def blockCountValid(self, block):
         """
         Checks if the block count of the proposed block is valid.
@@ -56,8 +307,7 @@ class Blockchain():
         :param block: The block to be validated
         :return: True if the hash is valid, False otherwise
         """
-        latestBlockchainBlockHash = BlockchainUtils.hash(
-            self.blocks[-1].payload()).hexdigest()  # Calculates the hash of the last block
+        latestBlockchainBlockHash = self.blocks.hash(-1)  # Gets the hash of the last block
         if latestBlockchainBlockHash == block.lastHash:
             return True  # Hash matches
         else:
@@ -65,42 +315,149 @@ class Blockchain():
 
     def getCoveredTransactionSet(self, transactions):
         """
-        Filters out transactions that are "covered" (i.e., valid based on the sender's balance).
+        Filters out transactions that are "covered" (i.e., valid based on the sender's balance)
+        and in sequence (i.e., carrying the sender's next nonce).
+
+        Transactions are checked in order against the balances and nonces left by the
+        transactions accepted before them, so a sender cannot overspend within one block,
+        and a transaction that is already confirmed, or twice in the list, is left out.
 
         :param transactions: The list of transactions to filter
         :return: A list of covered transactions
         """
         coveredTransactions = []
+        pendingState = PendingState(credits=True)  # Balance changes of the accepted transactions
         for transaction in transactions:
-            if self.transactionCovered(transaction):
+            if not self.nonceValid(transaction, pendingState):
+                print('Transaction is out of sequence')  # Logs replayed, duplicate or early transactions
+            elif self.transactionCovered(transaction, pendingState):
                 coveredTransactions.append(transaction)  # Adds covered transaction to the list
+                pendingState.apply(transaction)  # Later transactions see its balance and nonce changes
             else:
                 print('Transaction is not covered by sender')  # Logs invalid transactions
         return coveredTransactions
 
-    def transactionCovered(self, transaction):
+    def nextNonce(self, digest, pendingState=None):
+        """
+        Returns the nonce the next transaction of an account must have.
+
+        :param digest: The key digest of the account
+        :param pendingState: Optional overlay of unconfirmed transactions to take into account
+        :return: The nonce of the account's next transaction
+        """
+        confirmedNonce = self.accountModel.getNonce(digest)
+        if pendingState is None:
+            return confirmedNonce
+        return pendingState.nonce(digest, confirmedNonce)
+
+    def nonceValid(self, transaction, pendingState=None):
+        """
+        Checks that a transaction is the next one of its sender.
+
+        :param transaction: The transaction to validate
+        :param pendingState: Optional overlay of unconfirmed transactions to take into account
+        :return: True if the nonce of the transaction follows the sender's last transaction
+        """
+        return transaction.nonce == self.nextNonce(KeyTable.digest(transaction.senderPublicKey), pendingState)
+
+    def transactionCovered(self, transaction, pendingState=None):
         """
         Checks if a transaction is covered by the sender's balance.
 
         :param transaction: The transaction to validate
+        :param pendingState: Optional overlay of unconfirmed balance changes to take into account
         :return: True if the transaction is covered, False otherwise
         """
         if transaction.type == 'EXCHANGE':
             return True  # EXCHANGE transactions are always covered
         senderBalance = self.accountModel.getBalance(transaction.senderPublicKey)  # Gets the sender's balance
+        if pendingState is not None:
+            senderBalance += pendingState.delta(transaction.senderPublicKey)  # Subtracts the pending spend
         if senderBalance >= transaction.amount:
             return True  # Balance is sufficient
         else:
             return False  # Balance is insufficient
 
+    @tracer.stage('executeTransactions')
     def executeTransactions(self, transactions):
         """
         Executes a list of transactions by updating account balances.
 
+        The balance and stake changes of every touched account are collected first and
+        then applied in one pass, so each account is looked up once per block.
+
         :param transactions: The transactions to be executed
+        :return: The UndoRecord with the previous values of the changed balances, stakes and nonces
         """
-        for transaction in transactions:
-            self.executeTransaction(transaction)  # Executes each transaction individually
+        balanceDeltas, stakeDeltas, nonces = self.transactionDeltas(transactions)  # Changes of the whole list
+        undoRecord = UndoRecord(self.accountModel.previousValues(balanceDeltas.keys()),
+                                self.pos.previousValues(stakeDeltas.keys()),
+                                self.accountModel.previousNonces(nonces.keys()))  # Journals the touched keys only
+        try:
+            self.pos.applyDeltas(stakeDeltas)  # Updates the stakes
+            self.accountModel.applyDeltas(balanceDeltas)  # Updates the balances
+            self.accountModel.applyNonces(nonces)  # Advances the nonces of the senders
+            self.updateStateTree(undoRecord.publicKeys())  # Rehashes the touched paths only
+        except Exception:
+            self.restore(undoRecord)  # Leaves no partially applied block behind
+            raise
+        return undoRecord
+
+    def restore(self, undoRecord):
+        """
+        Restores the balances and stakes recorded in an undo record.
+
+        :param undoRecord: The UndoRecord returned by executeTransactions
+        """
+        self.pos.restore(undoRecord.stakes)
+        self.accountModel.restore(undoRecord.balances)
+        self.accountModel.restoreNonces(undoRecord.nonces)
+        self.updateStateTree(undoRecord.publicKeys())
+
+    def updateStateTree(self, publicKeys):
+        """
+        Updates the state tree leaves of the given accounts.
+
+        The leaf of an account holds its balance, stake and nonce. Accounts with none of
+        them are left out of the tree, so the root only depends on the non-empty accounts.
+
+        :param publicKeys: The public keys of the accounts whose state changed
+        """
+        changes = {}
+        for publicKeyString in publicKeys:
+            digest = KeyTable.digest(publicKeyString)
+            balance = self.accountModel.balances.get(digest, 0)
+            stake = self.pos.stakers.get(digest, 0)
+            nonce = self.accountModel.getNonce(digest)
+            changes[digest] = [balance, stake, nonce] if balance or stake or nonce else None
+        self.stateTree.update(changes)
+
+    def stateRoot(self):
+        """
+        :return: The hex root of the state tree
+        """
+        return self.stateTree.root()
+
+    def stateProof(self, digest):
+        """
+        Builds the inclusion proof of an account's balance, stake and nonce.
+
+        :param digest: The key digest of the account
+        :return: A dictionary with the state root, the leaf value and the sibling hashes, or None for unknown accounts
+        """
+        siblings = self.stateTree.proof(digest)
+        if siblings is None:
+            return None
+        balance, stake, nonce = self.stateTree.get(digest)
+        proof = {}
+        proof['blockCount'] = self.blocks[-1].blockCount
+        proof['stateRoot'] = self.stateRoot()
+        proof['digest'] = digest
+        proof['balance'] = balance
+        proof['stake'] = stake
+        proof['nonce'] = nonce
+        proof['siblings'] = siblings
+        return proof
 
     def executeTransaction(self, transaction):
         """
@@ -108,19 +465,21 @@ class Blockchain():
 
         :param transaction: The transaction to be executed
         """
-        if transaction.type == 'STAKE':
-            sender = transaction.senderPublicKey
-            receiver = transaction.receiverPublicKey
-            if sender == receiver:  # For staking, sender and receiver must be the same account
-                amount = transaction.amount
-                self.pos.update(sender, amount)  # Updates the stake
-                self.accountModel.updateBalance(sender, -amount)  # Deducts the staked amount from the sender's balance
-        else:
-            sender = transaction.senderPublicKey
-            receiver = transaction.receiverPublicKey
-            amount = transaction.amount
-            self.accountModel.updateBalance(sender, -amount)  # Deducts the amount from the sender
-            self.accountModel.updateBalance(receiver, amount)  # Adds the amount to the receiver
+        self.executeTransactions([transaction])
+
+    def transactionDeltas(self, transactions):
+        """
+        Computes the balance and stake changes of a list of transactions.
+
+        Large blocks are split into groups of transactions touching disjoint accounts,
+        whose changes are computed in parallel, see ExecutionEngine.
+
+        :param transactions: The transactions to be executed
+        :return: A tuple (balanceDeltas, stakeDeltas, nonces) of dictionaries mapping public keys to the list
+                 of their balance changes in order, to their net stake change, and to the nonce of the
+                 sender's next transaction
+        """
+        return Blockchain.executionEngine.transactionDeltas(transactions)
 
     def nextForger(self):
         """
@@ -128,10 +487,58 @@ class Blockchain():
 
         :return: The public key of the next forger
         """
-        lastBlockHash = BlockchainUtils.hash(self.blocks[-1].payload()).hexdigest()  # Gets the last block's hash
-        nextForger = self.pos.forger(lastBlockHash)  # Determines the next forger
+        lastBlockHash = self.blocks.hash(-1)  # Gets the last block's hash
+        nextForger = self.forger(lastBlockHash)  # Determines the next forger
         return nextForger
 
+    def forger(self, lastBlockHash):
+        """
+        Returns the forger of the block after the given block, running the lottery if it was not elected yet.
+
+        Elections are remembered by the hash of the block they follow: the stakes, and so
+        the lottery, only depend on the chain ending in that block.
+
+        :param lastBlockHash: The hash of the block the next block extends
+        :return: The public key of the forger
+        """
+        forger = self.forgers.get(lastBlockHash)
+        if forger is None:
+            forger = self.pos.forger(lastBlockHash)
+            if lastBlockHash == self.blocks.hash(-1):  # The stakes belong to this block
+                self.rememberForger(lastBlockHash, forger)
+        return forger
+
+    def forkForger(self, forkHeight):
+        """
+        Returns the forger of the block after a block of the chain, without reverting the blocks after it.
+
+        The stakes the lottery runs on are those of a snapshot, which the undo records of the
+        later blocks are applied to, latest first.
+
+        :param forkHeight: The height of a block of the chain that can still be reverted to
+        :return: The public key of the forger
+        """
+        lastBlockHash = self.blocks.hash(forkHeight)
+        forger = self.forgers.get(lastBlockHash)
+        if forger is None:
+            stakes = self.pos.snapshot()
+            for height in range(len(self.blocks) - 1, forkHeight, -1):
+                stakes.restore(self.undoRecords[height].stakes)
+            forger = stakes.forger(lastBlockHash)
+            self.rememberForger(lastBlockHash, forger)
+        return forger
+
+    def rememberForger(self, lastBlockHash, forger):
+        """
+        Remembers the elected forger of the block after the given block.
+
+        :param lastBlockHash: The hash of the block the next block extends
+        :param forger: The public key of the elected forger
+        """
+        self.forgers[lastBlockHash] = forger
+        while len(self.forgers) > Blockchain.maxRememberedForgers:
+            self.forgers.popitem(last=False)  # Drops the oldest election
+
     def createBlock(self, transactionsFromPool, forgerWallet):
         """
         Creates a new block from available transactions and the forger's wallet.
@@ -141,24 +548,55 @@ class Blockchain():
         :return: The newly created block
         """
         coveredTransactions = self.getCoveredTransactionSet(transactionsFromPool)  # Gets covered transactions
-        self.executeTransactions(coveredTransactions)  # Executes the covered transactions
-        newBlock = forgerWallet.createBlock(
-            coveredTransactions, BlockchainUtils.hash(self.blocks[-1].payload()).hexdigest(), len(self.blocks))
-        self.blocks.append(newBlock)  # Adds the new block to the blockchain
+        undoRecord = self.executeTransactions(coveredTransactions)  # Executes the covered transactions
+        try:
+            newBlock = forgerWallet.createBlock(
+                coveredTransactions, self.blocks.hash(-1), len(self.blocks), self.stateRoot())
+        except Exception:
+            self.restore(undoRecord)  # The block was not created, neither are its changes
+            raise
+        newBlockHash = newBlock.hash()
+        newBlock.intern()
+        self.blocks.append(newBlock, newBlockHash)  # Adds the new block to the blockchain
+        self.version = next(Blockchain.versions)
+        self.blockTree.insert(newBlock, newBlockHash)
+        self.keepUndoRecord(newBlock, undoRecord)
         return newBlock
 
     def transactionExists(self, transaction):
         """
         Checks if a transaction already exists in the blockchain.
 
+        The sender's transactions are confirmed in nonce order, so the transaction, or
+        another one of its sender with the same nonce, is in the chain exactly when its
+        nonce is below the sender's. No history of transaction ids is needed.
+
         :param transaction: The transaction to check
-        :return: True if the transaction exists, False otherwise
+        :return: True if the transaction's nonce is used in the chain, False otherwise
         """
-        for block in self.blocks:
-            for blockTransaction in block.transactions:
-                if transaction.equals(blockTransaction):
-                    return True  # Transaction exists
-        return False  # Transaction does not exist
+        return transaction.nonce < self.accountModel.getNonce(KeyTable.digest(transaction.senderPublicKey))
+
+    @staticmethod
+    def transactionProof(block, transactionId):
+        """
+        Builds the inclusion proof of a transaction in a block.
+
+        :param block: The block holding the transaction, fetched by its height
+        :param transactionId: The id of the transaction
+        :return: A dictionary with the block header, the transaction, its position and the sibling hashes,
+                 or None if the transaction is not in the block
+        """
+        for index, transaction in enumerate(block.transactions or []):  # Pruned blocks have none
+            if transaction.id == transactionId:
+                proof = {}
+                proof['header'] = block.header()
+                proof['blockHash'] = block.hash()
+                proof['transaction'] = transaction.toJson()
+                proof['index'] = index
+                proof['size'] = len(block.transactions)
+                proof['siblings'] = block.transactionProof(index)
+                return proof
+        return None
 
     def forgerValid(self, block):
         """
@@ -167,13 +605,14 @@ class Blockchain():
         :param block: The block to validate
         :return: True if the forger is valid, False otherwise
         """
-        forgerPublicKey = self.pos.forger(block.lastHash)  # Gets the expected forger for the block
+        forgerPublicKey = self.forger(block.lastHash)  # Gets the expected forger for the block
         proposedBlockForger = block.forger  # Gets the forger proposed in the block
         if forgerPublicKey == proposedBlockForger:
             return True  # Forger is valid
         else:
             return False  # Forger is invalid
 
+    @tracer.stage('transactionsValid')
     def transactionsValid(self, transactions):
         """
         Validates a set of transactions to ensure they are covered.
@@ -1,6 +1,7 @@
 from Crypto.Hash import SHA256  # Importing the SHA256 hashing algorithm
 import json  # Module for JSON serialization and deserialization
 import jsonpickle  # Library for serializing and deserializing Python objects
+from Tracer import tracer  # Process-wide tracer for hot-path timings
 
 class BlockchainUtils():
     @staticmethod
@@ -27,6 +28,7 @@ class BlockchainUtils():
         return jsonpickle.encode(objectToEncode, unpicklable=True)  # Returns the encoded representation
 
     @staticmethod
+    @tracer.stage('decode')
     def decode(encodedObject):
         """
         Decodes an object that was encoded using jsonpickle.
@@ -35,3 +37,21 @@ class BlockchainUtils():
         :return: The original object
         """
         return jsonpickle.decode(encodedObject)  # Returns the decoded object
+
+    @staticmethod
+    def encodeWithList(objectToEncode, encodedItems):
+        """
+        Encodes an object whose last encoded value is an empty list, filling the list with items encoded beforehand.
+
+        The items are spliced into the encoding as they are, so the result is the same as
+        encoding the object with the decoded items in its list, without decoding them.
+
+        :param objectToEncode: The object to be encoded, e.g. a message with an empty list as its data
+        :param encodedItems: The jsonpickle encodings of the items as UTF-8 bytes
+        :return: The encoded representation of the object as UTF-8 bytes
+        """
+        encoded = BlockchainUtils.encode(objectToEncode).encode('utf-8')
+        body = encoded.rstrip(b'}')  # The list may be nested in several objects
+        if not body.endswith(b'[]'):
+            raise ValueError('The last encoded value of the object is not an empty list')
+        return body[:-1] + b', '.join(encodedItems) + b']' + encoded[len(body):]
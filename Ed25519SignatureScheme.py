@@ -0,0 +1,60 @@
+from Crypto.PublicKey import ECC  # Ed25519 key generation and management
+from Crypto.Signature import eddsa  # Ed25519 signature scheme
+from SignatureScheme import SignatureScheme
+
+
+class Ed25519SignatureScheme(SignatureScheme):
+    """
+    Ed25519 signatures (RFC 8032) over the SHA-256 hash of the payload.
+
+    Public keys are the 32 raw key bytes written as 64 hex characters and signatures are
+    64 bytes, shrinking every transaction by several hundred characters. Signing is about three
+    times faster than with RSA-2048, key generation is instant; verifying is slower with
+    pycryptodome, as RSA verification with its small public exponent is cheap.
+    """
+
+    name = 'ed25519'
+    maxPublicKeys = 4096  # Number of imported public keys kept at most
+
+    def __init__(self):
+        self.publicKeys = {}  # Maps public key strings to imported keys
+
+    def generate(self):
+        return ECC.generate(curve='ed25519')
+
+    def importPrivateKey(self, keyString):
+        key = ECC.import_key(keyString)
+        if key.curve != 'Ed25519' or not key.has_private():
+            raise ValueError('Not an Ed25519 private key')
+        return key
+
+    def exportPrivateKey(self, key):
+        return key.export_key(format='PEM')
+
+    def publicKeyString(self, key):
+        return key.public_key().export_key(format='raw').hex()
+
+    def ownsPublicKey(self, publicKeyString):
+        if len(publicKeyString) != 64:
+            return False
+        try:
+            bytes.fromhex(publicKeyString)
+        except ValueError:
+            return False
+        return True
+
+    def sign(self, key, dataHash):
+        return eddsa.new(key, 'rfc8032').sign(dataHash.digest())
+
+    def verify(self, publicKeyString, dataHash, signature):
+        publicKey = self.publicKeys.get(publicKeyString)
+        if publicKey is None:
+            publicKey = eddsa.import_public_key(bytes.fromhex(publicKeyString))
+            if len(self.publicKeys) >= Ed25519SignatureScheme.maxPublicKeys:
+                self.publicKeys.clear()
+            self.publicKeys[publicKeyString] = publicKey
+        try:
+            eddsa.new(publicKey, 'rfc8032').verify(dataHash.digest(), signature)
+        except ValueError:
+            return False  # The signature does not match
+        return True
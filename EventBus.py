@@ -0,0 +1,154 @@
+import itertools  # Ids of the subscriptions
+import json  # Data of the events
+import queue  # Events waiting to be sent to a subscriber
+import threading  # Subscriptions are shared by the node and the API threads
+
+
+class EventBus():
+    """
+    Pushes chain and pool events of a node to its API subscribers as Server-Sent Events.
+
+    An event is serialized once when it is published, and the same bytes are queued for
+    every subscriber of its topic, so publishing costs little per subscriber and nothing
+    when there is none. A subscriber that does not keep up is dropped once its queue is
+    full; it can reconnect and resume from the last block it got.
+
+    Topics:
+    - 'block': a 'block' event with the header, hash and transaction ids of every block
+      that joins the chain, and a 'revert' event for every block that leaves it in a
+      reorg. The id of these events is the height of the chain's tip after them, so a
+      client resuming with Last-Event-ID gets the blocks after the last one it has.
+    - 'transaction': a 'transaction' event for every transaction admitted into the pool.
+    """
+    topics = {'block', 'transaction'}  # Topics a subscriber can choose from
+    maxSubscribers = 100  # Number of subscriptions at the same time
+    maxQueuedEvents = 10000  # Number of events waiting for a subscriber before it is dropped
+    keepaliveInterval = 15  # Seconds without events after which a comment is sent, so dead clients are noticed
+    retryInterval = 3000  # Milliseconds a client waits before reconnecting
+
+    def __init__(self):
+        self.subscribers = {}  # Maps subscription ids to (event queue, topics)
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def format(eventType, data, eventId=None):
+        """
+        :param eventType: The type of the event
+        :param data: The data of the event, serialized as JSON
+        :param eventId: The id of the event, None to keep the client's last event id
+        :return: The event in the Server-Sent Events format, UTF-8 encoded
+        """
+        event = 'event: ' + eventType + '\ndata: ' + json.dumps(data, separators=(',', ':')) + '\n\n'
+        if eventId is not None:
+            event = 'id: ' + str(eventId) + '\n' + event
+        return event.encode('utf-8')
+
+    @staticmethod
+    def blockEvent(block, blockHash):
+        """
+        :param block: A block that joined the chain
+        :param blockHash: The hash of the block
+        :return: The 'block' event of the block, with the ids of its transactions (None if they were pruned)
+        """
+        data = block.header()
+        data['hash'] = blockHash
+        if block.transactions is None:
+            data['transactions'] = None
+        else:
+            data['transactions'] = [transaction.id for transaction in block.transactions]
+        return EventBus.format('block', data, block.blockCount)
+
+    def subscribe(self, topics):
+        """
+        Adds a subscriber, which gets the events published from now on.
+
+        :param topics: The topics of the events the subscriber gets
+        :return: The id of the subscription, or None if there are too many subscribers
+        """
+        with self.lock:
+            if len(self.subscribers) >= EventBus.maxSubscribers:
+                return None
+            subscriptionId = next(self.ids)
+            self.subscribers[subscriptionId] = (queue.Queue(EventBus.maxQueuedEvents), frozenset(topics))
+            return subscriptionId
+
+    def unsubscribe(self, subscriptionId):
+        """
+        :param subscriptionId: The id of the subscription to end
+        """
+        with self.lock:
+            self.subscribers.pop(subscriptionId, None)
+
+    def publish(self, topic, event):
+        """
+        Queues an event for the subscribers of its topic, dropping subscribers whose queue is full.
+
+        :param topic: The topic of the event
+        :param event: The event, see `format`
+        """
+        with self.lock:
+            for subscriptionId, (events, topics) in list(self.subscribers.items()):
+                if topic not in topics:
+                    continue
+                try:
+                    events.put_nowait(event)
+                except queue.Full:
+                    del self.subscribers[subscriptionId]  # Its stream ends, the client resumes from its last block
+                    print('Dropping event subscriber ' + str(subscriptionId) + ', it does not keep up')
+
+    def blocksChanged(self, reverted, applied):
+        """
+        Publishes the blocks that left and joined the chain.
+
+        :param reverted: The blocks removed from the chain, in chain order
+        :param applied: The blocks added to the chain, in chain order
+        """
+        if not self.subscribers:
+            return
+        for block in reversed(reverted):  # The tip is removed first
+            data = {'blockCount': block.blockCount, 'hash': block.hash()}
+            self.publish('block', EventBus.format('revert', data, block.blockCount - 1))
+        for block in applied:
+            self.publish('block', EventBus.blockEvent(block, block.hash()))
+
+    def transactionsAdmitted(self, transactions):
+        """
+        Publishes transactions admitted into the pool.
+
+        :param transactions: The transactions
+        """
+        if not self.subscribers:
+            return
+        for transaction in transactions:
+            self.publish('transaction', EventBus.format('transaction', transaction.toJson()))
+
+    def stream(self, subscriptionId, replayed=()):
+        """
+        Streams the events of a subscription until the client disconnects or is dropped.
+
+        :param subscriptionId: The id of the subscription, ended when the stream is closed
+        :param replayed: Events sent before the ones published since the subscription, e.g. past blocks
+        :return: A generator of UTF-8 encoded events and keepalive comments
+        """
+        with self.lock:
+            events = self.subscribers[subscriptionId][0]
+
+        def generate():
+            try:
+                yield ('retry: ' + str(EventBus.retryInterval) + '\n\n').encode('utf-8')
+                yield from replayed
+                while True:
+                    try:
+                        event = events.get(timeout=EventBus.keepaliveInterval)
+                    except queue.Empty:
+                        if subscriptionId not in self.subscribers:
+                            return  # Dropped, the queue was full
+                        yield b': keepalive\n\n'
+                        continue
+                    if subscriptionId not in self.subscribers:
+                        return  # Dropped, the events left in the queue are incomplete
+                    yield event
+            finally:
+                self.unsubscribe(subscriptionId)
+        return generate()
@@ -0,0 +1,182 @@
+import os  # Default number of execution workers
+import multiprocessing  # Start method of the execution workers
+from concurrent.futures import ProcessPoolExecutor  # Execution worker pool
+from concurrent.futures.process import BrokenProcessPool  # Worker pool whose workers died
+from KeyTable import KeyTable  # Public keys of the interned key ids
+
+
+class ExecutionEngine():
+    """
+    Computes the balance, stake and nonce changes of a block's transactions.
+
+    The transactions are split into conflict-free groups: two transactions are in the
+    same group if they share a sender or receiver key, directly or through other
+    transactions. Groups touch disjoint accounts, so their changes can be computed
+    independently, on a pool of worker processes for large blocks, and merged without
+    any ordering question. Within a group the transactions keep their order in the
+    block, so the result is the same as executing the block one transaction after the
+    other.
+
+    The balance changes of an account are kept as a list in the order of the
+    transactions, not summed up: amounts may be floats, whose sum depends on the order
+    of the additions, so only adding them to the balance one after the other gives the
+    balance the block leads to bit for bit. Stakes are only changed by whole amounts
+    (see Transaction.wellFormed), whose sum is exact.
+
+    Transactions are passed to the workers as rows of interned key ids (see KeyTable),
+    which are much smaller to send than the public keys.
+
+    Sending the rows to the workers and the changes back costs more than computing them
+    for the blocks measured so far (see Benchmark's executeBlockParallel), so blocks are
+    executed in the calling thread unless workers are asked for. If the worker pool
+    breaks, e.g. because the workers cannot import the node's main module, the engine
+    goes on without it.
+    """
+    parallelThreshold = 5000  # Number of transactions of a block from which the workers are used
+
+    def __init__(self, workers=1):
+        """
+        Initializes an execution engine.
+
+        :param workers: Number of execution worker processes, None for the number of CPUs; with a
+                        single worker every block is executed in the calling thread
+        """
+        self.workerCount = workers or os.cpu_count() or 1  # Number of execution workers
+        self.executor = None  # Execution worker pool, see `start`
+
+    def start(self):
+        """
+        Starts the worker pool, if the engine has workers.
+
+        Nodes start it before they take requests, so the pool is not started by the first
+        large block, while the node's lock is held.
+        """
+        if self.workerCount > 1 and self.executor is None:
+            # Nodes run many threads, which forking the node itself does not go well with
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+            self.executor = ProcessPoolExecutor(max_workers=self.workerCount, mp_context=context)
+
+    def stop(self):
+        """
+        Stops the worker pool, blocks are executed in the calling thread from then on.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.workerCount = 1
+
+    @staticmethod
+    def rows(transactions):
+        """
+        :param transactions: The transactions, whose keys are interned as they are executed
+        :return: A (senderKeyId, receiverKeyId, amount, type, nonce) row per transaction
+        """
+        for transaction in transactions:
+            transaction.intern()
+        return [(transaction.senderKeyId, transaction.receiverKeyId, transaction.amount, transaction.type,
+                 transaction.nonce) for transaction in transactions]
+
+    @staticmethod
+    def deltas(rows):
+        """
+        Computes the balance and stake changes of transaction rows, in order.
+
+        :param rows: The rows of the transactions, see `rows`
+        :return: A tuple (balanceDeltas, stakeDeltas, nonces) of dictionaries mapping key ids to the list
+                 of their balance changes in order, to their net stake change, and to the nonce of the
+                 sender's next transaction
+        """
+        balanceDeltas = {}
+        stakeDeltas = {}
+        nonces = {}
+        for sender, receiver, amount, type, nonce in rows:
+            nonces[sender] = nonce + 1  # The sender's transactions are in sequence
+            if type == 'STAKE':
+                if sender == receiver:  # For staking, sender and receiver must be the same account
+                    stakeDeltas[sender] = stakeDeltas.get(sender, 0) + amount  # Adds to the stake
+                    balanceDeltas.setdefault(sender, []).append(-amount)  # Deducts the staked amount
+            else:
+                balanceDeltas.setdefault(sender, []).append(-amount)  # Deducts the amount from the sender
+                balanceDeltas.setdefault(receiver, []).append(amount)  # Adds the amount to the receiver
+        return balanceDeltas, stakeDeltas, nonces
+
+    @staticmethod
+    def conflictGroups(rows):
+        """
+        Splits transaction rows into groups that touch disjoint keys, with a union-find over the keys.
+
+        :param rows: The rows of the transactions, see `rows`
+        :return: The groups as lists of row positions in increasing order, ordered by their first row
+        """
+        parents = {}  # Maps key ids to a key of the same group, the root maps to itself
+
+        def find(key):
+            root = key
+            while parents[root] != root:
+                root = parents[root]
+            while parents[key] != root:  # Shortens the path for the next lookups
+                parents[key], key = root, parents[key]
+            return root
+
+        for sender, receiver, _, _, _ in rows:
+            parents.setdefault(sender, sender)
+            parents.setdefault(receiver, receiver)
+            senderRoot, receiverRoot = find(sender), find(receiver)
+            if senderRoot != receiverRoot:
+                parents[receiverRoot] = senderRoot
+        groups = {}  # Maps roots to the positions of their rows, in order of the first row
+        for position, row in enumerate(rows):
+            groups.setdefault(find(row[0]), []).append(position)
+        return list(groups.values())
+
+    def partition(self, rows):
+        """
+        Packs the conflict groups of transaction rows into one batch per worker.
+
+        Larger groups are placed first, each on the batch with the fewest rows so far (the
+        first one on ties), so the result only depends on the rows.
+
+        :param rows: The rows of the transactions, see `rows`
+        :return: The batches of rows, the groups of a batch touching keys no other batch touches
+        """
+        groups = ExecutionEngine.conflictGroups(rows)
+        batches = [[] for _ in range(min(self.workerCount, len(groups)))]
+        for group in sorted(groups, key=lambda group: (-len(group), group[0])):
+            batch = min(batches, key=len)
+            batch.extend(group)
+        return [[rows[position] for position in sorted(batch)] for batch in batches]
+
+    def transactionDeltas(self, transactions):
+        """
+        Computes the balance and stake changes of a list of transactions.
+
+        :param transactions: The transactions to be executed
+        :return: A tuple (balanceDeltas, stakeDeltas, nonces) of dictionaries mapping public keys to the list
+                 of their balance changes in order, to their net stake change, and to the nonce of the
+                 sender's next transaction
+        """
+        rows = ExecutionEngine.rows(transactions)
+        results = None
+        if self.workerCount > 1 and len(rows) >= ExecutionEngine.parallelThreshold:
+            try:
+                self.start()
+                results = list(self.executor.map(ExecutionEngine.deltas, self.partition(rows)))
+            except (BrokenProcessPool, OSError, RuntimeError) as error:
+                print('Execution workers failed, executing blocks without them: ' + repr(error))
+                self.stop()
+        if results is None:
+            results = [ExecutionEngine.deltas(rows)]
+        keys = KeyTable.keys
+        merged = ({}, {}, {})
+        for result in results:  # The batches touch disjoint keys, so merging is a union
+            for deltas, mergedDeltas in zip(result, merged):
+                for keyId, value in deltas.items():
+                    mergedDeltas[keys[keyId]] = value
+        if len(results) > 1:
+            # New stakers join in the order of their first stake in the block, which the lots are drawn in
+            stakers = dict.fromkeys(keys[sender] for sender, receiver, _, type, _ in rows
+                                    if type == 'STAKE' and sender == receiver)
+            merged = (merged[0], {publicKeyString: merged[1][publicKeyString] for publicKeyString in stakers},
+                      merged[2])
+        return merged
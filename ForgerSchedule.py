@@ -0,0 +1,102 @@
+import threading  # Background election thread
+from Tracer import tracer  # Process-wide tracer for hot-path timings
+
+
+class ForgerSchedule():
+    """
+    Background election of the forger of the next block.
+
+    Whenever the chain tip changes, the lottery for the next height is run on a snapshot
+    of the stakes in a background thread, and its result is cached in the blockchain by
+    the hash of the tip. Forging and validating the next block then only look the forger
+    up. If this node is the next forger and transactions are already waiting in the pool,
+    the block is forged right away instead of waiting for the next transaction.
+    """
+
+    def __init__(self, node):
+        """
+        Initializes a stopped schedule.
+
+        :param node: The node whose chain is followed
+        """
+        self.node = node  # Node providing the blockchain, the wallet and forge()
+        self.condition = threading.Condition()  # Signals a new tip to the election thread
+        self.pending = None  # (lastBlockHash, blockCount, stake snapshot) waiting for the election
+        self.thread = None  # Election thread
+        self.running = False  # Whether the election thread is running
+        self.counters = {'scheduled': 0, 'elected': 0, 'forged': 0}
+
+    def start(self):
+        """
+        Starts the election thread and schedules the election for the current tip.
+        """
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='forger-schedule', daemon=True)
+        self.thread.start()
+        with self.node.lock:
+            self.schedule()
+
+    def stop(self):
+        """
+        Stops the election thread.
+        """
+        if not self.running:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.thread = None
+
+    def schedule(self):
+        """
+        Schedules the election of the forger after the current tip.
+
+        Must be called with the node lock held, right after the chain changed.
+        """
+        blockchain = self.node.blockchain
+        lastBlockHash = blockchain.blocks.hash(-1)
+        if not self.running or lastBlockHash in blockchain.forgers:
+            return  # Elected inline when needed, or already elected, e.g. on a branch we switched back to
+        with self.condition:
+            # Replaces an outdated election that has not started yet
+            self.pending = (lastBlockHash, len(blockchain.blocks), blockchain.pos.snapshot())
+            self.counters['scheduled'] += 1
+            self.condition.notify()
+
+    def run(self):
+        """
+        Runs the elections scheduled by `schedule`.
+        """
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                lastBlockHash, blockCount, pos = self.pending
+                self.pending = None
+            with tracer.trace('forgerSchedule', blockCount):
+                forger = pos.forger(lastBlockHash)  # The lottery, outside the node lock
+            with self.node.lock:
+                self.node.blockchain.rememberForger(lastBlockHash, forger)
+                if self.node.blockchain.blocks.hash(-1) != lastBlockHash:
+                    continue  # The tip moved on meanwhile, its election is pending
+                self.counters['elected'] += 1
+                if forger in self.node.keyring and self.node.transactionPool.forgingRequired():
+                    self.counters['forged'] += 1
+                    self.node.forge()  # Transactions are waiting for us
+
+    def toJson(self):
+        """
+        Converts the schedule into a JSON-like dictionary representation.
+
+        :return: A dictionary with the state of the election thread and the counters
+        """
+        data = {}
+        data['running'] = self.running
+        data['pending'] = self.pending is not None
+        data['counters'] = dict(self.counters)
+        return data
@@ -1,11 +1,11 @@
 from Wallet import Wallet  # Importing the Wallet class
-from BlockchainUtils import BlockchainUtils  # Importing blockchain utility functions
-import requests  # Importing the requests library for HTTP requests
+from NodeClient import NodeClient  # Importing the pooled client of the node APIs
 
-def postTransaction(sender, receiver, amount, type):
+def postTransaction(client, sender, receiver, amount, type):
     """
     Creates and sends a transaction from a sender to a receiver.
 
+    :param client: The NodeClient of the nodes
     :param sender: The wallet initiating the transaction
     :param receiver: The wallet receiving the transaction
     :param amount: The transaction amount
@@ -13,25 +13,26 @@ def postTransaction(sender, receiver, amount, type):
     """
     # Create a transaction using the sender's wallet
     transaction = sender.createTransaction(receiver.publicKeyString(), amount, type)
-    url = "http://localhost:5000/transaction"  # API endpoint to send the transaction
-    package = {'transaction': BlockchainUtils.encode(transaction)}  # Package the transaction as a dictionary
-    request = requests.post(url, json=package)  # Send the transaction to the server
+    client.submit(transaction)  # Send the transaction to the first node that takes it
 
 if __name__ == '__main__':
+    client = NodeClient(['http://localhost:5000', 'http://localhost:5001'])  # The second node takes over if the first is down
+
     # Initialize wallets for Bob and Alice
     bob = Wallet()  # Creating Bob's wallet
     alice = Wallet()  # Creating Alice's wallet
     alice.fromKey('keys/stakerPrivateKey.pem')  # Load Alice's private key from a file
     exchange = Wallet()  # Creating a wallet for the exchange
+    client.syncNonce(alice)  # Alice's key is reused between runs
 
     # Sending transactions using the exchange wallet
     # Forger: genesis
-    postTransaction(exchange, alice, 100, 'EXCHANGE')  # Transfer 100 to Alice
-    postTransaction(exchange, bob, 100, 'EXCHANGE')  # Transfer 100 to Bob
-    postTransaction(exchange, bob, 10, 'EXCHANGE')   # Transfer 10 to Bob
+    postTransaction(client, exchange, alice, 100, 'EXCHANGE')  # Transfer 100 to Alice
+    postTransaction(client, exchange, bob, 100, 'EXCHANGE')  # Transfer 100 to Bob
+    postTransaction(client, exchange, bob, 10, 'EXCHANGE')   # Transfer 10 to Bob
 
     # Sending transactions using Alice's wallet
     # Forger: likely Alice
-    postTransaction(alice, alice, 25, 'STAKE')  # Alice stakes 25
-    postTransaction(alice, bob, 1, 'TRANSFER')   # Alice transfers 1 to Bob
-    postTransaction(alice, bob, 1, 'TRANSFER')   # Alice transfers another 1 to Bob
+    postTransaction(client, alice, alice, 25, 'STAKE')  # Alice stakes 25
+    postTransaction(client, alice, bob, 1, 'TRANSFER')   # Alice transfers 1 to Bob
+    postTransaction(client, alice, bob, 1, 'TRANSFER')   # Alice transfers another 1 to Bob
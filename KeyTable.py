@@ -0,0 +1,75 @@
+import hashlib  # Computes the key digests
+import threading  # Protects the table against concurrent inserts
+
+
+class KeyTable():
+    """
+    Process-wide table of interned public keys.
+
+    PEM encoded public keys are about 450 characters long and appear in every transaction
+    and block. Objects keep a small integer id instead, and every distinct key is stored
+    exactly once, however many transactions and blocks refer to it.
+
+    Every key also gets a digest, the first 20 bytes of its SHA-256 hash in hex, which
+    identifies the key in the account and stake state. Unlike the ids, digests are the
+    same in every process.
+
+    Keys are never removed, so only the keys of accepted transactions and blocks are
+    added (see Transaction.intern). The digest of any other key is computed without
+    adding it, so received data that fails validation does not grow the table.
+    """
+
+    keys = []  # Maps key ids to public key strings
+    digests = []  # Maps key ids to key digests
+    ids = {}  # Maps public key strings to key ids
+    lock = threading.Lock()  # Serializes inserts of new keys
+
+    @staticmethod
+    def keyId(publicKeyString):
+        """
+        Returns the id of a public key, adding the key to the table if it is new.
+
+        :param publicKeyString: The public key string
+        :return: The key id
+        """
+        keyId = KeyTable.ids.get(publicKeyString)
+        if keyId is None:
+            with KeyTable.lock:
+                keyId = KeyTable.ids.get(publicKeyString)  # Another thread may have added it meanwhile
+                if keyId is None:
+                    keyId = len(KeyTable.keys)
+                    KeyTable.digests.append(KeyTable.hash(publicKeyString))
+                    KeyTable.keys.append(publicKeyString)
+                    KeyTable.ids[publicKeyString] = keyId
+        return keyId
+
+    @staticmethod
+    def publicKey(keyId):
+        """
+        Returns the public key string of a key id.
+
+        :param keyId: The key id
+        :return: The public key string
+        """
+        return KeyTable.keys[keyId]
+
+    @staticmethod
+    def hash(publicKeyString):
+        """
+        :param publicKeyString: The public key string
+        :return: The 40 hex character digest of the key, computed
+        """
+        return hashlib.sha256(str(publicKeyString).encode('utf-8')).hexdigest()[:40]
+
+    @staticmethod
+    def digest(publicKeyString):
+        """
+        Returns the digest of a public key, without adding the key to the table.
+
+        :param publicKeyString: The public key string
+        :return: The 40 hex character digest of the key
+        """
+        keyId = KeyTable.ids.get(publicKeyString)
+        if keyId is None:
+            return KeyTable.hash(publicKeyString)  # Not interned (yet)
+        return KeyTable.digests[keyId]
@@ -0,0 +1,124 @@
+import os  # Default number of signing workers
+from concurrent.futures import ThreadPoolExecutor  # Signing worker pool
+from Wallet import Wallet  # Validator keys
+from Transaction import Transaction  # Batches of signed transactions
+from KeyTable import KeyTable  # Key digests
+
+
+class Keyring():
+    """
+    The validator keys a node forges and signs with.
+
+    One node, with one chain and one network stack, can run any number of staking
+    identities. Checking whether the elected forger is one of them is a dictionary
+    lookup, however many keys are loaded. Batches of signatures are spread over a pool
+    of signing workers; the signing arithmetic runs outside the interpreter lock, so the
+    workers sign in parallel.
+    """
+
+    def __init__(self, workers=None):
+        """
+        Initializes an empty keyring.
+
+        :param workers: Number of signing workers (defaults to the number of CPUs)
+        """
+        self.wallets = {}  # Maps public key strings to their wallets
+        self.unkeyed = []  # Wallets whose key has not been generated yet
+        self.workerCount = workers or os.cpu_count() or 1  # Number of signing workers
+        # Signing worker pool, created here so concurrent callers share it; its threads start on first use
+        self.executor = ThreadPoolExecutor(max_workers=self.workerCount, thread_name_prefix='sign')
+
+    def add(self, wallet):
+        """
+        Adds a wallet to the keyring.
+
+        A wallet without a key yet is only keyed in once its key was generated; until then
+        nobody knows its public key, so it cannot have been elected.
+
+        :param wallet: The wallet holding the private key
+        :return: The public key string of the wallet, or None if its key is not generated yet
+        """
+        if not wallet.hasKey():
+            self.unkeyed.append(wallet)  # Adding it now would generate the key at startup
+            return None
+        publicKeyString = wallet.publicKeyString()  # Exported once, the lookups use the string
+        self.wallets[publicKeyString] = wallet
+        return publicKeyString
+
+    def keyGenerated(self):
+        """
+        Keys in the wallets whose key was generated since they were added.
+        """
+        if self.unkeyed and any(wallet.hasKey() for wallet in self.unkeyed):
+            unkeyed, self.unkeyed = self.unkeyed, []
+            for wallet in unkeyed:
+                self.add(wallet)
+
+    def load(self, keyFile):
+        """
+        Loads a private key file into the keyring.
+
+        :param keyFile: The path to the file containing the private key
+        :return: The public key string of the key
+        """
+        return self.add(Wallet(keyFile))
+
+    def __contains__(self, publicKeyString):
+        self.keyGenerated()
+        return publicKeyString in self.wallets
+
+    def __len__(self):
+        self.keyGenerated()
+        return len(self.wallets)
+
+    def wallet(self, publicKeyString):
+        """
+        Returns the wallet of a public key.
+
+        :param publicKeyString: The public key string
+        :return: The wallet, or None if the key is not in the keyring
+        """
+        self.keyGenerated()
+        return self.wallets.get(publicKeyString)
+
+    def publicKeys(self):
+        """
+        :return: The public key strings of the keyring, in the order they were keyed in
+        """
+        self.keyGenerated()
+        return list(self.wallets)
+
+    def signAll(self, requests):
+        """
+        Signs a batch of payloads on the signing worker pool.
+
+        :param requests: List of (publicKeyString, data) tuples
+        :return: The signatures in hex, in the order of the requests
+        """
+        futures = [self.executor.submit(self.wallets[publicKeyString].sign, data) for publicKeyString, data in requests]
+        return [future.result() for future in futures]
+
+    def createTransactions(self, requests):
+        """
+        Creates and signs a batch of transactions from keys of the keyring.
+
+        :param requests: List of (senderPublicKeyString, receiverPublicKeyString, amount, type, nonce) tuples
+        :return: The signed transactions, in the order of the requests
+        """
+        transactions = [Transaction(*request) for request in requests]
+        signatures = self.signAll([(transaction.senderPublicKey, transaction.payload()) for transaction in transactions])
+        for transaction, signature in zip(transactions, signatures):
+            transaction.sign(signature)
+        return transactions
+
+    def toJson(self):
+        """
+        Converts the keyring into a JSON-like dictionary representation.
+
+        :return: A dictionary with the digests of the keys and the number of signing workers
+        """
+        self.keyGenerated()
+        data = {}
+        data['keys'] = [KeyTable.digest(publicKeyString) for publicKeyString in self.wallets]
+        data['workers'] = self.workerCount
+        return data
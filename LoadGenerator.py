@@ -0,0 +1,182 @@
+import argparse  # Command-line options
+import json  # Report output
+import threading  # Submission lanes and the event follower
+import time  # Pacing and latencies
+from Wallet import Wallet  # Sending wallets
+from NodeClient import NodeClient  # Pooled connections to the nodes
+from NetworkSimulator import NetworkSimulator  # Latency distributions of the report
+
+
+class LoadGenerator():
+    """
+    Capacity test of running nodes through their API.
+
+    Fresh sending wallets are created and EXCHANGE transactions between them, which are
+    always covered, are signed on the client's signing workers before the measurement
+    starts. They are submitted in batches at a fixed rate over several lanes at the same
+    time. Every sender belongs to one lane, which sends its batches one after the other,
+    so each sender's transactions arrive in nonce order. The block events of the nodes
+    tell when each transaction was confirmed.
+    """
+
+    def __init__(self, client, senders=8):
+        """
+        Initializes a load generator.
+
+        :param client: The NodeClient of the nodes under test
+        :param senders: Number of sending wallets
+        """
+        self.client = client
+        self.senders = senders
+        self.confirmed = {}  # Maps transaction ids to the time their block was received
+        self.lock = threading.Lock()  # Guards the results shared by the lanes and the event follower
+
+    def createLoad(self, count):
+        """
+        Creates and signs the transactions, spread evenly over the senders.
+
+        :param count: Number of transactions
+        :return: The signed transactions of every sender, each sender's in nonce order
+        """
+        wallets = [Wallet() for _ in range(self.senders)]
+        receivers = [wallet.publicKeyString() for wallet in wallets]
+        requests = [(wallets[index % self.senders], receivers[(index + 1) % self.senders], 1, 'EXCHANGE')
+                    for index in range(count)]
+        transactions = self.client.createTransactions(requests)
+        return [transactions[sender::self.senders] for sender in range(self.senders)]
+
+    def followBlocks(self, fromHeight):
+        """
+        Records the confirmation time of the transactions of every new block, in the background.
+
+        :param fromHeight: The height of the first block to follow
+        """
+        def follow():
+            for eventType, data in self.client.events(('block',), fromHeight):
+                if eventType != 'block' or not data.get('transactions'):
+                    continue
+                now = time.time()
+                with self.lock:
+                    for transactionId in data['transactions']:
+                        self.confirmed.setdefault(transactionId, now)
+        threading.Thread(target=follow, daemon=True).start()
+
+    def submitLane(self, transactions, batchSize, rate, start, submitted, statuses, requestLatencies):
+        """
+        Submits the transactions of a lane in batches at a fixed rate.
+
+        :param transactions: The transactions of the lane's senders, each sender's in nonce order
+        :param batchSize: Number of transactions per request
+        :param rate: Transactions per second of the lane
+        :param start: Time of the first submission
+        :param submitted: Maps transaction ids to their submission time, filled in
+        :param statuses: Counts of the statuses of the transactions, filled in
+        :param requestLatencies: Durations of the requests, filled in
+        """
+        for offset in range(0, len(transactions), batchSize):
+            delay = start + offset / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            batch = transactions[offset:offset + batchSize]
+            requestStart = time.time()
+            try:
+                batchStatuses = self.client.submitBatch(batch)
+            except Exception:
+                batchStatuses = ['failed'] * len(batch)  # No node could take the request
+            requestEnd = time.time()
+            with self.lock:
+                requestLatencies.append(requestEnd - requestStart)
+                for transaction, status in zip(batch, batchStatuses):
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == 'received':
+                        submitted[transaction.id] = requestStart
+
+    def run(self, count, rate, batchSize=50, lanes=4, settle=10.0):
+        """
+        Runs a load test.
+
+        :param count: Number of transactions to submit
+        :param rate: Transactions per second, over all lanes
+        :param batchSize: Number of transactions per request
+        :param lanes: Number of requests in flight at the same time
+        :param settle: Seconds to wait for confirmations after the last submission
+        :return: The report dictionary
+        """
+        signingStart = time.time()
+        senderTransactions = self.createLoad(count)
+        signingSeconds = time.time() - signingStart
+        lanes = max(1, min(lanes, self.senders))
+        laneTransactions = [[] for _ in range(lanes)]
+        for sender, transactions in enumerate(senderTransactions):
+            laneTransactions[sender % lanes].extend(transactions)
+        for transactions in laneTransactions:
+            transactions.sort(key=lambda transaction: transaction.nonce)  # Interleaves the senders, keeps their order
+
+        self.followBlocks(self.client.get('/state')['blockCount'] + 1)
+        submitted = {}
+        statuses = {}
+        requestLatencies = []
+        start = time.time()
+        threads = [threading.Thread(target=self.submitLane,
+                                    args=(transactions, batchSize, rate / lanes, start, submitted, statuses, requestLatencies))
+                   for transactions in laneTransactions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        submissionSeconds = time.time() - start
+        deadline = time.time() + settle
+        while time.time() < deadline:
+            with self.lock:
+                if all(transactionId in self.confirmed for transactionId in submitted):
+                    break
+            time.sleep(0.1)
+
+        with self.lock:
+            confirmations = {transactionId: self.confirmed[transactionId]
+                             for transactionId in submitted if transactionId in self.confirmed}
+        report = {}
+        report['transactions'] = count
+        report['senders'] = self.senders
+        report['batchSize'] = batchSize
+        report['lanes'] = lanes
+        report['targetRate'] = rate
+        report['signingSeconds'] = signingSeconds
+        report['signingRate'] = count / signingSeconds if signingSeconds else None
+        report['submissionSeconds'] = submissionSeconds
+        report['statuses'] = statuses
+        report['receivedThroughput'] = len(submitted) / submissionSeconds if submissionSeconds else None
+        report['requestLatency'] = NetworkSimulator.distribution(requestLatencies)
+        report['confirmed'] = len(confirmations)
+        if confirmations:
+            report['confirmedThroughput'] = len(confirmations) / max(max(confirmations.values()) - start, 1e-9)
+        report['confirmationLatency'] = NetworkSimulator.distribution(
+            [confirmations[transactionId] - submitted[transactionId] for transactionId in confirmations])
+        return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load generator for the node APIs')
+    parser.add_argument('urls', nargs='*', default=['http://localhost:5000'], help='Base URLs of the node APIs')
+    parser.add_argument('--transactions', type=int, default=1000, help='Number of transactions to submit')
+    parser.add_argument('--rate', type=float, default=100.0, help='Transactions per second')
+    parser.add_argument('--batch-size', type=int, default=50, help='Transactions per request')
+    parser.add_argument('--lanes', type=int, default=4, help='Requests in flight at the same time')
+    parser.add_argument('--senders', type=int, default=8, help='Number of sending wallets')
+    parser.add_argument('--settle', type=float, default=10.0, help='Seconds to wait for confirmations')
+    parser.add_argument('--output', help='Writes the report to this JSON file')
+    parser.add_argument('--scheme', choices=sorted(Wallet.schemes), default=Wallet.defaultScheme,
+                        help='Signature scheme of the generated keys')
+    arguments = parser.parse_args()
+
+    Wallet.useScheme(arguments.scheme)
+    client = NodeClient(arguments.urls, poolSize=max(arguments.lanes, 1) + 1)  # One more for the block events
+    try:
+        report = LoadGenerator(client, arguments.senders).run(
+            arguments.transactions, arguments.rate, arguments.batch_size, arguments.lanes, arguments.settle)
+    finally:
+        client.close()
+    print(json.dumps(report, indent=2))
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            json.dump(report, outputFile, indent=2)
@@ -0,0 +1,131 @@
+import hashlib  # Hash chains of the lots
+from BlockchainUtils import BlockchainUtils  # First hash of every chain, as Lot computes it
+
+try:
+    import numpy  # Vectorized search for the winning lot
+except ImportError:
+    numpy = None  # Falls back to a pure-Python search
+
+
+class Lottery():
+    """
+    Batched forger lottery, electing the same forger as ProofOfStake.validatorLots and winnerLot.
+
+    The lot of the n-th unit of stake of a validator is the n-th hash of a chain starting
+    from the validator's key and the seed (see Lot). Instead of creating one Lot object
+    per unit of stake and hashing every chain from its start again, each validator's chain
+    is hashed once, and the raw 32-byte digests of all lots are written one after the
+    other into a single buffer.
+
+    The winner is the lot closest to the reference hash of the seed, the first such lot
+    on ties. With NumPy, the digests are read as rows of four big-endian 64-bit limbs and
+    the lots just above and just below the reference are found with a few array passes;
+    without it, the digests are compared as Python integers.
+    """
+    useNumpy = numpy is not None  # Can be turned off to use the pure-Python search
+    numpyThreshold = 256  # Number of lots from which NumPy is faster than comparing integers
+
+    @staticmethod
+    def digests(stakers, validators, seed):
+        """
+        Hashes the lots of all validators into a contiguous buffer.
+
+        :param stakers: Maps the key digests of the validators to their stake, in the order lots are drawn in
+        :param validators: Maps the key digests of the validators to their public keys
+        :param seed: The seed of the lottery, the hash of the last block
+        :return: A tuple (buffer, owners): the 32-byte digests of the lots in order, and a list of
+                 (number of lots up to and including the validator's, public key) pairs
+        """
+        buffer = bytearray()
+        owners = []
+        count = 0
+        seed = str(seed)
+        for digest, stake in stakers.items():
+            if stake <= 0:
+                continue  # Draws no lots
+            publicKey = validators[digest]
+            hexDigest = BlockchainUtils.hash(str(publicKey) + seed).hexdigest()  # First lot, see Lot.lotHash
+            buffer += bytes.fromhex(hexDigest)
+            for _ in range(stake - 1):
+                lotHash = hashlib.sha256(b'"' + hexDigest.encode('ascii') + b'"')  # The JSON of a hex string
+                hexDigest = lotHash.hexdigest()
+                buffer += lotHash.digest()
+            count += stake
+            owners.append((count, publicKey))
+        return buffer, owners
+
+    @staticmethod
+    def winnerIndex(buffer, reference):
+        """
+        Finds the lot closest to the reference, the first one on ties.
+
+        :param buffer: The 32-byte digests of the lots, see `digests`
+        :param reference: The reference digest as 32 bytes
+        :return: The position of the winning lot, or None if there are no lots
+        """
+        count = len(buffer) // 32
+        if not count:
+            return None
+        if Lottery.useNumpy and count >= Lottery.numpyThreshold:
+            return Lottery.numpyWinnerIndex(buffer, count, reference)
+        referenceValue = int.from_bytes(reference, 'big')
+        winner = None
+        leastOffset = None
+        for index in range(count):
+            offset = abs(int.from_bytes(buffer[index * 32:index * 32 + 32], 'big') - referenceValue)
+            if leastOffset is None or offset < leastOffset:
+                leastOffset = offset
+                winner = index
+        return winner
+
+    @staticmethod
+    def numpyWinnerIndex(buffer, count, reference):
+        """
+        Finds the lot closest to the reference with NumPy, see `winnerIndex`.
+
+        The closest lot is either the smallest lot at or above the reference or the largest
+        lot below it, so only those two are compared as integers.
+
+        :param buffer: The 32-byte digests of the lots
+        :param count: The number of lots
+        :param reference: The reference digest as 32 bytes
+        :return: The position of the winning lot
+        """
+        limbs = numpy.frombuffer(buffer, dtype='>u8', count=count * 4).reshape(count, 4)
+        referenceLimbs = numpy.frombuffer(reference, dtype='>u8')
+        above = numpy.zeros(count, dtype=bool)  # Lots greater than the reference
+        equal = numpy.ones(count, dtype=bool)  # Lots equal to the reference in the limbs compared so far
+        for limb in range(4):  # Most significant limb first
+            above |= equal & (limbs[:, limb] > referenceLimbs[limb])
+            equal &= limbs[:, limb] == referenceLimbs[limb]
+        above |= equal
+        candidates = []
+        for side, extreme in ((above, numpy.min), (~above, numpy.max)):
+            if not side.any():
+                continue
+            selected = side.copy()
+            for limb in range(4):  # Narrows down to the lots with the extreme value, limb by limb
+                column = limbs[:, limb]
+                selected &= column == extreme(column[selected])
+            index = int(numpy.flatnonzero(selected)[0])  # The first of equal lots
+            candidates.append((abs(int.from_bytes(buffer[index * 32:index * 32 + 32], 'big')
+                                   - int.from_bytes(reference, 'big')), index))
+        return min(candidates)[1]  # The closest, the earlier lot on ties
+
+    @staticmethod
+    def forger(stakers, validators, seed):
+        """
+        Elects the forger of the block after the given block.
+
+        :param stakers: Maps the key digests of the validators to their stake, in the order lots are drawn in
+        :param validators: Maps the key digests of the validators to their public keys
+        :param seed: The seed of the lottery, the hash of the last block
+        :return: The public key of the forger, or None if nobody has stake
+        """
+        buffer, owners = Lottery.digests(stakers, validators, seed)
+        winner = Lottery.winnerIndex(buffer, BlockchainUtils.hash(seed).digest())
+        if winner is None:
+            return None
+        for count, publicKey in owners:
+            if winner < count:
+                return publicKey
@@ -0,0 +1,110 @@
+import hashlib  # Leaf and node hashes
+import json  # Serialization of the leaves
+
+
+class MerkleTree():
+    """
+    Merkle tree over an ordered list of items, like the transactions of a block.
+
+    Follows the layout of RFC 6962: leaf and internal node hashes use different prefixes,
+    and a list of n items is split at the largest power of two smaller than n, so the
+    tree is fully determined by the number of items and no item is ever duplicated.
+    An inclusion proof holds the O(log n) hashes needed to recompute the root from one item.
+    """
+
+    @staticmethod
+    def leafHash(data):
+        """
+        Hashes a leaf.
+
+        The content is serialized with sorted keys, so the hash does not depend on the
+        key order a JSON encoder along the way produced.
+
+        :param data: The JSON serializable content of the leaf
+        :return: The leaf hash
+        """
+        leafBytes = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return hashlib.sha256(b'\x00' + leafBytes).digest()
+
+    @staticmethod
+    def nodeHash(left, right):
+        """
+        Hashes an internal node.
+
+        :param left: Hash of the left subtree
+        :param right: Hash of the right subtree
+        :return: The node hash
+        """
+        return hashlib.sha256(b'\x01' + left + right).digest()
+
+    @staticmethod
+    def root(leafHashes):
+        """
+        Computes the root of a list of leaf hashes.
+
+        :param leafHashes: The leaf hashes in order
+        :return: The root hash in hex
+        """
+        if not leafHashes:
+            return hashlib.sha256(b'').hexdigest()  # Root of the empty list
+        level = list(leafHashes)
+        while len(level) > 1:
+            # Pairing neighbours level by level and carrying an odd last node up unchanged
+            # builds the same tree as splitting at the largest power of two
+            nextLevel = [MerkleTree.nodeHash(level[index], level[index + 1]) for index in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                nextLevel.append(level[-1])
+            level = nextLevel
+        return level[0].hex()
+
+    @staticmethod
+    def proof(leafHashes, index):
+        """
+        Builds the inclusion proof of a leaf.
+
+        :param leafHashes: The leaf hashes in order
+        :param index: The position of the leaf
+        :return: The sibling hashes in hex from the leaf up to the root
+        """
+        siblings = []
+        level = list(leafHashes)
+        while len(level) > 1:
+            sibling = index ^ 1
+            if sibling < len(level):  # An odd last node has no sibling on this level
+                siblings.append(level[sibling].hex())
+            nextLevel = [MerkleTree.nodeHash(level[position], level[position + 1])
+                         for position in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                nextLevel.append(level[-1])
+            level = nextLevel
+            index //= 2
+        return siblings
+
+    @staticmethod
+    def verifyProof(root, leafHash, index, size, siblings):
+        """
+        Checks an inclusion proof against a root.
+
+        :param root: The root in hex
+        :param leafHash: The hash of the leaf
+        :param index: The position of the leaf
+        :param size: The number of leaves
+        :param siblings: The sibling hashes returned by `proof`
+        :return: True if the leaf is at this position of a list with this root
+        """
+        if not 0 <= index < size:
+            return False
+        currentHash = leafHash
+        remaining = list(siblings)
+        while size > 1:
+            if index ^ 1 < size:
+                if not remaining:
+                    return False
+                sibling = bytes.fromhex(remaining.pop(0))
+                if index % 2:
+                    currentHash = MerkleTree.nodeHash(sibling, currentHash)
+                else:
+                    currentHash = MerkleTree.nodeHash(currentHash, sibling)
+            index //= 2
+            size = (size + 1) // 2
+        return not remaining and currentHash.hex() == root
@@ -0,0 +1,642 @@
+from Node import Node  # Nodes under simulation
+from SocketCommunication import SocketCommunication  # Real P2P stack the simulated links wrap
+from PeerDiscoveryHandler import PeerDiscoveryHandler  # Peer discovery, silenced for the simulation
+from Wallet import Wallet  # Senders of the synthetic load
+from BlockchainUtils import BlockchainUtils  # Transactions cross process boundaries encoded
+import argparse  # Command-line options
+import heapq  # Delivery schedule of delayed messages
+import json  # Message sizes and the report file
+import multiprocessing  # Process pool mode
+import os  # Working directory and /dev/null
+import queue  # Event and command queues in single process mode
+import random  # Loss, jitter and load distribution
+import statistics  # Latency percentiles
+import sys  # Silencing node output
+import threading  # Delivery threads and event collection
+import time  # Timestamps
+
+
+class LinkModel():
+    # Properties of every simulated link between two nodes
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, bandwidth=None):
+        """
+        Initializes a link model.
+
+        :param latency: One-way delay added to every message in seconds
+        :param jitter: Maximum random delay added on top of the latency in seconds
+        :param loss: Probability (0.0 - 1.0) that a message is dropped
+        :param bandwidth: Link capacity in bytes per second, or None for unlimited
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.bandwidth = bandwidth
+
+    def toJson(self):
+        """
+        Converts the link model into a JSON-like dictionary representation.
+
+        :return: A dictionary with the link properties
+        """
+        return dict(self.__dict__)
+
+
+class DeliveryQueue():
+    # Delivers delayed messages to a node in order of their arrival time
+
+    def __init__(self):
+        """
+        Initializes an empty delivery queue and its delivery thread.
+        """
+        self.schedule = []  # Heap of (deliveryTime, sequence, callback)
+        self.sequence = 0  # Keeps heap entries with equal times in insertion order
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, deliveryTime, callback):
+        """
+        Schedules a callback.
+
+        :param deliveryTime: Time (time.time()) at which the callback runs
+        :param callback: The function to call
+        """
+        with self.condition:
+            self.sequence += 1
+            heapq.heappush(self.schedule, (deliveryTime, self.sequence, callback))
+            self.condition.notify()
+
+    def run(self):
+        """
+        Runs due callbacks until the queue is stopped.
+        """
+        while True:
+            with self.condition:
+                while self.running and (not self.schedule or self.schedule[0][0] > time.time()):
+                    timeout = self.schedule[0][0] - time.time() if self.schedule else None
+                    self.condition.wait(timeout)
+                if not self.running:
+                    return
+                _, _, callback = heapq.heappop(self.schedule)
+            try:
+                callback()
+            except Exception as error:  # A failing handler must not stop the deliveries
+                print('Delivery failed: ' + repr(error), file=sys.__stderr__)
+
+    def stop(self):
+        """
+        Stops the delivery thread, discarding pending messages.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+
+class QuietPeerDiscoveryHandler(PeerDiscoveryHandler):
+    # Peer discovery without the periodic connection printout, stoppable at the end of a run
+
+    def __init__(self, node):
+        super(QuietPeerDiscoveryHandler, self).__init__(node)
+        self.stopped = threading.Event()
+
+    def start(self):
+        """
+        Starts the discovery thread as a daemon.
+        """
+        threading.Thread(target=self.discovery, args=(), daemon=True).start()
+
+    def discovery(self):
+        """
+        Broadcasts discovery messages every 10 seconds until stopped.
+        """
+        while not self.stopped.is_set():
+            self.socketCommunication.broadcast(self.handshakeMessage())
+            self.stopped.wait(10)
+
+
+class SimulatedSocketCommunication(SocketCommunication):
+    # Socket communication that passes inbound messages through a simulated link
+
+    def __init__(self, ip, port, link):
+        """
+        Initializes the socket communication of a simulated node.
+
+        :param ip: The IP address of the node
+        :param port: The port number of the node
+        :param link: The LinkModel applied to inbound messages
+        """
+        super(SimulatedSocketCommunication, self).__init__(ip, port)
+        self.peerDiscoveryHandler = QuietPeerDiscoveryHandler(self)
+        self.link = link
+        self.deliveryQueue = DeliveryQueue()
+        self.linkBusyUntil = {}  # Maps peer ids to the time their link finishes transmitting
+        self.counters = {'received': {}, 'sent': {}, 'dropped': 0, 'bytesReceived': 0, 'bytesSent': 0}
+        self.countersLock = threading.Lock()
+
+    def connectToFirstNode(self):
+        """
+        Connections are made by the simulator, not to the hardcoded first node.
+        """
+        pass
+
+    def count(self, direction, messageType, size, copies=1):
+        """
+        Updates the message counters.
+
+        :param direction: 'received' or 'sent'
+        :param messageType: The type of the message
+        :param size: The size of the message in bytes
+        :param copies: Number of peers the message went to
+        """
+        with self.countersLock:
+            counter = self.counters[direction]
+            counter[messageType] = counter.get(messageType, 0) + copies
+            if direction == 'received':
+                self.counters['bytesReceived'] += size
+            else:
+                self.counters['bytesSent'] += size * copies
+
+    def node_message(self, connected_node, message):
+        """
+        Applies loss, latency and bandwidth to an inbound message before handling it.
+
+        :param connected_node: The node from which the message was received
+        :param message: The message that was received
+        """
+        size = len(json.dumps(message))
+        messageType = message.get('messageType') if isinstance(message, dict) else None
+        self.count('received', messageType, size)
+        if self.link.loss and random.random() < self.link.loss:
+            with self.countersLock:
+                self.counters['dropped'] += 1
+            return
+        now = time.time()
+        transmitted = now
+        if self.link.bandwidth:
+            with self.countersLock:  # Messages on one link are transmitted one after the other
+                start = max(now, self.linkBusyUntil.get(connected_node.id, now))
+                transmitted = start + size / self.link.bandwidth
+                self.linkBusyUntil[connected_node.id] = transmitted
+        deliveryTime = transmitted + self.link.latency + random.uniform(0, self.link.jitter)
+        handle = super(SimulatedSocketCommunication, self).node_message
+        self.deliveryQueue.put(deliveryTime, lambda: handle(connected_node, message))
+
+    def send(self, receiver, message):
+        self.count('sent', self.messageType(message), len(message))
+        super(SimulatedSocketCommunication, self).send(receiver, message)
+
+    def broadcast(self, message):
+        self.count('sent', self.messageType(message), len(message), len(self.all_nodes))
+        super(SimulatedSocketCommunication, self).broadcast(message)
+
+    @staticmethod
+    def messageType(encodedMessage):
+        """
+        Reads the type of an encoded message.
+
+        :param encodedMessage: The jsonpickle encoded message
+        :return: The message type
+        """
+        try:
+            return json.loads(encodedMessage).get('messageType')
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    def shutdown(self):
+        """
+        Stops the delivery thread, the peer discovery and the P2P node.
+        """
+        self.deliveryQueue.stop()
+        self.peerDiscoveryHandler.stopped.set()
+        self.stop()
+
+
+class SimulatedNode(Node):
+    # Node that reports every block it adds to its chain
+
+    def __init__(self, index, ip, port, key, link, events):
+        """
+        Initializes a simulated node.
+
+        :param index: Index of the node in the simulation
+        :param ip: The IP address of the node
+        :param port: The port number of the node
+        :param key: Optional private key file of the node's wallet
+        :param link: The LinkModel of the node's inbound links
+        :param events: Queue receiving ('block', ...) events
+        """
+        super(SimulatedNode, self).__init__(ip, port, key)
+        self.index = index
+        self.link = link
+        self.events = events
+        self.eventLock = threading.Lock()
+        self.reportedHashes = [block.hash() for block in self.blockchain.blocks]  # Chain as of the last report
+
+    def startP2P(self):
+        self.p2p = SimulatedSocketCommunication(self.ip, self.port, self.link)
+        self.p2p.startSocketCommunication(self)
+        self.forgerSchedule.start()
+
+    def reportBlocks(self):
+        """
+        Emits an event for every block added to the chain since the last report,
+        including the blocks of a branch the node switched to.
+        """
+        with self.eventLock:
+            blocks = self.blockchain.blocks
+            height = min(len(self.reportedHashes), len(blocks))
+            while height > 1 and blocks.hash(height - 1) != self.reportedHashes[height - 1]:
+                height -= 1  # Block replaced by a reorg
+            del self.reportedHashes[height:]
+            now = time.time()
+            for block in blocks[height:]:
+                transactionIds = [transaction.id for transaction in block.transactions]
+                self.events.put(('block', self.index, block.signature, block.blockCount, now, transactionIds))
+                self.reportedHashes.append(block.hash())
+
+    def acceptBlock(self, block):
+        status = super(SimulatedNode, self).acceptBlock(block)
+        self.reportBlocks()
+        return status
+
+    def forge(self):
+        super(SimulatedNode, self).forge()
+        self.reportBlocks()
+
+
+class SimulationWorker():
+    # Hosts a group of simulated nodes inside one process
+
+    def __init__(self, nodeSpecs, link, events, ip='localhost'):
+        """
+        Creates and starts the nodes of this worker.
+
+        :param nodeSpecs: List of (index, port, keyFile) tuples
+        :param link: The LinkModel of every link
+        :param events: Queue receiving the simulation events
+        :param ip: The IP address the nodes listen on
+        """
+        self.nodes = {}
+        for index, port, keyFile in nodeSpecs:
+            node = SimulatedNode(index, ip, port, keyFile, link, events)
+            node.startP2P()
+            self.nodes[index] = node
+
+    def connect(self, index, peers):
+        """
+        Connects a node to a list of peers.
+
+        :param index: Index of the connecting node
+        :param peers: List of (ip, port) tuples
+        """
+        for ip, port in peers:
+            self.nodes[index].p2p.connect_with_node(ip, port)
+
+    def connections(self):
+        """
+        :return: Maps node indices to their number of open connections
+        """
+        return {index: len(node.p2p.all_nodes) for index, node in self.nodes.items()}
+
+    def submit(self, index, encodedTransaction):
+        """
+        Hands a transaction to a node as if it was posted to its API.
+
+        :param index: Index of the receiving node
+        :param encodedTransaction: The jsonpickle encoded transaction
+        """
+        self.nodes[index].handleTransaction(BlockchainUtils.decode(encodedTransaction))
+
+    def stats(self):
+        """
+        :return: Maps node indices to their message counters and chain height
+        """
+        stats = {}
+        for index, node in self.nodes.items():
+            with node.p2p.countersLock:
+                counters = json.loads(json.dumps(node.p2p.counters))
+            counters['height'] = len(node.blockchain.blocks) - 1
+            stats[index] = counters
+        return stats
+
+    def stop(self):
+        """
+        Shuts down every node of this worker.
+        """
+        for node in self.nodes.values():
+            node.transactionPipeline.stop()
+            node.forgerSchedule.stop()
+            node.p2p.shutdown()
+
+
+def workerProcess(nodeSpecs, link, commands, events, quiet):
+    """
+    Entry point of a worker process in process pool mode.
+
+    :param nodeSpecs: List of (index, port, keyFile) tuples hosted by this process
+    :param link: The LinkModel of every link
+    :param commands: Queue of (command, arguments) tuples from the coordinator
+    :param events: Queue receiving the simulation events and command results
+    :param quiet: Discards the output of the nodes
+    """
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    worker = SimulationWorker(nodeSpecs, link, events)
+    while True:
+        command, arguments = commands.get()
+        if command == 'stop':
+            worker.stop()
+            events.put(('stopped', None))
+            return
+        result = getattr(worker, command)(*arguments)
+        if result is not None:
+            events.put(('result', result))
+
+
+class RemoteWorker():
+    # Coordinator side proxy of a worker process
+
+    def __init__(self, nodeSpecs, link, quiet):
+        self.commands = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=workerProcess, args=(nodeSpecs, link, self.commands, self.results, quiet), daemon=True)
+        self.process.start()
+        self.events = None  # Set by the simulator, receives the forwarded block events
+
+    def call(self, command, *arguments, wait=False):
+        """
+        Sends a command to the worker process.
+
+        :param command: Name of the SimulationWorker method
+        :param arguments: Arguments of the method
+        :param wait: Waits for and returns the result of the method
+        :return: The result, if waited for
+        """
+        self.commands.put((command, arguments))
+        if not wait:
+            return None
+        while True:
+            kind, *payload = self.results.get()
+            if kind in ('result', 'stopped'):
+                return payload[0]
+            self.events.put((kind,) + tuple(payload))  # Forwards block events received meanwhile
+
+    def drain(self):
+        """
+        Forwards the pending events of the worker process to the simulator.
+        """
+        while True:
+            try:
+                kind, *payload = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self.events.put((kind,) + tuple(payload))
+
+
+class NetworkSimulator():
+    # Runs a network of nodes over loopback and measures its behavior under load
+
+    def __init__(self, nodeCount, link=None, basePort=20001, processes=1, quiet=True):
+        """
+        Initializes the simulator.
+
+        :param nodeCount: Number of nodes in the network
+        :param link: The LinkModel applied to every link
+        :param basePort: P2P port of the first node; the others use the following ports
+        :param processes: Number of processes the nodes are spread over (1 = in-process)
+        :param quiet: Discards the output of the nodes
+        """
+        self.nodeCount = nodeCount
+        self.link = link or LinkModel()
+        self.basePort = basePort
+        self.processes = max(1, min(processes, nodeCount))
+        self.quiet = quiet
+        self.events = queue.Queue()
+        self.workers = []  # List of (worker, nodeIndices)
+        self.submitted = {}  # Maps transaction ids to their submission time
+        self.blocks = {}  # Maps block signatures to {'count', 'transactions', 'accepted': {node: time}}
+        self.messages = {}
+
+    def nodeSpecs(self):
+        """
+        :return: (index, port, keyFile) of every node; node 0 holds the genesis stake
+        """
+        return [(index, self.basePort + index, 'keys/genesisPrivateKey.pem' if index == 0 else None)
+                for index in range(self.nodeCount)]
+
+    def workerOf(self, index):
+        for worker, indices in self.workers:
+            if index in indices:
+                return worker
+        raise KeyError(index)
+
+    def call(self, worker, command, *arguments, wait=False):
+        if isinstance(worker, RemoteWorker):
+            return worker.call(command, *arguments, wait=wait)
+        return getattr(worker, command)(*arguments)
+
+    def start(self, timeout=30):
+        """
+        Starts all nodes and connects them into a full mesh.
+
+        :param timeout: Seconds to wait for all connections
+        """
+        specs = self.nodeSpecs()
+        if self.processes == 1:
+            self.workers.append((SimulationWorker(specs, self.link, self.events), set(range(self.nodeCount))))
+        else:
+            for part in range(self.processes):
+                partSpecs = specs[part::self.processes]
+                worker = RemoteWorker(partSpecs, self.link, self.quiet)
+                worker.events = self.events
+                self.workers.append((worker, {spec[0] for spec in partSpecs}))
+        time.sleep(0.5)  # Lets the servers bind their ports
+        for index, port, _ in specs:
+            peers = [('localhost', self.basePort + other) for other in range(index)]
+            self.call(self.workerOf(index), 'connect', index, peers)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            connections = {}
+            for worker, _ in self.workers:
+                connections.update(self.call(worker, 'connections', wait=True))
+            if all(count >= self.nodeCount - 1 for count in connections.values()):
+                return
+            time.sleep(0.2)
+        raise RuntimeError('Nodes did not connect within ' + str(timeout) + ' seconds: ' + str(connections))
+
+    def createLoad(self, count, senders=2):
+        """
+        Creates and signs the synthetic transactions before the measurement starts.
+
+        :param count: Number of transactions
+        :param senders: Number of sending wallets
+        :return: A list of transactions
+        """
+        wallets = [Wallet() for _ in range(senders)]
+        receivers = [wallet.publicKeyString() for wallet in wallets]
+        return [random.choice(wallets).createTransaction(random.choice(receivers), 1, 'EXCHANGE')
+                for _ in range(count)]
+
+    def drive(self, transactions, rate):
+        """
+        Submits transactions to random nodes at a fixed rate.
+
+        :param transactions: The transactions to submit
+        :param rate: Transactions per second
+        """
+        interval = 1.0 / rate
+        nextSubmission = time.time()
+        for transaction in transactions:
+            delay = nextSubmission - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            index = random.randrange(self.nodeCount)
+            self.submitted[transaction.id] = time.time()
+            self.call(self.workerOf(index), 'submit', index, BlockchainUtils.encode(transaction))
+            nextSubmission += interval
+            self.collectEvents()
+
+    def collectEvents(self):
+        """
+        Processes the block events reported by the nodes.
+        """
+        for worker, _ in self.workers:
+            if isinstance(worker, RemoteWorker):
+                worker.drain()
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+            if event[0] != 'block':
+                continue
+            _, index, signature, blockCount, acceptedTime, transactionIds = event
+            entry = self.blocks.setdefault(signature, {'count': blockCount, 'transactions': transactionIds, 'accepted': {}})
+            entry['accepted'].setdefault(index, acceptedTime)
+
+    def run(self, transactionCount, rate, settle=5.0, senders=2):
+        """
+        Runs a load test on the started network.
+
+        :param transactionCount: Number of transactions to submit
+        :param rate: Transactions per second
+        :param settle: Seconds to wait for propagation after the last submission
+        :param senders: Number of sending wallets
+        :return: The report dictionary
+        """
+        transactions = self.createLoad(transactionCount, senders)
+        started = time.time()
+        self.drive(transactions, rate)
+        deadline = time.time() + settle
+        while time.time() < deadline:
+            self.collectEvents()
+            time.sleep(0.1)
+        self.collectEvents()
+        for worker, _ in self.workers:
+            self.messages.update(self.call(worker, 'stats', wait=True))
+        self.collectEvents()
+        return self.report(time.time() - started)
+
+    def stop(self):
+        """
+        Stops all nodes and worker processes.
+        """
+        for worker, _ in self.workers:
+            self.call(worker, 'stop', wait=True)
+
+    @staticmethod
+    def distribution(values):
+        """
+        :param values: Durations in seconds
+        :return: Count and percentiles of the durations in milliseconds
+        """
+        if not values:
+            return {'count': 0}
+        values = sorted(values)
+        quantiles = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else values * 99
+        return {
+            'count': len(values),
+            'meanMs': statistics.mean(values) * 1000,
+            'p50Ms': quantiles[49] * 1000,
+            'p90Ms': quantiles[89] * 1000,
+            'p99Ms': quantiles[98] * 1000,
+            'maxMs': values[-1] * 1000}
+
+    def report(self, elapsed):
+        """
+        Computes the measurements of a run.
+
+        :param elapsed: Duration of the run in seconds
+        :return: The report dictionary
+        """
+        firstConfirmation = {}
+        fullConfirmation = {}
+        propagation = []
+        for entry in self.blocks.values():
+            accepted = entry['accepted']
+            first = min(accepted.values())
+            for transactionId in entry['transactions']:
+                if transactionId in firstConfirmation:
+                    firstConfirmation[transactionId] = min(firstConfirmation[transactionId], first)
+                else:
+                    firstConfirmation[transactionId] = first
+                if len(accepted) == self.nodeCount:
+                    last = max(accepted.values())
+                    fullConfirmation[transactionId] = min(fullConfirmation.get(transactionId, last), last)
+            if len(accepted) == self.nodeCount:
+                propagation.append(max(accepted.values()) - first)
+        firstLatencies = [firstConfirmation[id] - submitted for id, submitted in self.submitted.items() if id in firstConfirmation]
+        fullLatencies = [fullConfirmation[id] - submitted for id, submitted in self.submitted.items() if id in fullConfirmation]
+        report = {}
+        report['nodes'] = self.nodeCount
+        report['processes'] = self.processes
+        report['link'] = self.link.toJson()
+        report['elapsedSeconds'] = elapsed
+        report['submitted'] = len(self.submitted)
+        report['confirmedThroughput'] = len(fullLatencies) / elapsed if elapsed else None
+        report['confirmationLatency'] = self.distribution(firstLatencies)
+        report['fullConfirmationLatency'] = self.distribution(fullLatencies)
+        report['blocks'] = len(self.blocks)
+        report['blocksOnAllNodes'] = len(propagation)
+        report['blockPropagation'] = self.distribution(propagation)
+        report['messagesPerNode'] = {str(index): self.messages[index] for index in sorted(self.messages)}
+        return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local multi-node network simulator')
+    parser.add_argument('--nodes', type=int, default=4, help='Number of nodes')
+    parser.add_argument('--processes', type=int, default=1, help='Processes the nodes are spread over')
+    parser.add_argument('--base-port', type=int, default=20001, help='P2P port of the first node')
+    parser.add_argument('--latency', type=float, default=0.0, help='One-way link latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Maximum extra random latency in seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='Message loss probability')
+    parser.add_argument('--bandwidth', type=float, default=None, help='Link bandwidth in bytes per second')
+    parser.add_argument('--transactions', type=int, default=50, help='Number of transactions to submit')
+    parser.add_argument('--rate', type=float, default=5.0, help='Transactions per second')
+    parser.add_argument('--settle', type=float, default=5.0, help='Seconds to wait after the last submission')
+    parser.add_argument('--output', help='Writes the report to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='Shows the output of the nodes')
+    parser.add_argument('--scheme', choices=sorted(Wallet.schemes), default=Wallet.defaultScheme,
+                        help='Signature scheme of the generated keys')
+    arguments = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Key files are read relative to the repository
+    Wallet.useScheme(arguments.scheme)  # Inherited by the worker processes
+    link = LinkModel(arguments.latency, arguments.jitter, arguments.loss, arguments.bandwidth)
+    simulator = NetworkSimulator(arguments.nodes, link, arguments.base_port, arguments.processes, not arguments.verbose)
+    if simulator.quiet:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        simulator.start()
+        report = simulator.run(arguments.transactions, arguments.rate, arguments.settle)
+    finally:
+        simulator.stop()
+        sys.stdout = sys.__stdout__
+    print(json.dumps(report, indent=2))
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            json.dump(report, outputFile, indent=2)
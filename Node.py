@@ -1,148 +1,405 @@
 from Blockchain import Blockchain
+from BlockArchive import BlockArchive
+from AccountIndex import AccountIndex
+from Transaction import Transaction
 from TransactionPool import TransactionPool
+from TransactionPipeline import TransactionPipeline
+from ForgerSchedule import ForgerSchedule
+from EventBus import EventBus
+from PendingState import PendingState
 from Wallet import Wallet
+from Keyring import Keyring
 from SocketCommunication import SocketCommunication
 from NodeAPI import NodeAPI
 from Message import Message
 from BlockchainUtils import BlockchainUtils
-import copy
+from KeyTable import KeyTable
+from Tracer import tracer
+import threading
+import os
 
 
 class Node():
+    syncBatchSize = 100  # Number of blocks sent at most in response to a block request
+    maxLocatorSize = 64  # Number of locator entries of a block request looked at
+    chainDataDirectory = 'chaindata'  # Directory the nodes archive old blocks and keep their indexes in
 
-    def __init__(self, ip, port, key=None):
+    def __init__(self, ip, port, key=None, retention=None, pruned=False, indexed=False):
         """
-        Initializes a Node instance with connection parameters and optionally a key.
+        Initializes a Node instance with connection parameters and optionally its keys.
 
         :param ip: The IP address of the node
         :param port: The port number of the node
-        :param key: Optional private key for the node's wallet
+        :param key: Optional private key file for the node's wallet, or a list of private key files
+                    of the validators this node forges for, the first one being the node's wallet
+        :param retention: Optional number of recent blocks kept in memory with their transactions, older
+                          blocks are archived under chainDataDirectory
+        :param pruned: Drops the transactions of older blocks instead of archiving them, such a node
+                       cannot serve them to its peers
+        :param indexed: Keeps the transactions and stake changes of every account indexed, under chainDataDirectory
         """
         self.p2p = None  # Peer-to-peer communication component (not initialized)
         self.ip = ip  # IP address of the node
         self.port = port  # Port number of the node
-        self.blockchain = Blockchain()  # Initializes the blockchain
+        dataDirectory = os.path.join(Node.chainDataDirectory, f'{ip}-{port}')
+        archive = None
+        if retention is not None and not pruned:
+            archive = BlockArchive(os.path.join(dataDirectory, 'blocks'))
+        accountIndex = AccountIndex(os.path.join(dataDirectory, 'index')) if indexed else None
+        self.blockchain = Blockchain(retention, archive, accountIndex)  # Initializes the blockchain
         self.transactionPool = TransactionPool()  # Initializes the transaction pool
-        self.wallet = Wallet()  # Initializes the node's wallet
-        if key is not None:  # If a key is provided
-            self.wallet.fromKey(key)  # Load the private key into the wallet
+        self.transactionPipeline = TransactionPipeline(self)  # Staged ingest of incoming transactions
+        self.forgerSchedule = ForgerSchedule(self)  # Elects the next forger in the background
+        self.eventBus = EventBus()  # Pushes new blocks and pool transactions to API subscribers
+        self.pendingState = PendingState()  # Spend committed by the transactions in the pool
+        self.lock = threading.RLock()  # Serializes changes to the chain and the pool
+        keyFiles = [key] if isinstance(key, str) else list(key or [])
+        # Loads the private key into the wallet if one is provided, otherwise a key is generated on first use
+        self.wallet = Wallet(keyFiles[0] if keyFiles else None)
+        self.keyring = Keyring()  # Validator keys this node forges with
+        self.keyring.add(self.wallet)
+        for keyFile in keyFiles[1:]:
+            self.keyring.load(keyFile)  # Additional validator keys
+        self.operatorToken = None  # Token of the API's operator routes, disabled without one
 
     def startP2P(self):
         """
         Starts the P2P communication for the node using its IP and port.
         """
+        self.transactionPipeline.start()  # Start verifying incoming transactions in the background
         self.p2p = SocketCommunication(self.ip, self.port)  # Set up P2P communication
         self.p2p.startSocketCommunication(self)  # Begin listening for connections
+        self.forgerSchedule.start()  # Start electing the next forger ahead of time
 
-    def startAPI(self, apiPort):
+    def startAPI(self, apiPort, operatorToken=None):
         """
         Starts the node's API on the specified port.
 
         :param apiPort: Port number for the API
+        :param operatorToken: Token the operator routes of the API require, None disables them
         """
+        self.operatorToken = operatorToken
         self.api = NodeAPI()  # Create a new Node API instance
         self.api.injectNode(self)  # Inject the node instance into the API
         self.api.start(apiPort)  # Start the API on the specified port
 
-    def handleTransaction(self, transaction):
+    def handleTransaction(self, transaction, block=True):
         """
         Processes a received transaction.
 
+        While the transaction pipeline is running, the transaction is queued for
+        verification and admission in the background. Otherwise it is processed inline.
+
         :param transaction: The transaction to handle
+        :param block: Wait for room in a saturated pipeline instead of refusing the transaction
+        :return: False if the pipeline is saturated and the transaction was not accepted
+        """
+        if self.transactionPipeline.running:
+            return self.transactionPipeline.submit(transaction, block)  # Backpressure reaches the caller
+        with tracer.trace('transaction', getattr(transaction, 'id', None)):
+            if self.transactionValid(transaction):
+                self.admitTransaction(transaction)
+        return True
+
+    def transactionKnown(self, transaction):
+        """
+        Checks if a received transaction is pending or confirmed already, as when
+        several peers relay it.
+
+        :param transaction: The received transaction
+        :return: True if the transaction is in the pool or its nonce is used in the chain
+        """
+        try:
+            return (self.transactionPool.transactionExists(transaction)
+                    or self.blockchain.transactionExists(transaction))
+        except (AttributeError, ValueError, TypeError):
+            return False  # Malformed, left to `transactionValid`
+
+    def transactionValid(self, transaction):
         """
-        data = transaction.payload()  # Get the transaction payload
-        signature = transaction.signature  # Get the transaction's signature
-        signerPublicKey = transaction.senderPublicKey  # Get the sender's public key
+        Runs the stateless checks of a transaction: its structure and its signature.
 
-        # Validate the signature of the transaction
-        signatureValid = Wallet.signatureValid(data, signature, signerPublicKey)
-        # Check if the transaction already exists in the pool or the blockchain
-        transactionExists = self.transactionPool.transactionExists(transaction)
-        transactionInBlock = self.blockchain.transactionExists(transaction)
+        These checks do not depend on the chain or the pool and can run in parallel.
 
-        if not transactionExists and not transactionInBlock and signatureValid:
-            # If the transaction is new and the signature is valid, add it to the pool
-            self.transactionPool.addTransaction(transaction)
-            message = Message(self.p2p.socketConnector, 'TRANSACTION', transaction)  # Create a transaction message
-            encodedMessage = BlockchainUtils.encode(message)  # Encode the message
-            self.p2p.broadcast(encodedMessage)  # Broadcast the message to other nodes
+        :param transaction: The transaction to check
+        :return: True if the transaction is well formed and correctly signed
+        """
+        try:
+            if not isinstance(transaction, Transaction) or not transaction.wellFormed():
+                return False
+            data = transaction.payload()  # Get the transaction payload
+            signature = transaction.signature  # Get the transaction's signature
+            signerPublicKey = transaction.senderPublicKey  # Get the sender's public key
+            return Wallet.signatureValid(data, signature, signerPublicKey)  # Validate the signature of the transaction
+        except (AttributeError, ValueError, TypeError, IndexError):
+            return False  # Missing fields, malformed key or signature
+
+    def admitTransaction(self, transaction):
+        """
+        Runs the stateful checks of a verified transaction and adds it to the pool.
+
+        A transaction must carry its sender's next nonce, counting the sender's pending
+        transactions. A lower nonce is a duplicate or a replay; a higher one waits in the
+        pool's queue until the transactions before it arrive, if its sender's confirmed
+        balance covers it. Admitted transactions, and the queued ones they let through, are
+        broadcast and may trigger forging.
+
+        :param transaction: A transaction that passed `transactionValid`
+        :return: True if the transaction was added to the pool or queued
+        """
+        with self.lock:
+            # Check if the nonce is already used in the pool or the blockchain
+            with tracer.span('transactionExists'):
+                sender = transaction.senderPublicKey
+                nextNonce = self.blockchain.nextNonce(KeyTable.digest(sender), self.pendingState)
+            if transaction.nonce < nextNonce:
+                return False  # Duplicate or replay
+            if transaction.nonce > nextNonce:
+                confirmedBalance = self.blockchain.accountModel.balances.get(KeyTable.digest(sender), 0)
+                if transaction.type != 'EXCHANGE' and confirmedBalance < transaction.amount:
+                    return False  # Only transactions the confirmed balance pays for wait, like covered ones
+                return self.transactionPool.queueTransaction(transaction)  # Waits for the preceding transactions
+
+            admitted = []
+            while transaction is not None and self.blockchain.transactionCovered(transaction, self.pendingState):
+                # If the transaction is next and covered, add it to the pool
+                transaction.intern()  # Accepted, its keys are shared with the other transactions of the sender
+                self.transactionPool.addTransaction(transaction)
+                self.pendingState.apply(transaction)  # Reserves the amount and the nonce for this transaction
+                admitted.append(transaction)
+                transaction = self.transactionPool.takeQueued(sender, transaction.nonce + 1)  # Its successor may be waiting
+            if not admitted:
+                return False  # The sender cannot pay for it on top of its pending transactions
+            self.eventBus.transactionsAdmitted(admitted)
+            with tracer.span('broadcast'):
+                for admittedTransaction in admitted:
+                    message = Message(self.p2p.socketConnector, 'TRANSACTION', admittedTransaction)  # Create a transaction message
+                    encodedMessage = BlockchainUtils.encode(message)  # Encode the message
+                    self.p2p.broadcast(encodedMessage)  # Broadcast the message to other nodes
 
             # Check if a new block needs to be forged
             forgingRequired = self.transactionPool.forgingRequired()
             if forgingRequired:
                 self.forge()  # Call the forge method to create a block
+            return True
+
+    def handleBlock(self, block, sender=None):
+        """
+        Processes a block received in a BLOCK message.
+
+        Blocks that join the chain are relayed to the other nodes. Blocks of a competing
+        branch are not, as they were not validated yet. For an orphan block, the missing
+        blocks are requested from the node that sent it.
+
+        :param block: The block to handle
+        :param sender: The connection the block was received from
+        :return: The status returned by `acceptBlock`
+        """
+        status = self.acceptBlock(block)
+        if status == 'invalid' and sender is not None:
+            self.p2p.misbehaved(sender, self.p2p.invalidBlockPenalty, 'invalid block')
+        elif status == 'orphan':
+            self.requestChain(sender)  # Ask the sender for the blocks between our chain and this one
+        elif status in ('extended', 'reorg'):
+            with tracer.span('broadcast'):
+                message = Message(self.p2p.socketConnector, 'BLOCK', block)  # Create a block message
+                self.p2p.broadcast(BlockchainUtils.encode(message))  # Broadcast the block
+        return status
 
-    def handleBlock(self, block):
+    def acceptBlock(self, block):
         """
-        Processes a received block.
+        Validates a received block and adds it to the block tree, following the best chain.
 
         :param block: The block to handle
+        :return: The status returned by Blockchain.receiveBlock, or 'invalid'
+        """
+        with tracer.trace('block', getattr(block, 'blockCount', None)):
+            try:
+                forger = block.forger  # Get the block's forger
+                blockHash = block.payload()  # Get the block's data for hashing
+                signature = block.signature  # Get the block's signature
+                signatureValid = Wallet.signatureValid(blockHash, signature, forger)
+                transactionsRootValid = block.transactionsRootValid()  # The signature only covers the header
+            except (AttributeError, ValueError, TypeError, IndexError):
+                return 'invalid'  # Missing fields, malformed key or signature
+            if not signatureValid or not transactionsRootValid:
+                return 'invalid'
+
+            with self.lock:
+                with tracer.span('receiveBlock'):
+                    status, reverted, applied = self.blockchain.receiveBlock(block)
+                if applied:
+                    self.eventBus.blocksChanged(reverted, applied)
+                    self.updatePool(reverted, applied)
+                    self.forgerSchedule.schedule()  # Elect the forger after the new tip
+            return status
+
+    def updatePool(self, reverted, applied):
         """
-        forger = block.forger  # Get the block's forger
-        blockHash = block.payload()  # Get the block's data for hashing
-        signature = block.signature  # Get the block's signature
-
-        # Validate the block
-        blockCountValid = self.blockchain.blockCountValid(block)
-        lastBlockHashValid = self.blockchain.lastBlockHashValid(block)
-        forgerValid = self.blockchain.forgerValid(block)
-        transactionsValid = self.blockchain.transactionsValid(block.transactions)
-        signatureValid = Wallet.signatureValid(blockHash, signature, forger)
-
-        if not blockCountValid:
-            # If the block count is invalid, request the chain
-            self.requestChain()
-        if lastBlockHashValid and forgerValid and transactionsValid and signatureValid:
-            # If the block is valid, add it to the blockchain
-            self.blockchain.addBlock(block)
-            self.transactionPool.removeFromPool(block.transactions)  # Remove transactions from the pool
-            message = Message(self.p2p.socketConnector, 'BLOCK', block)  # Create a block message
-            self.p2p.broadcast(BlockchainUtils.encode(message))  # Broadcast the block
+        Updates the transaction pool after blocks left and joined the chain.
+
+        Transactions of reverted blocks that the new blocks do not contain go back to the pool.
+
+        :param reverted: The blocks removed from the chain
+        :param applied: The blocks added to the chain
+        """
+        with self.lock:
+            appliedIds = set()
+            for block in applied:
+                appliedIds.update(transaction.id for transaction in block.transactions)
+                self.transactionPool.removeFromPool(block.transactions)  # Remove transactions from the pool
+            for block in reverted:
+                for transaction in block.transactions:
+                    if transaction.id not in appliedIds and not self.transactionPool.transactionExists(transaction):
+                        self.transactionPool.addTransaction(transaction)
+            self.revalidatePool()  # Drop pool transactions the new balances no longer cover
+
+    def handleBlockRequest(self, requestingNode, locator):
+        """
+        Sends a node the blocks of the chain it is missing.
+
+        :param requestingNode: The node requesting the blocks
+        :param locator: The requesting node's Blockchain.locator
+        """
+        try:
+            locator = [(int(height), str(blockHash)) for height, blockHash in locator[:Node.maxLocatorSize]]
+        except (TypeError, ValueError):
+            return  # Malformed request
+        with self.lock:
+            heights = self.blockchain.heightsAfter(locator, Node.syncBatchSize)
+            encodedBlocks = self.blockchain.blocks.serialized(heights.start, heights.stop, wire=True)
+        if heights:
+            # Archived blocks are sent as they are stored, without decoding them
+            message = Message(self.p2p.socketConnector, 'BLOCKS', [])  # Create a blocks message
+            self.p2p.send(requestingNode, BlockchainUtils.encodeWithList(message, encodedBlocks))  # Send the blocks
+
+    def handleBlocks(self, blocks, sender=None):
+        """
+        Processes the blocks sent in response to a block request.
+
+        If the response was full, the next blocks are requested from the same node.
+
+        :param blocks: The blocks, parents first
+        :param sender: The connection the blocks were received from
+        """
+        if not isinstance(blocks, list):
+            return
+        status = None
+        for block in blocks:
+            status = self.acceptBlock(block)
+            if status == 'invalid' and sender is not None:
+                self.p2p.misbehaved(sender, self.p2p.invalidBlockPenalty, 'invalid block')
+            if status in ('invalid', 'orphan'):
+                return  # The rest of the batch cannot connect either
+        if len(blocks) >= Node.syncBatchSize:
+            self.requestChain(sender)
 
     def handleBlockchainRequest(self, requestingNode):
         """
         Handles a request for the blockchain from another node.
 
+        A pruned node does not answer: the peer replays the chain from the genesis block
+        and cannot validate blocks without their transactions, see Blockchain.heightsAfter.
+
         :param requestingNode: The node requesting the blockchain
         """
-        message = Message(self.p2p.socketConnector, 'BLOCKCHAIN', self.blockchain)  # Create a blockchain message
-        self.p2p.send(requestingNode, BlockchainUtils.encode(message))  # Send the blockchain to the requesting node
+        with self.lock:
+            if not self.blockchain.blocks.hasTransactions(1):
+                return  # The transactions of the first blocks were dropped
+            encodedBlocks = self.blockchain.blocks.serialized(wire=True)
+        emptyBlockchain = Blockchain.__new__(Blockchain)
+        emptyBlockchain.blocks = []  # Its blocks are filled in as they are stored
+        message = Message(self.p2p.socketConnector, 'BLOCKCHAIN', emptyBlockchain)  # Create a blockchain message
+        self.p2p.send(requestingNode, BlockchainUtils.encodeWithList(message, encodedBlocks))  # Send the blockchain
 
     def handleBlockchain(self, blockchain):
         """
         Processes a received blockchain.
 
+        Its blocks go through the block tree one by one, so only blocks that connect to
+        known blocks and pass validation are used, and a better chain causes a reorg.
+
         :param blockchain: The blockchain to handle
         """
-        localBlockchainCopy = copy.deepcopy(self.blockchain)  # Make a copy of the local blockchain
-        localBlockCount = len(localBlockchainCopy.blocks)  # Count local blocks
-        receivedChainBlockCount = len(blockchain.blocks)  # Count received chain blocks
-
-        if localBlockCount < receivedChainBlockCount:
-            # If the received blockchain is longer, add the new blocks
-            for blockNumber, block in enumerate(blockchain.blocks):
-                if blockNumber >= localBlockCount:
-                    localBlockchainCopy.addBlock(block)  # Add the block to the copy
-                    self.transactionPool.removeFromPool(block.transactions)  # Remove transactions from the pool
-            self.blockchain = localBlockchainCopy  # Update the local blockchain
+        for block in getattr(blockchain, 'blocks', [])[1:]:  # The genesis block is known
+            if self.acceptBlock(block) in ('invalid', 'orphan'):
+                return  # The rest of the chain cannot connect either
 
+    @tracer.stage('forge')
     def forge(self):
         """
         Forges a new block if this node is the forger.
         """
-        forger = self.blockchain.nextForger()  # Get the next forger
-        if forger == self.wallet.publicKeyString():  # Check if this node is the forger
-            print('I am the forger')  # Log message
-            block = self.blockchain.createBlock(self.transactionPool.transactions, self.wallet)  # Create a new block
-            self.transactionPool.removeFromPool(self.transactionPool.transactions)  # Remove transactions from the pool
-            message = Message(self.p2p.socketConnector, 'BLOCK', block)  # Create a block message
-            self.p2p.broadcast(BlockchainUtils.encode(message))  # Broadcast the block
-        else:
-            print('I am not the forger')  # Log message if not the forger
+        with self.lock:
+            forger = self.blockchain.nextForger()  # Get the next forger
+            forgerWallet = self.keyring.wallet(forger)  # Check if one of this node's keys is the forger
+            if forgerWallet is not None:
+                print('I am the forger')  # Log message
+                block = self.blockchain.createBlock(self.transactionPool.transactions, forgerWallet)  # Create a new block
+                self.eventBus.blocksChanged([], [block])
+                self.transactionPool.removeFromPool(block.transactions)  # Remove the forged transactions from the pool
+                self.revalidatePool()  # Drop pool transactions the new balances no longer cover
+                self.forgerSchedule.schedule()  # Elect the forger after the new block
+                message = Message(self.p2p.socketConnector, 'BLOCK', block)  # Create a block message
+                self.p2p.broadcast(BlockchainUtils.encode(message))  # Broadcast the block
+            else:
+                print('I am not the forger')  # Log message if not the forger
+
+    def revalidatePool(self):
+        """
+        Rebuilds the pending state of the pool after the confirmed balances and nonces changed.
+
+        Pool and queued transactions are re-checked in nonce order, which keeps every
+        sender's transactions in sequence, against the new state plus the transactions
+        kept before them. Transactions whose nonce is confirmed and those no longer covered
+        are dropped; transactions after a gap wait in the queue. Queued transactions whose
+        gap a block filled join the pool and are broadcast, as they were not yet.
+        """
+        with self.lock:
+            pendingState = PendingState()
+            transactions = []
+            queued = []
+            wasQueued = self.transactionPool.queuedTransactions()
+            candidates = self.transactionPool.transactions + wasQueued
+            for transaction in sorted(candidates, key=lambda candidate: candidate.nonce):  # Stable, keeps the pool order otherwise
+                nextNonce = self.blockchain.nextNonce(KeyTable.digest(transaction.senderPublicKey), pendingState)
+                if transaction.nonce > nextNonce:
+                    queued.append(transaction)
+                elif transaction.nonce == nextNonce and self.blockchain.transactionCovered(transaction, pendingState):
+                    transactions.append(transaction)
+                    pendingState.apply(transaction)
+            arrival = {transaction.id: position for position, transaction in enumerate(wasQueued)}
+            queued.sort(key=lambda transaction: arrival.get(transaction.id, len(arrival)))  # Oldest first again
+            self.transactionPool.replace(transactions, queued)
+            self.pendingState = pendingState
+            promoted = [transaction for transaction in wasQueued if self.transactionPool.transactionExists(transaction)]
+            self.eventBus.transactionsAdmitted(promoted)
+            if promoted and self.p2p is not None:
+                with tracer.span('broadcast'):
+                    for transaction in promoted:
+                        message = Message(self.p2p.socketConnector, 'TRANSACTION', transaction)  # Create a transaction message
+                        self.p2p.broadcast(BlockchainUtils.encode(message))  # Broadcast the message to other nodes
 
-    def requestChain(self):
+    def nextNonce(self, digest):
         """
-        Requests the blockchain from other nodes.
+        Returns the nonce the next transaction of an account must have to enter the pool.
+
+        :param digest: The key digest of the account
+        :return: The nonce following the account's confirmed and pending transactions
+        """
+        with self.lock:
+            return self.blockchain.nextNonce(digest, self.pendingState)
+
+    def requestChain(self, peer=None):
         """
-        message = Message(self.p2p.socketConnector, 'BLOCKCHAINREQUEST', None)  # Create a blockchain request message
-        self.p2p.broadcast(BlockchainUtils.encode(message))  # Broadcast the request
+        Requests the blocks this node is missing.
+
+        :param peer: The connection to ask, all connected nodes are asked if None
+        """
+        with self.lock:
+            locator = self.blockchain.locator()  # Tells the peer which blocks we already have
+        message = Message(self.p2p.socketConnector, 'BLOCKREQUEST', locator)  # Create a block request message
+        if peer is None:
+            self.p2p.broadcast(BlockchainUtils.encode(message))  # Broadcast the request
+        else:
+            self.p2p.send(peer, BlockchainUtils.encode(message))  # Send the request to the peer
@@ -1,12 +1,90 @@
 from flask_classful import FlaskView, route
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from BlockchainUtils import BlockchainUtils
+from Tracer import tracer
+from KeyTable import KeyTable
+from RateLimiter import RateLimiter
+from ResponseCache import ResponseCache
+from EventBus import EventBus
+import hmac
+import math
 
 node = None  # Global variable to store the node instance
+# Limits of the requests of every IP address as (requests per second, burst); a view instance is created per request
+requestLimiter = RateLimiter({'read': (50, 200), 'write': (20, 100), 'profile': (0.1, 2)})
+responseCache = ResponseCache()  # Serialized responses of the chain and the pool, kept across requests
+
+
+def digestValid(digest):
+    """
+    :param digest: A key digest given in a route
+    :return: True if the digest has the format of KeyTable.digest, False otherwise
+    """
+    try:
+        int(digest, 16)
+    except ValueError:
+        return False
+    return len(digest) == 40
+
+
+def operatorRefusal():
+    """
+    Checks that a request to an operator route carries the node's operator token.
+
+    Operator routes make the node sign with its validator keys or slow it down with
+    tracing and profiling, so they are disabled unless the operator configured a token,
+    which requests send as 'Authorization: Bearer <token>'.
+
+    :return: The error response, or None if the request is authorized
+    """
+    token = node.operatorToken
+    if not token:
+        return 'Operator routes are disabled, set OPERATOR_TOKEN to enable them', 403
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), ('Bearer ' + token).encode('utf-8')):
+        return 'Unauthorized', 401
+    return None
+
+
+def cachedResponse(body, etag):
+    """
+    Builds the response of a cached route, which clients must revalidate before using their copy.
+
+    :param body: The JSON body as bytes, or a generator of chunks of it, None for a 304 response
+    :param etag: The entity tag of the body, unquoted
+    :return: The response
+    """
+    if body is None:
+        response = Response(status=304)
+    else:
+        response = Response(body, 200, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def replayBlocks(start, stop, batchSize=100):
+    """
+    Serializes the 'block' events of a range of the chain, taking the node's lock per batch of blocks.
+
+    :param start: The height of the first block
+    :param stop: The height after the last block
+    :param batchSize: Number of blocks read with the lock held
+    :return: A generator of the events, see EventBus.blockEvent
+    """
+    for batchStart in range(start, stop, batchSize):
+        with node.lock:
+            blocks = node.blockchain.blocks
+            heights = range(batchStart, min(batchStart + batchSize, stop, len(blocks)))  # The chain may have shrunk
+            events = [EventBus.blockEvent(blocks[height], blocks.hash(height)) for height in heights]
+        yield from events
 
 
 class NodeAPI(FlaskView):
     # Class to manage the Node's API
+    defaultPageSize = 50  # Number of entries of a history page unless a limit is given
+    maxPageSize = 500  # Number of entries of a history page at most
+    maxBatchSize = 1000  # Number of transactions of a batch at most
 
     def __init__(self):
         self.app = Flask(__name__)  # Initializes the Flask application
@@ -20,6 +98,22 @@ class NodeAPI(FlaskView):
         NodeAPI.register(self.app, route_base='/')  # Registers the class as a controller
         self.app.run(host='localhost', port=port)  # Starts the Flask server
 
+    def before_request(self, name, *args, **kwargs):
+        """
+        Refuses the requests of an IP address beyond its rate limits.
+
+        :param name: The name of the route's method
+        :return: A 429 response if the request is refused, None otherwise
+        """
+        if name == 'profile':
+            kind = 'profile'  # Profiling sessions slow the node down
+        else:
+            kind = 'read' if request.method == 'GET' else 'write'
+        if requestLimiter.allow(request.remote_addr, kind):
+            return None
+        retryAfter = math.ceil(requestLimiter.retryAfter(request.remote_addr, kind)) or 1
+        return jsonify({'message': 'Too many requests'}), 429, {'Retry-After': str(retryAfter)}
+
     def injectNode(self, injectedNode):
         """
         Injects the node instance into the class.
@@ -43,21 +137,96 @@ class NodeAPI(FlaskView):
         """
         Route to get the JSON representation of the blockchain.
 
+        The chain is streamed, and archived blocks are sent as they are stored. The
+        response is kept until a block joins or leaves the chain, and a request whose
+        If-None-Match holds its entity tag gets a 304 without the chain being read.
+
         :return: The blockchain in JSON format
         """
-        return node.blockchain.toJson(), 200
+        version = node.blockchain.version
+        etag = responseCache.etag('blockchain', version)
+        if request.if_none_match.contains(etag):
+            return cachedResponse(None, etag)
+        body = responseCache.body('blockchain', version)
+        if body is None:
+            with node.lock:
+                version = node.blockchain.version
+                chunks = node.blockchain.serializedJson()
+            etag = responseCache.etag('blockchain', version)
+            body = responseCache.capture('blockchain', version, chunks)
+        return cachedResponse(body, etag)
+
+    @route('/events', methods=['GET'])
+    def events(self):
+        """
+        Route to subscribe to new blocks and pool transactions as Server-Sent Events.
+
+        Optional query parameters: `types` (comma separated topics, 'block' and 'transaction'
+        by default, see EventBus) and `fromHeight` (sends the blocks of the chain from this
+        height first). A client reconnecting with the Last-Event-ID header resumes after the
+        last block it got. Blocks of a replaced branch can be followed by 'revert' events;
+        clients check each block's lastHash against the block before it.
+
+        :return: The stream of events
+        """
+        topics = set((request.args.get('types') or 'block,transaction').split(','))
+        if not topics <= EventBus.topics:
+            return 'Invalid event types', 400
+        fromHeight = request.args.get('fromHeight', type=int)
+        lastEventId = request.headers.get('Last-Event-ID')
+        if fromHeight is None and lastEventId:
+            try:
+                fromHeight = int(lastEventId) + 1  # The id of a block event is its height
+            except ValueError:
+                return 'Invalid Last-Event-ID', 400
+        with node.lock:  # Blocks are published with the lock held, so none is missed or sent twice
+            subscriptionId = node.eventBus.subscribe(topics)
+            stop = len(node.blockchain.blocks)
+        if subscriptionId is None:
+            return jsonify({'message': 'Too many subscribers'}), 503, {'Retry-After': '10'}
+        replayed = ()
+        if fromHeight is not None and 'block' in topics:
+            replayed = replayBlocks(max(fromHeight, 0), stop)
+        response = Response(node.eventBus.stream(subscriptionId, replayed), 200, mimetype='text/event-stream')
+        # Also ends the subscription of a client gone before the stream started, whose generator never runs
+        response.call_on_close(lambda: node.eventBus.unsubscribe(subscriptionId))
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # Proxies must not hold the events back
+        return response
+
+    @route('/forks', methods=['GET'])
+    def forks(self):
+        """
+        Route to get the competing branches and orphan blocks known to the node.
+
+        :return: The tips of the block tree and the number of orphan and invalid blocks as JSON
+        """
+        with node.lock:
+            response = node.blockchain.blockTree.toJson()
+            response['bestTip'] = node.blockchain.blocks.hash(-1)
+        return jsonify(response), 200
 
     @route('/transactionPool', methods=['GET'])
     def transactionPool(self):
         """
         Route to get the transaction pool.
 
+        The response is kept until the pool changes, see `blockchain`.
+
         :return: A JSON object with the transactions in the pool
         """
-        transactions = {}
-        for ctr, transaction in enumerate(node.transactionPool.transactions):
-            transactions[ctr] = transaction.toJson()  # Adds each transaction to the dictionary
-        return jsonify(transactions), 200  # Returns the transactions as JSON
+        generation = node.transactionPool.generation  # Taken first, a change while serializing makes it stale
+        etag = responseCache.etag('transactionPool', generation)
+        if request.if_none_match.contains(etag):
+            return cachedResponse(None, etag)
+        body = responseCache.body('transactionPool', generation)
+        if body is None:
+            transactions = {}
+            for ctr, transaction in enumerate(node.transactionPool.transactions):
+                transactions[ctr] = transaction.toJson()  # Adds each transaction to the dictionary
+            body = jsonify(transactions).get_data()
+            responseCache.store('transactionPool', generation, body)
+        return cachedResponse(body, etag)  # Returns the transactions as JSON
 
     @route('/transaction', methods=['POST'])
     def transaction(self):
@@ -69,7 +238,324 @@ class NodeAPI(FlaskView):
         values = request.get_json()  # Gets the JSON data from the request
         if not 'transaction' in values:
             return 'Missing transaction value', 400  # Returns an error if no transaction is provided
-        transaction = BlockchainUtils.decode(values['transaction'])  # Decodes the transaction
-        node.handleTransaction(transaction)  # Processes the transaction in the node
+        with tracer.trace('transaction'):
+            transaction = BlockchainUtils.decode(values['transaction'])  # Decodes the transaction
+            accepted = node.handleTransaction(transaction, block=False)  # Processes the transaction in the node
+        if not accepted:
+            # The ingest pipeline is saturated, the client should retry later
+            return jsonify({'message': 'Node is busy'}), 503, {'Retry-After': '1'}
         response = {'message': 'Received transaction'}  # Success response
         return jsonify(response), 201  # Returns the success message as JSON
+
+    @route('/transactions', methods=['POST'])
+    def transactions(self):
+        """
+        Route to receive a batch of transactions in one request.
+
+        Accepts a JSON object with `transactions`, a list of encoded transactions. Every
+        transaction is handled as by `transaction`; one that cannot be decoded does not
+        fail the others.
+
+        :return: The status of every transaction, 'received', 'busy' (the pipeline refused it) or
+                 'invalid', and the number received, as JSON; a 503 if the pipeline refused all of them
+        """
+        values = request.get_json(silent=True) or {}
+        encodedTransactions = values.get('transactions')
+        if not isinstance(encodedTransactions, list):
+            return 'Missing transactions value', 400
+        if len(encodedTransactions) > NodeAPI.maxBatchSize:
+            return 'Too many transactions, at most ' + str(NodeAPI.maxBatchSize), 413
+        statuses = []
+        for encodedTransaction in encodedTransactions:
+            with tracer.trace('transaction'):
+                try:
+                    transaction = BlockchainUtils.decode(encodedTransaction)
+                except Exception:
+                    statuses.append('invalid')
+                    continue
+                statuses.append('received' if node.handleTransaction(transaction, block=False) else 'busy')
+        response = {'statuses': statuses, 'received': statuses.count('received')}
+        if statuses and statuses.count('busy') == len(statuses):
+            return jsonify(response), 503, {'Retry-After': '1'}
+        return jsonify(response), 201
+
+    @route('/transaction/<transactionId>/proof', methods=['GET'])
+    def transactionProof(self, transactionId):
+        """
+        Route to get the inclusion proof of a confirmed transaction.
+
+        Required query parameter: `blockCount`, the height of the block holding the
+        transaction, as listed by /account/<digest>/transactions or the block events. The
+        node does not search the chain for it. The proof can be checked against the header's transactions root
+        with MerkleTree.verifyProof.
+
+        :param transactionId: The id of the transaction
+        :return: The block header and hash, the transaction, its index and the sibling hashes as JSON
+        """
+        blockCount = request.args.get('blockCount', type=int)
+        if blockCount is None:
+            return 'The blockCount query parameter is required', 400
+        with node.lock:
+            if not 0 <= blockCount < len(node.blockchain.blocks):
+                return 'Unknown transaction', 404
+            block = node.blockchain.blocks[blockCount]  # Only the block is read under the lock
+        proof = node.blockchain.transactionProof(block, transactionId)
+        if proof is None:
+            return 'Unknown transaction', 404
+        return jsonify(proof), 200
+
+    @route('/forger', methods=['GET'])
+    def forger(self):
+        """
+        Route to get the forger of the next block.
+
+        The forger is normally elected in the background as soon as the last block was
+        accepted; otherwise it is elected now.
+
+        :return: The height and parent hash of the next block, its forger and the schedule state as JSON
+        """
+        with node.lock:
+            response = {}
+            response['blockCount'] = len(node.blockchain.blocks)
+            response['lastHash'] = node.blockchain.blocks.hash(-1)
+            response['precomputed'] = response['lastHash'] in node.blockchain.forgers
+            response['forger'] = node.blockchain.nextForger()
+            response['self'] = response['forger'] in node.keyring
+        response['schedule'] = node.forgerSchedule.toJson()
+        return jsonify(response), 200
+
+    @route('/keyring', methods=['GET'])
+    def keyring(self):
+        """
+        Route to get the validator keys of the node with their stake and balance.
+
+        :return: The keys and the number of signing workers as JSON
+        """
+        with node.lock:
+            keys = []
+            for publicKeyString in node.keyring.publicKeys():
+                key = {}
+                key['digest'] = KeyTable.digest(publicKeyString)
+                key['stake'] = node.blockchain.pos.get(publicKeyString) or 0
+                key['balance'] = node.blockchain.accountModel.balances.get(key['digest'], 0)
+                key['nonce'] = node.blockchain.nextNonce(key['digest'], node.pendingState)
+                keys.append(key)
+        return jsonify({'keys': keys, 'workers': node.keyring.workerCount}), 200
+
+    @route('/keyring/stake', methods=['POST'])
+    def stakeKeyring(self):
+        """
+        Route to stake an amount with every validator key of the node.
+
+        Accepts a JSON object with the `amount` to stake and optionally `keys`, the
+        digests of the keys to stake with (all keys by default). The transactions are
+        signed on the keyring's signing workers. The request must carry the operator
+        token, see `operatorRefusal`.
+
+        :return: The ids of the submitted stake transactions as JSON, and how many the busy pipeline refused
+        """
+        refusal = operatorRefusal()
+        if refusal is not None:
+            return refusal
+        values = request.get_json(silent=True) or {}
+        amount = values.get('amount')
+        if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+            return 'Invalid amount', 400
+        digests = values.get('keys')
+        publicKeys = [publicKeyString for publicKeyString in node.keyring.publicKeys()
+                      if digests is None or KeyTable.digest(publicKeyString) in digests]
+        with node.lock:
+            requests = [(publicKeyString, publicKeyString, amount, 'STAKE', node.nextNonce(KeyTable.digest(publicKeyString)))
+                        for publicKeyString in publicKeys]
+        transactions = node.keyring.createTransactions(requests)
+        submitted = [transaction.id for transaction in transactions if node.handleTransaction(transaction, block=False)]
+        return jsonify({'submitted': submitted, 'busy': len(transactions) - len(submitted)}), 201
+
+    @route('/state', methods=['GET'])
+    def state(self):
+        """
+        Route to get the state root of the latest block.
+
+        :return: The block count and state root as JSON
+        """
+        with node.lock:
+            response = {'blockCount': node.blockchain.blocks[-1].blockCount, 'stateRoot': node.blockchain.stateRoot()}
+        return jsonify(response), 200
+
+    @route('/state/<digest>', methods=['GET'])
+    def stateProof(self, digest):
+        """
+        Route to get the balance, stake and nonce of an account with their inclusion proof.
+
+        The proof can be checked against a state root with StateTree.verifyProof.
+
+        :param digest: The key digest of the account (see KeyTable.digest)
+        :return: The state root, the account's balance, stake and nonce and the sibling hashes as JSON
+        """
+        if not digestValid(digest):
+            return 'Invalid digest', 400
+        with node.lock:
+            proof = node.blockchain.stateProof(digest.lower())
+        if proof is None:
+            return 'Unknown account', 404
+        return jsonify(proof), 200
+
+    @route('/nonce/<digest>', methods=['GET'])
+    def nonce(self, digest):
+        """
+        Route to get the nonce the next transaction of an account must have.
+
+        Counts the account's transactions waiting in the pool, so a client can sign its
+        next transaction before the previous ones are confirmed.
+
+        :param digest: The key digest of the account (see KeyTable.digest)
+        :return: The digest and the next nonce as JSON
+        """
+        if not digestValid(digest):
+            return 'Invalid digest', 400
+        return jsonify({'digest': digest.lower(), 'nonce': node.nextNonce(digest.lower())}), 200
+
+    @route('/account/<digest>/transactions', methods=['GET'])
+    def accountTransactions(self, digest):
+        """
+        Route to get the transactions sent or received by an account, newest first.
+
+        Needs the account index (ACCOUNT_INDEX). Optional query parameters: `limit` (number
+        of transactions, default 50) and `cursor` (the `next` value of the previous page).
+
+        :param digest: The key digest of the account (see KeyTable.digest)
+        :return: The account's number of transactions, a page of their positions and contents and
+                 the cursor of the next page as JSON
+        """
+        if not digestValid(digest):
+            return 'Invalid digest', 400
+        if node.blockchain.accountIndex is None:
+            return 'Account index is not enabled', 404
+        digest = digest.lower()
+        limit = min(request.args.get('limit', NodeAPI.defaultPageSize, type=int), NodeAPI.maxPageSize)
+        cursor = request.args.get('cursor', type=int)
+        with node.lock:
+            try:
+                positions, cursor = node.blockchain.accountIndex.transactions(digest, cursor, max(limit, 1))
+            except ValueError:
+                return 'Invalid cursor', 400
+            transactions = []
+            for blockCount, index in positions:
+                blockTransactions = node.blockchain.blocks[blockCount].transactions  # None if pruned
+                transaction = blockTransactions[index].toJson() if blockTransactions is not None else None
+                transactions.append({'blockCount': blockCount, 'index': index, 'transaction': transaction})
+            total = node.blockchain.accountIndex.postings.counts.get(digest, 0)
+        return jsonify({'digest': digest, 'total': total, 'transactions': transactions, 'next': cursor}), 200
+
+    @route('/validator/<digest>/stakes', methods=['GET'])
+    def validatorStakes(self, digest):
+        """
+        Route to get the stake changes of a validator, newest first.
+
+        Needs the account index (ACCOUNT_INDEX). Optional query parameters: `limit` (number
+        of changes, default 50) and `cursor` (the `next` value of the previous page).
+
+        :param digest: The key digest of the validator (see KeyTable.digest)
+        :return: The validator's number of stake changes, a page of them with the stake after each
+                 change and the cursor of the next page as JSON
+        """
+        if not digestValid(digest):
+            return 'Invalid digest', 400
+        if node.blockchain.accountIndex is None:
+            return 'Account index is not enabled', 404
+        digest = digest.lower()
+        limit = min(request.args.get('limit', NodeAPI.defaultPageSize, type=int), NodeAPI.maxPageSize)
+        cursor = request.args.get('cursor', type=int)
+        with node.lock:
+            try:
+                changes, cursor = node.blockchain.accountIndex.stakeChanges(digest, cursor, max(limit, 1))
+            except ValueError:
+                return 'Invalid cursor', 400
+            total = node.blockchain.accountIndex.stakes.counts.get(digest, 0)
+        return jsonify({'digest': digest, 'total': total, 'changes': changes, 'next': cursor}), 200
+
+    @route('/peers', methods=['GET'])
+    def peers(self):
+        """
+        Route to get the peers of the node with the resources they used.
+
+        :return: The connected peers, and for every peer seen the messages it sent by type, the
+                 messages refused by the rate limits, the bytes received and sent, the CPU time
+                 spent on its messages, and the misbehavior score of its host and how long the host is still
+                 banned, as JSON
+        """
+        connected = [{'id': peer.id, 'host': peer.host, 'port': peer.port} for peer in node.p2p.all_nodes]
+        return jsonify({'connected': connected, 'peers': node.p2p.peerAccounting.toJson()}), 200
+
+    @route('/pipeline', methods=['GET'])
+    def pipeline(self):
+        """
+        Route to get the state of the transaction ingest pipeline.
+
+        :return: Queue depths and counters of the pipeline as JSON
+        """
+        return jsonify(node.transactionPipeline.toJson()), 200
+
+    @route('/trace', methods=['GET'])
+    def trace(self):
+        """
+        Route to get the per-stage timing traces of blocks and transactions.
+
+        Optional query parameters: `kind` ('block', 'transaction', ...) and `limit`
+        (number of recent traces to include).
+
+        :return: The tracer settings, per-stage summary and recent traces as JSON
+        """
+        kind = request.args.get('kind')
+        limit = request.args.get('limit', type=int)
+        return jsonify(tracer.toJson(kind, limit)), 200
+
+    @route('/trace', methods=['POST'])
+    def configureTrace(self):
+        """
+        Route to turn tracing on or off at runtime.
+
+        Accepts a JSON object with the optional keys `enabled`, `sampleRate`,
+        `maxTraces` and `reset`. Requires the operator token, as tracing slows the node down.
+
+        :return: The new tracer settings as JSON
+        """
+        refusal = operatorRefusal()
+        if refusal is not None:
+            return refusal
+        values = request.get_json(silent=True) or {}
+        if values.get('reset'):
+            tracer.reset()  # Discards the collected traces
+        try:
+            tracer.configure(values.get('enabled'), values.get('sampleRate'), values.get('maxTraces'))
+        except (TypeError, ValueError):
+            return 'Invalid trace configuration', 400
+        return jsonify({'enabled': tracer.enabled, 'sampleRate': tracer.sampleRate}), 200
+
+    @route('/trace/profile', methods=['GET'])
+    def profile(self):
+        """
+        Route to take a cProfile snapshot of the traced hot paths.
+
+        Optional query parameters: `seconds` (length of the session, default 5),
+        `sort` (pstats sort key, default 'cumulative') and `limit` (default 40). Requires
+        the operator token, as profiling slows the node down.
+
+        :return: The pstats report as plain text
+        """
+        refusal = operatorRefusal()
+        if refusal is not None:
+            return refusal
+        seconds = request.args.get('seconds', 5, type=float)
+        if not math.isfinite(seconds) or seconds <= 0:
+            return 'Invalid seconds, a positive number is required', 400
+        seconds = min(seconds, 300)  # Caps the session length
+        sort = request.args.get('sort', 'cumulative')
+        limit = request.args.get('limit', 40, type=int)
+        try:
+            report = tracer.profile(seconds, sort, limit)
+        except RuntimeError as error:
+            return str(error), 409  # Another profile session is already running
+        except KeyError:
+            return 'Invalid sort key', 400
+        return report, 200, {'Content-Type': 'text/plain'}
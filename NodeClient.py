@@ -0,0 +1,253 @@
+import json  # Data of the subscribed events
+import threading  # The client is shared by the caller's threads
+import time  # Failed nodes are skipped for a while
+from concurrent.futures import ThreadPoolExecutor  # Batches in flight at the same time
+import requests  # HTTP sessions
+from requests.adapters import HTTPAdapter  # Connection pool of the sessions
+from BlockchainUtils import BlockchainUtils  # Encoding of the submitted transactions
+from Keyring import Keyring  # Signing worker pool
+from EventBus import EventBus  # Keepalive interval of the event streams
+from KeyTable import KeyTable  # Key digests the API identifies accounts by
+
+
+class NodeClient():
+    """
+    Client of the NodeAPI of one or more nodes.
+
+    Requests go over a session with a pool of keep-alive connections to every node, so
+    a client sending many requests does not open a connection for each. The nodes are
+    tried in order, starting with the last one that answered: a node that cannot be
+    reached or fails with a server error is skipped for `downSeconds`, and a node that
+    is busy (429 or 503) is passed over for the request, so the client fails over to
+    the other nodes. Submitting a transaction twice is harmless, a node refuses a nonce
+    that is already used.
+
+    Transactions are signed in batches on a pool of signing workers (see Keyring) and
+    submitted in batches, several of them in flight at the same time.
+    """
+    downSeconds = 5  # Seconds a node that failed is skipped, unless all nodes failed
+    busyStatuses = (429, 503)  # Statuses of a node that refuses requests for now
+    maxReconnectDelay = 30  # Seconds waited at most before following the events again
+
+    def __init__(self, urls, timeout=5.0, poolSize=10, signingWorkers=None):
+        """
+        Initializes a client.
+
+        :param urls: The base URLs of the node APIs, e.g. 'http://localhost:5000', in order of preference
+        :param timeout: Seconds to wait for a node to connect and to answer
+        :param poolSize: Number of keep-alive connections kept per node
+        :param signingWorkers: Number of signing workers (defaults to the number of CPUs)
+        """
+        if isinstance(urls, str):
+            urls = [urls]
+        self.urls = [url.rstrip('/') for url in urls]
+        self.timeout = timeout
+        self.poolSize = poolSize
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=poolSize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.downUntil = [0.0] * len(self.urls)  # Time until which every node is skipped
+        self.current = 0  # Index of the node that answered last
+        self.lock = threading.Lock()
+        self.keyring = Keyring(signingWorkers)  # Wallets of the signed transactions
+        self.executor = None  # Batches in flight, started on first use
+
+    def endpoints(self):
+        """
+        :return: The indexes of the nodes to try, the last one that answered first and the failed ones last
+        """
+        now = time.monotonic()
+        with self.lock:
+            order = [(self.current + offset) % len(self.urls) for offset in range(len(self.urls))]
+            return sorted(order, key=lambda index: self.downUntil[index] > now)  # Stable, keeps the order otherwise
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request to the first node able to answer it.
+
+        :param method: The HTTP method
+        :param path: The path of the route, starting with '/'
+        :param kwargs: Further arguments of requests.Session.request, the timeout defaults to the client's
+        :return: The response, that of the last node tried if all of them are busy
+        :raises requests.ConnectionError: If no node could be reached
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        response = None
+        error = None
+        for index in self.endpoints():
+            try:
+                response = self.session.request(method, self.urls[index] + path, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as requestError:
+                error = requestError
+                self.failed(index)
+                continue
+            if response.status_code >= 500 and response.status_code not in NodeClient.busyStatuses:
+                self.failed(index)
+                continue
+            if response.status_code in NodeClient.busyStatuses:
+                continue  # Another node may have room
+            with self.lock:
+                self.current = index
+            return response
+        if response is not None:
+            return response
+        raise requests.ConnectionError('No node could be reached: ' + str(error))
+
+    def failed(self, index):
+        """
+        Skips a node that failed for `downSeconds`.
+
+        :param index: The index of the node
+        """
+        with self.lock:
+            self.downUntil[index] = time.monotonic() + NodeClient.downSeconds
+
+    def get(self, path, **params):
+        """
+        :param path: The path of the route, starting with '/'
+        :param params: The query parameters
+        :return: The JSON of the response
+        :raises requests.HTTPError: If the request failed
+        """
+        response = self.request('GET', path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def nonce(self, digest):
+        """
+        :param digest: The key digest of an account
+        :return: The nonce the next transaction of the account must have, counting its pending transactions
+        """
+        return self.get('/nonce/' + digest)['nonce']
+
+    def syncNonce(self, wallet):
+        """
+        Continues the wallet's nonce counter after the transactions its key already sent.
+
+        :param wallet: The wallet whose key may have sent transactions before
+        """
+        wallet.nonce = self.nonce(KeyTable.digest(wallet.publicKeyString()))
+
+    def createTransactions(self, requests):
+        """
+        Creates and signs transactions on the signing workers, numbering them with the wallets' nonce counters.
+
+        :param requests: List of (wallet, receiverPublicKeyString, amount, type) tuples
+        :return: The signed transactions, in the order of the requests
+        """
+        keyringRequests = []
+        for wallet, receiver, amount, type in requests:
+            publicKeyString = wallet.publicKeyString()  # Generates the key of a new wallet
+            if publicKeyString not in self.keyring:
+                self.keyring.add(wallet)
+            keyringRequests.append((publicKeyString, receiver, amount, type, wallet.nonce))
+            wallet.nonce += 1
+        return self.keyring.createTransactions(keyringRequests)
+
+    def submit(self, transaction):
+        """
+        Submits a transaction.
+
+        :param transaction: The signed transaction
+        :return: True if a node received it, False if all nodes were busy
+        """
+        package = {'transaction': BlockchainUtils.encode(transaction)}
+        response = self.request('POST', '/transaction', json=package)
+        if response.status_code in NodeClient.busyStatuses:
+            return False
+        response.raise_for_status()
+        return True
+
+    def submitBatch(self, transactions):
+        """
+        Submits transactions in a single request.
+
+        :param transactions: The signed transactions, at most NodeAPI.maxBatchSize
+        :return: The status of every transaction: 'received', 'busy' or 'invalid'
+        """
+        package = {'transactions': [BlockchainUtils.encode(transaction) for transaction in transactions]}
+        response = self.request('POST', '/transactions', json=package)
+        if response.status_code in NodeClient.busyStatuses:
+            return ['busy'] * len(transactions)
+        response.raise_for_status()
+        return response.json()['statuses']
+
+    def submitAll(self, transactions, batchSize=100, inFlight=4):
+        """
+        Submits transactions in batches, with several batches in flight at the same time.
+
+        The batches may reach the nodes in any order, so the transactions of a sender must
+        be in one batch, or its later transactions may wait in the pool's queue for a while.
+
+        :param transactions: The signed transactions
+        :param batchSize: Number of transactions per request
+        :param inFlight: Number of requests sent at the same time
+        :return: The status of every transaction, in order, see `submitBatch`
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.poolSize, thread_name_prefix='client')
+        batches = [transactions[start:start + batchSize] for start in range(0, len(transactions), batchSize)]
+        statuses = []
+        for start in range(0, len(batches), inFlight):
+            for batchStatuses in self.executor.map(self.submitBatch, batches[start:start + inFlight]):
+                statuses.extend(batchStatuses)
+        return statuses
+
+    def events(self, types=('block', 'transaction'), fromHeight=None):
+        """
+        Follows the events of the nodes, see NodeAPI.events.
+
+        If the connection is lost, or no node takes the subscription, e.g. because all of
+        them are busy, the client waits, longer after every failed attempt, and reconnects,
+        to another node if needed. It resumes after the last block it got.
+
+        :param types: The topics of the events
+        :param fromHeight: The height of the first block to send, None for new blocks only
+        :return: A generator of (eventType, data) tuples
+        """
+        params = {'types': ','.join(types)}
+        timeout = (self.timeout, EventBus.keepaliveInterval + self.timeout)  # Waits for the keepalives
+        delay = 1
+        while True:
+            if fromHeight is not None:
+                params['fromHeight'] = fromHeight
+            try:
+                response = self.request('GET', '/events', params=params, stream=True, timeout=timeout)
+            except requests.ConnectionError:
+                response = None  # No node can be reached for now
+            if response is not None and 400 <= response.status_code < 500 and response.status_code not in NodeClient.busyStatuses:
+                response.raise_for_status()  # The request itself is wrong, e.g. an unknown topic
+            if response is None or response.status_code != 200:
+                retryAfter = response.headers.get('Retry-After', '') if response is not None else ''
+                if response is not None:
+                    response.close()  # Busy, or failing
+                time.sleep(min(int(retryAfter), NodeClient.maxReconnectDelay) if retryAfter.isdigit() else delay)
+                delay = min(delay * 2, NodeClient.maxReconnectDelay)
+                continue
+            delay = 1
+            try:
+                eventType, data = None, None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith('event: '):
+                        eventType = line[len('event: '):]
+                    elif line.startswith('data: '):
+                        data = json.loads(line[len('data: '):])
+                    elif line.startswith('id: '):
+                        fromHeight = int(line[len('id: '):]) + 1  # Resumes after this block
+                    elif not line and eventType is not None:
+                        yield eventType, data
+                        eventType, data = None, None
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                pass  # The node went away, or sent no keepalive in time
+            finally:
+                response.close()
+
+    def close(self):
+        """
+        Closes the connections and stops the workers.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.keyring.executor.shutdown()
+        self.session.close()
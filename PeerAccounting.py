@@ -0,0 +1,171 @@
+import functools  # Resolved hosts are cached
+import ipaddress  # Normalization of the resolved addresses
+import math  # Decay of the misbehavior scores
+import socket  # Resolution of host names
+import threading  # Counters are updated by the connection threads
+import time  # Timestamps of the scores and bans
+
+
+class PeerAccounting():
+    """
+    Resource use and misbehavior scores of the peers of a node.
+
+    Counts, for every connection, the messages it sent by type, the bytes received from
+    and sent to it, the CPU time spent handling its messages and the messages refused by
+    the rate limits. Connections are told apart by their address, host and port.
+
+    Misbehavior, like sending messages that cannot be decoded, of unknown types or
+    invalid blocks, adds points to the score of the peer's IP address; the score decays
+    over time, and an IP address reaching `banScore` is banned for `banDuration`. Scores
+    and bans belong to the resolved IP address of the host, not to the ids peers declare,
+    their ports or the name they are reached under, so a peer cannot escape them by
+    reconnecting under another id, from another port or the other way.
+    """
+    banScore = 100  # Score at which an IP address is disconnected and banned
+    banDuration = 600  # Seconds a banned IP address is refused
+    scoreHalfLife = 300  # Seconds after which half of a score is forgiven
+
+    def __init__(self):
+        self.peers = {}  # Maps peer addresses to their counters
+        self.scores = {}  # Maps IP addresses to their (score, time of the score)
+        self.bans = {}  # Maps IP addresses to the time their ban ends
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def address(connected_node):
+        """
+        :param connected_node: The connection of a peer
+        :return: The address the connection is accounted under, 'host:port'
+        """
+        return str(connected_node.host) + ':' + str(connected_node.port)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def ip(host):
+        """
+        :param host: The host of a peer, a name or an IP address
+        :return: The normalized IP address of the host, 'localhost' and '127.0.0.1' give the same one,
+                 or the host itself if it cannot be resolved
+        """
+        host = str(host)
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            try:
+                address = ipaddress.ip_address(socket.gethostbyname(host))  # A name
+            except (OSError, ValueError):
+                return host
+        if address.is_loopback:
+            return '127.0.0.1'  # Every loopback address is the same machine
+        return str(address)
+
+    def peer(self, address):
+        """
+        :param address: The address of a peer, see `address`
+        :return: The counters of the peer, created if needed; to be used with the lock held
+        """
+        counters = self.peers.get(address)
+        if counters is None:
+            counters = self.peers[address] = {'messages': {}, 'refused': {}, 'bytesReceived': 0, 'bytesSent': 0,
+                                              'cpuSeconds': 0.0}
+        return counters
+
+    def received(self, address, messageType, size, cpuSeconds=0.0):
+        """
+        Counts a message received from a peer.
+
+        :param address: The address of the peer
+        :param messageType: The type of the message
+        :param size: The size of the message in bytes
+        :param cpuSeconds: The CPU time spent handling the message
+        """
+        with self.lock:
+            counters = self.peer(address)
+            counters['messages'][messageType] = counters['messages'].get(messageType, 0) + 1
+            counters['bytesReceived'] += size
+            counters['cpuSeconds'] += cpuSeconds
+
+    def sent(self, address, size):
+        """
+        Counts a message sent to a peer.
+
+        :param address: The address of the peer
+        :param size: The size of the message in bytes
+        """
+        with self.lock:
+            self.peer(address)['bytesSent'] += size
+
+    def refused(self, address, messageType):
+        """
+        Counts a message refused by the rate limits.
+
+        :param address: The address of the peer
+        :param messageType: The type of the message
+        """
+        with self.lock:
+            counters = self.peer(address)
+            counters['refused'][messageType] = counters['refused'].get(messageType, 0) + 1
+
+    @staticmethod
+    def decayed(score, now):
+        """
+        :param score: A (score, time of the score) tuple
+        :param now: The current time
+        :return: The score decayed until now
+        """
+        return score[0] * math.pow(0.5, (now - score[1]) / PeerAccounting.scoreHalfLife)
+
+    def penalize(self, host, points, reason):
+        """
+        Adds misbehavior points to the score of a host's IP address, banning it at `banScore`.
+
+        :param host: The host of the peer
+        :param points: The points to add
+        :param reason: Why the peer is penalized, logged when it is banned
+        :return: True if the IP address is banned now, False otherwise
+        """
+        host = PeerAccounting.ip(host)
+        now = time.monotonic()
+        with self.lock:
+            score = PeerAccounting.decayed(self.scores.get(host, (0.0, now)), now) + points
+            if score < PeerAccounting.banScore:
+                self.scores[host] = (score, now)
+                return False
+            self.bans[host] = now + PeerAccounting.banDuration
+            self.scores.pop(host, None)  # Starts over once the ban ends
+        print('Banning ' + host + ': ' + reason)
+        return True
+
+    def banned(self, host):
+        """
+        :param host: The host of a peer
+        :return: True if the IP address of the host is banned, False otherwise
+        """
+        host = PeerAccounting.ip(host)
+        with self.lock:
+            end = self.bans.get(host)
+            if end is None:
+                return False
+            if end <= time.monotonic():
+                del self.bans[host]  # The ban is over
+                return False
+            return True
+
+    def toJson(self):
+        """
+        :return: The counters of the peers, with the current score and ban of their IP address, as a dictionary
+        """
+        now = time.monotonic()
+        data = {}
+        with self.lock:
+            for address, counters in self.peers.items():
+                host = PeerAccounting.ip(address.rsplit(':', 1)[0])
+                peer = dict(counters)
+                peer['messages'] = dict(counters['messages'])
+                peer['refused'] = dict(counters['refused'])
+                score = self.scores.get(host)
+                peer['score'] = PeerAccounting.decayed(score, now) if score is not None else 0.0
+                end = self.bans.get(host)
+                peer['bannedSeconds'] = max(0.0, end - now) if end is not None else 0.0
+                data[address] = peer
+        return data
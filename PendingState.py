@@ -0,0 +1,66 @@
+from KeyTable import KeyTable  # Key digests of the senders
+
+
+class PendingState():
+    """
+    Overlay of balance changes that are not confirmed yet, on top of the confirmed AccountModel.
+
+    The node keeps one overlay for its transaction pool: it tracks how much every sender
+    has committed to spend in pending transactions, so that a sender cannot get more
+    transactions into the pool than its confirmed balance pays for. Pending credits are
+    ignored there, as the transaction paying them may never be confirmed. The overlay also
+    tracks the nonce the next transaction of every sender with pending transactions must have.
+
+    Block assembly and validation use an overlay with credits, which applies the
+    transactions of a block one after the other exactly like their execution does.
+    """
+
+    def __init__(self, credits=False):
+        """
+        Initializes an empty overlay.
+
+        :param credits: Whether pending credits to receivers count towards their balance
+        """
+        self.credits = credits  # Whether receivers can spend pending credits
+        self.deltas = {}  # Maps public keys to their pending balance change
+        self.nonces = {}  # Maps key digests of senders to the nonce following their last pending transaction
+
+    def delta(self, publicKeyString):
+        """
+        Returns the pending balance change of an account.
+
+        :param publicKeyString: The public key of the account
+        :return: The pending change (negative for pending spend)
+        """
+        return self.deltas.get(publicKeyString, 0)
+
+    def nonce(self, digest, confirmedNonce):
+        """
+        Returns the nonce the next transaction of a sender must have.
+
+        :param digest: The key digest of the sender
+        :param confirmedNonce: The nonce of the sender in the confirmed state
+        :return: The nonce following the sender's last pending transaction, or the confirmed one
+        """
+        return self.nonces.get(digest, confirmedNonce)
+
+    def apply(self, transaction):
+        """
+        Adds the balance changes of a transaction to the overlay.
+
+        Mirrors Blockchain.executeTransaction: stakes move the amount out of the sender's
+        balance, every other type moves it from the sender to the receiver.
+
+        :param transaction: The transaction to apply
+        """
+        sender = transaction.senderPublicKey
+        receiver = transaction.receiverPublicKey
+        amount = transaction.amount
+        self.nonces[KeyTable.digest(sender)] = transaction.nonce + 1  # The sender's next transaction follows this one
+        if transaction.type == 'STAKE':
+            if sender == receiver:  # Only self-stakes are executed
+                self.deltas[sender] = self.delta(sender) - amount
+        else:
+            self.deltas[sender] = self.delta(sender) - amount
+            if self.credits:
+                self.deltas[receiver] = self.delta(receiver) + amount
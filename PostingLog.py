@@ -0,0 +1,117 @@
+import mmap  # The log is read through a memory map
+import threading  # The log is read by the API threads
+
+
+class PostingLog():
+    """
+    Append-only file of fixed-size records, each belonging to an account.
+
+    Every record links to the previous record of the same account, and only the offset
+    of the last record of every account is kept in memory. The records of an account
+    are read newest first by following the links, so reading them takes time
+    proportional to the number of records read, not to the size of the log.
+
+    The records of the last blocks can be removed again when the blocks are reverted.
+    """
+
+    def __init__(self, path, recordStruct):
+        """
+        Initializes an empty log, replacing the file of a previous run.
+
+        :param path: The path of the log file
+        :param recordStruct: The struct.Struct of the record fields, without the account and the link
+        """
+        self.path = path
+        self.fields = recordStruct
+        self.recordSize = 20 + recordStruct.size + 8  # Account digest, fields and offset of the previous record
+        self.file = open(path, 'w+b')  # The chain is rebuilt from the genesis block on start, so is the log
+        self.length = 0
+        self.heads = {}  # Maps account digests to the offset of their last record
+        self.counts = {}  # Maps account digests to their number of records
+        self.map = None
+        self.lock = threading.Lock()  # The map is not replaced while it is being read
+
+    def append(self, digest, fields):
+        """
+        Appends a record of an account.
+
+        :param digest: The key digest of the account (see KeyTable.digest)
+        :param fields: The values of the record fields
+        """
+        previous = self.heads.get(digest, -1)
+        self.file.write(bytes.fromhex(digest) + self.fields.pack(*fields) + (previous + 1).to_bytes(8, 'little'))
+        self.heads[digest] = self.length
+        self.counts[digest] = self.counts.get(digest, 0) + 1
+        self.length += self.recordSize
+
+    def flush(self):
+        """
+        Makes the appended records visible to readers.
+        """
+        self.file.flush()
+
+    def record(self, offset):
+        """
+        Reads a record.
+
+        :param offset: The offset of the record
+        :return: A tuple (digest, fields, previous), previous being the offset of the account's previous record or -1
+        """
+        with self.lock:
+            if self.map is None or len(self.map) < offset + self.recordSize:
+                if self.map is not None:
+                    self.map.close()
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            data = self.map[offset:offset + self.recordSize]
+        fields = self.fields.unpack_from(data, 20)
+        previous = int.from_bytes(data[-8:], 'little') - 1
+        return data[:20].hex(), fields, previous
+
+    def records(self, digest, offset=None, limit=None):
+        """
+        Reads the records of an account, newest first.
+
+        :param digest: The key digest of the account
+        :param offset: The offset of the first record to read, the account's last record by default
+        :param limit: The maximum number of records to read
+        :return: A tuple (records, next) with the fields of the records and the offset of the record
+                 after the last one read, or None if there are no more
+        """
+        if offset is None:
+            offset = self.heads.get(digest, -1)
+        elif offset % self.recordSize or not 0 <= offset < self.length:
+            raise ValueError('Not the offset of a record')
+        records = []
+        while offset >= 0 and (limit is None or len(records) < limit):
+            recordDigest, fields, previous = self.record(offset)
+            if recordDigest != digest:
+                raise ValueError('Record does not belong to the account')  # Not an offset handed out for it
+            records.append(fields)
+            offset = previous
+        return records, (offset if offset >= 0 else None)
+
+    def truncate(self, length):
+        """
+        Removes the records after an offset, restoring the last records of their accounts.
+
+        :param length: The length of the log to keep
+        """
+        self.flush()
+        offset = self.length
+        while offset > length:
+            offset -= self.recordSize
+            digest, _, previous = self.record(offset)
+            if previous >= 0:
+                self.heads[digest] = previous
+            else:
+                del self.heads[digest]
+            self.counts[digest] -= 1
+            if not self.counts[digest]:
+                del self.counts[digest]
+        with self.lock:
+            if self.map is not None:
+                self.map.close()  # Pages past the new end must not be read
+                self.map = None
+            self.file.truncate(length)
+            self.file.seek(length)
+        self.length = length
@@ -1,16 +1,23 @@
+import os
 from BlockchainUtils import BlockchainUtils
 from Lot import Lot
+from Lottery import Lottery
+from KeyTable import KeyTable
+from Tracer import tracer
 
 
 class ProofOfStake():
     # Class responsible for the Proof of Stake (PoS) logic in the blockchain
+    genesisKeyFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keys', 'genesisPublicKey.pem')
+    genesisPublicKey = None  # Public key of the genesis node, read from genesisKeyFile once per process
 
     def __init__(self):
         """
         Initializes the ProofOfStake class and sets up the stakers dictionary.
         The genesis node's stake is also set during initialization.
         """
-        self.stakers = {}  # A dictionary to store stakers (participants who perform staking)
+        self.stakers = {}  # Maps the key digests of the stakers (participants who perform staking) to their stake
+        self.validators = {}  # Maps the key digests of the stakers to their public keys
         self.setGenesisNodeStake()  # Sets the stake for the genesis node
 
     def setGenesisNodeStake(self):
@@ -18,8 +25,23 @@ class ProofOfStake():
         Sets the initial stake for the genesis node.
         Reads the public key of the genesis node from a file and assigns it a stake of 1.
         """
-        genesisPublicKey = open('keys/genesisPublicKey.pem', 'r').read()  # Reads the public key of the genesis node from a file
-        self.stakers[genesisPublicKey] = 1  # Assigns a stake of 1 to the genesis node
+        self.update(ProofOfStake.genesisKey(), 1)  # Assigns a stake of 1 to the genesis node
+
+    @staticmethod
+    def genesisKey():
+        """
+        Returns the public key of the genesis node.
+
+        The key file is read the first time only, and found next to this module, whatever
+        the working directory of the process is. Every blockchain built afterwards, like the
+        copy decoded from a received chain, reuses the key.
+
+        :return: The public key string of the genesis node
+        """
+        if ProofOfStake.genesisPublicKey is None:
+            with open(ProofOfStake.genesisKeyFile, 'r') as keyFile:
+                ProofOfStake.genesisPublicKey = keyFile.read()  # Reads the public key of the genesis node from a file
+        return ProofOfStake.genesisPublicKey
 
     def update(self, publicKeyString, stake):
         """
@@ -28,10 +50,59 @@ class ProofOfStake():
         :param publicKeyString: The public key of the participant.
         :param stake: The stake to be added or updated.
         """
-        if publicKeyString in self.stakers.keys():
-            self.stakers[publicKeyString] += stake  # Increases the stake if the participant is already in the stakers list
+        digest = KeyTable.digest(publicKeyString)  # Compact identifier of the participant
+        if digest in self.stakers:
+            self.stakers[digest] += stake  # Increases the stake if the participant is already in the stakers list
         else:
-            self.stakers[publicKeyString] = stake  # Adds a new staker with the specified stake
+            self.stakers[digest] = stake  # Adds a new staker with the specified stake
+            self.validators[digest] = publicKeyString
+
+    def applyDeltas(self, deltas):
+        """
+        Applies the stake changes of a whole block in one pass.
+
+        :param deltas: Dictionary mapping public keys to the stake they added
+        """
+        for publicKeyString, stake in deltas.items():
+            self.update(publicKeyString, stake)
+
+    def previousValues(self, publicKeys):
+        """
+        Records the stakes of the given participants, so a change can be undone with `restore`.
+
+        :param publicKeys: The public keys of the participants about to change
+        :return: Dictionary mapping the public keys to their stake, None for participants without stake
+        """
+        return {publicKeyString: self.get(publicKeyString) for publicKeyString in publicKeys}
+
+    def restore(self, previousValues):
+        """
+        Puts back stakes recorded by `previousValues`.
+
+        Participants without a recorded stake are removed again, which also restores
+        the order of the stakers the lots are drawn in.
+
+        :param previousValues: Dictionary mapping public keys to their recorded stake
+        """
+        for publicKeyString, stake in previousValues.items():
+            digest = KeyTable.digest(publicKeyString)
+            if stake is None:  # The participant had no stake
+                self.stakers.pop(digest, None)
+                self.validators.pop(digest, None)
+            else:
+                self.stakers[digest] = stake
+                self.validators[digest] = publicKeyString
+
+    def snapshot(self):
+        """
+        Copies the stakes, so the forger can be elected while the original keeps changing.
+
+        :return: A ProofOfStake instance with the current stakers
+        """
+        snapshot = ProofOfStake.__new__(ProofOfStake)  # Skips reading the genesis stake
+        snapshot.stakers = dict(self.stakers)
+        snapshot.validators = dict(self.validators)
+        return snapshot
 
     def get(self, publicKeyString):
         """
@@ -40,21 +111,22 @@ class ProofOfStake():
         :param publicKeyString: The public key of the participant.
         :return: The stake of the participant or None if the participant does not exist.
         """
-        if publicKeyString in self.stakers.keys():
-            return self.stakers[publicKeyString]  # Returns the stake if the participant is found
-        else:
-            return None  # Returns None if the participant does not exist
+        return self.stakers.get(KeyTable.digest(publicKeyString))  # Returns the stake, or None for unknown participants
 
     def validatorLots(self, seed):
         """
         Generates a list of "lots" (tickets) for each validator based on their stake.
 
+        The election itself uses Lottery, which draws the same lots without creating them
+        one by one; this and `winnerLot` remain the reference it is checked against.
+
         :param seed: A seed used to generate unique identifiers for each "lot".
         :return: A list of "lots" corresponding to each validator's stake.
         """
         lots = []  # A list to store the lots (tickets)
-        for validator in self.stakers.keys():
-            for stake in range(self.get(validator)):  # Creates one "lot" for each unit of stake
+        for digest, validatorStake in self.stakers.items():
+            validator = self.validators[digest]  # Lots are drawn with the full public key
+            for stake in range(validatorStake):  # Creates one "lot" for each unit of stake
                 lots.append(Lot(validator, stake + 1, seed))  # Creates a new "lot" for each unit of stake
         return lots  # Returns the list of "lots"
 
@@ -79,6 +151,7 @@ class ProofOfStake():
 
         return winnerLot  # Returns the winning lot with the smallest offset
 
+    @tracer.stage('forger')
     def forger(self, lastBlockHash):
         """
         Selects the forger (validator) based on the hash of the last block.
@@ -86,6 +159,5 @@ class ProofOfStake():
         :param lastBlockHash: The hash of the last block, used to determine the winner.
         :return: The public key of the validator (forger) chosen to create the next block.
         """
-        lots = self.validatorLots(lastBlockHash)  # Generates the "lots" for the validators based on the last block's hash
-        winnerLot = self.winnerLot(lots, lastBlockHash)  # Determines the winning "lot" based on the reference hash
-        return winnerLot.publicKey  # Returns the public key of the winning validator (forger)
+        # Draws the lots of the validators and returns the public key of the lot closest to the reference hash
+        return Lottery.forger(self.stakers, self.validators, lastBlockHash)
@@ -0,0 +1,48 @@
+from Crypto.PublicKey import RSA  # RSA key generation and management
+from Crypto.Signature import PKCS1_v1_5  # RSA signature scheme
+from SignatureScheme import SignatureScheme
+
+
+class RSASignatureScheme(SignatureScheme):
+    """
+    RSA signatures with PKCS#1 v1.5 padding.
+
+    New keys have 2048 bits, their public keys are PEM strings of about 450 characters and
+    their signatures 256 bytes. Key files with other key sizes load as well.
+    """
+
+    name = 'rsa'
+    maxPublicKeys = 4096  # Number of imported public keys kept at most
+
+    def __init__(self):
+        self.publicKeys = {}  # Maps public key strings to imported keys, importing a PEM key is slow
+
+    def generate(self):
+        return RSA.generate(2048)  # Generates a new RSA key pair of 2048 bits
+
+    def importPrivateKey(self, keyString):
+        key = RSA.importKey(keyString)
+        if not key.has_private():
+            raise ValueError('Not an RSA private key')
+        return key
+
+    def exportPrivateKey(self, key):
+        return key.exportKey('PEM').decode('utf-8')
+
+    def publicKeyString(self, key):
+        return key.publickey().exportKey('PEM').decode('utf-8')  # Exports the public key in PEM format
+
+    def ownsPublicKey(self, publicKeyString):
+        return publicKeyString.startswith('-----BEGIN')
+
+    def sign(self, key, dataHash):
+        return PKCS1_v1_5.new(key).sign(dataHash)
+
+    def verify(self, publicKeyString, dataHash, signature):
+        publicKey = self.publicKeys.get(publicKeyString)
+        if publicKey is None:
+            publicKey = RSA.importKey(publicKeyString)  # Imports the public key from the PEM string
+            if len(self.publicKeys) >= RSASignatureScheme.maxPublicKeys:
+                self.publicKeys.clear()
+            self.publicKeys[publicKeyString] = publicKey
+        return PKCS1_v1_5.new(publicKey).verify(dataHash, signature)
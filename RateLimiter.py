@@ -0,0 +1,89 @@
+import threading  # Buckets are shared by the connection and API threads
+import time  # Refill of the buckets
+from collections import OrderedDict  # Least recently used buckets are dropped first
+
+
+class RateLimiter():
+    """
+    Token bucket rate limits per client and kind of request.
+
+    Every (client, kind) pair has a bucket holding up to `burst` tokens, refilled at
+    `rate` tokens per second. A request takes tokens from its bucket and is refused if
+    there are not enough, so a client can send short bursts but not more than the rate
+    on average. Kinds without limits are never refused.
+    """
+
+    def __init__(self, limits, maxBuckets=10000):
+        """
+        Initializes a rate limiter with full buckets.
+
+        :param limits: Maps kinds of requests to a (rate, burst) pair, in tokens per second and tokens
+        :param maxBuckets: Number of buckets kept, the least recently used ones are dropped (and so refilled)
+        """
+        self.limits = dict(limits)
+        self.maxBuckets = maxBuckets
+        self.buckets = OrderedDict()  # Maps (client, kind) pairs to [tokens, time of the last refill]
+        self.lock = threading.Lock()
+
+    def allow(self, client, kind, cost=1):
+        """
+        Takes tokens from the bucket of a client and kind of request.
+
+        :param client: The client, e.g. the host of a peer or the IP address of an API client
+        :param kind: The kind of request, e.g. a message type
+        :param cost: The number of tokens the request takes
+        :return: True if the request is within the limits, False if it should be refused
+        """
+        limit = self.limits.get(kind)
+        if limit is None:
+            return True
+        rate, burst = limit
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get((client, kind))
+            if bucket is None:
+                bucket = self.buckets[(client, kind)] = [burst, now]
+                if len(self.buckets) > self.maxBuckets:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end((client, kind))
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < cost:
+                return False
+            bucket[0] -= cost
+            return True
+
+    def retryAfter(self, client, kind, cost=1):
+        """
+        :param client: The client
+        :param kind: The kind of request
+        :param cost: The number of tokens of the request
+        :return: Seconds until the bucket holds enough tokens for the request
+        """
+        limit = self.limits.get(kind)
+        if limit is None:
+            return 0
+        rate, burst = limit
+        with self.lock:
+            bucket = self.buckets.get((client, kind))
+            if bucket is None:
+                return 0
+            tokens = min(burst, bucket[0] + (time.monotonic() - bucket[1]) * rate)
+        return max(0.0, (cost - tokens) / rate)
+
+    def refund(self, client, kind, cost=1):
+        """
+        Gives back tokens taken for a request that should not count against the limits.
+
+        :param client: The client
+        :param kind: The kind of request
+        :param cost: The number of tokens to give back
+        """
+        limit = self.limits.get(kind)
+        if limit is None:
+            return
+        with self.lock:
+            bucket = self.buckets.get((client, kind))
+            if bucket is not None:
+                bucket[0] = min(limit[1], bucket[0] + cost)
@@ -0,0 +1,78 @@
+import os  # Instance tag of the entity tags
+import threading  # Entries are shared by the API threads
+
+
+class ResponseCache():
+    """
+    Serialized responses of read-heavy API routes, reused while the state they show is unchanged.
+
+    Every route names the state it serializes by a version its owner takes from a counter
+    of the process on every change, so no two states share one (see Blockchain.version
+    and TransactionPool.generation). The bytes of the response built for a version are
+    kept and sent again until the version changes, and the version is the response's
+    entity tag, so a client that already has the response gets a 304 without the state
+    being read at all.
+
+    The entity tags also carry a tag of this cache, so tags handed out before a restart,
+    when the counters started over, do not match.
+    """
+    maxBodySize = 64 * 1024 * 1024  # Size in bytes of the largest response kept, larger ones are only streamed
+
+    def __init__(self):
+        self.instance = os.urandom(4).hex()  # Tag of this cache in the entity tags
+        self.entries = {}  # Maps route names to (version, body) of their last response
+        self.lock = threading.Lock()
+
+    def etag(self, name, version):
+        """
+        :param name: The name of the route
+        :param version: The version of the state the route shows
+        :return: The entity tag of the route's response for this version, unquoted
+        """
+        return name + '-' + self.instance + '-' + str(version)
+
+    def body(self, name, version):
+        """
+        :param name: The name of the route
+        :param version: The version of the state the route shows
+        :return: The kept response of the route for this version, or None if there is none
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def store(self, name, version, body):
+        """
+        Keeps the response of a route, unless it is too large or a response for a newer version is kept.
+
+        :param name: The name of the route
+        :param version: The version of the state the response was built from
+        :param body: The serialized response
+        """
+        if len(body) > ResponseCache.maxBodySize:
+            return
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry[0] <= version:
+                self.entries[name] = (version, body)
+
+    def capture(self, name, version, chunks):
+        """
+        Passes on the chunks of a streamed response and keeps the response once it is complete.
+
+        :param name: The name of the route
+        :param version: The version of the state the response was built from
+        :param chunks: The chunks of the response as bytes
+        :return: A generator of the same chunks
+        """
+        body = bytearray()
+        for chunk in chunks:
+            if body is not None:
+                body += chunk
+                if len(body) > ResponseCache.maxBodySize:
+                    body = None  # Too large to be kept
+            yield chunk
+        if body is not None:
+            self.store(name, version, bytes(body))
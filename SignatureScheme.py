@@ -0,0 +1,66 @@
+class SignatureScheme():
+    """
+    A public key signature algorithm the wallets sign and verify with.
+
+    Every scheme defines how keys are generated and stored, how a public key is written
+    in transactions and blocks, and how the SHA-256 hash of a payload is signed. Public key
+    strings of different schemes never look alike, so the scheme of a signature is always
+    known from the key of its signer, and keys of several schemes can live on one chain.
+    """
+
+    name = None  # Name the scheme is selected by
+
+    def generate(self):
+        """
+        :return: A new private key
+        """
+        raise NotImplementedError
+
+    def importPrivateKey(self, keyString):
+        """
+        Reads a private key written by `exportPrivateKey`.
+
+        :param keyString: The private key in PEM format
+        :return: The private key
+        :raises ValueError: If the key is not a private key of this scheme
+        """
+        raise NotImplementedError
+
+    def exportPrivateKey(self, key):
+        """
+        :param key: A private key
+        :return: The private key in PEM format, to be stored in a key file
+        """
+        raise NotImplementedError
+
+    def publicKeyString(self, key):
+        """
+        :param key: A private key
+        :return: The public key string carried by transactions and blocks
+        """
+        raise NotImplementedError
+
+    def ownsPublicKey(self, publicKeyString):
+        """
+        :param publicKeyString: A public key string
+        :return: True if the key is written the way this scheme writes its public keys
+        """
+        raise NotImplementedError
+
+    def sign(self, key, dataHash):
+        """
+        :param key: The private key
+        :param dataHash: The SHA-256 hash object of the payload
+        :return: The signature bytes
+        """
+        raise NotImplementedError
+
+    def verify(self, publicKeyString, dataHash, signature):
+        """
+        :param publicKeyString: The public key string of the signer
+        :param dataHash: The SHA-256 hash object of the payload
+        :param signature: The signature bytes
+        :return: True if the signature is valid, otherwise False
+        :raises ValueError: If the public key is malformed
+        """
+        raise NotImplementedError
@@ -2,11 +2,22 @@ from p2pnetwork.node import Node
 from PeerDiscoveryHandler import PeerDiscoveryHandler
 from SocketConnector import SocketConnector
 from BlockchainUtils import BlockchainUtils
+from RateLimiter import RateLimiter
+from PeerAccounting import PeerAccounting
+from Tracer import tracer
 import json
+import time
 
 
 class SocketCommunication(Node):
     # Class responsible for managing communication between nodes in the P2P network
+    # Limits of the messages of every peer by type as (messages per second, burst), and of their bytes
+    messageLimits = {'TRANSACTION': (200, 1000), 'BLOCK': (20, 100), 'BLOCKREQUEST': (5, 20), 'BLOCKS': (5, 20),
+                     'BLOCKCHAINREQUEST': (0.1, 2), 'BLOCKCHAIN': (0.1, 2), 'DISCOVERY': (1, 10),
+                     'bytes': (10 * 1024 * 1024, 50 * 1024 * 1024)}
+    malformedPenalty = 20  # Misbehavior points of a message that cannot be decoded
+    unknownTypePenalty = 10  # Misbehavior points of a message of an unknown type
+    invalidBlockPenalty = 10  # Misbehavior points of an invalid block
 
     def __init__(self, ip, port):
         """
@@ -20,6 +31,8 @@ class SocketCommunication(Node):
         self.peers = []  # List to store connected peers
         self.peerDiscoveryHandler = PeerDiscoveryHandler(self)  # Peer discovery handler to manage peer connections
         self.socketConnector = SocketConnector(ip, port)  # Socket connector for communication with other nodes
+        self.rateLimiter = RateLimiter(SocketCommunication.messageLimits)  # Limits the messages of every peer
+        self.peerAccounting = PeerAccounting()  # Resource use and misbehavior of every peer
 
     def connectToFirstNode(self):
         """
@@ -46,6 +59,9 @@ class SocketCommunication(Node):
 
         :param connected_node: The node that has connected inbound.
         """
+        if self.peerAccounting.banned(connected_node.host):
+            connected_node.stop()  # Refuses banned IP addresses
+            return
         self.peerDiscoveryHandler.handshake(connected_node)  # Performs a handshake with the connected node
 
     def outbound_node_connected(self, connected_node):
@@ -54,29 +70,99 @@ class SocketCommunication(Node):
 
         :param connected_node: The node that has been connected outbound.
         """
+        if self.peerAccounting.banned(connected_node.host):
+            connected_node.stop()  # Refuses banned IP addresses
+            return
         self.peerDiscoveryHandler.handshake(connected_node)  # Performs a handshake with the connected node
 
     def node_message(self, connected_node, message):
         """
         Handles messages received from other nodes. Based on the message type, it takes different actions.
 
+        Messages beyond the rate limits of the connection are dropped and counted, without
+        penalizing the peer: honest peers relaying the same blocks exceed them too. Relays
+        of blocks and transactions the node already knows do not count against the limits.
+        Only malformed and invalid messages add to the score of the peer's IP address;
+        see PeerAccounting.
+
         :param connected_node: The node from which the message was received.
         :param message: The message that was received from the connected node.
         """
-        message = BlockchainUtils.decode(json.dumps(message))  # Decodes the received message into a proper format
-        if message.messageType == 'DISCOVERY':
+        if self.peerAccounting.banned(connected_node.host):
+            connected_node.stop()
+            return
+        address = PeerAccounting.address(connected_node)
+        start = time.thread_time()  # CPU time used for the peer
+        encodedMessage = json.dumps(message)
+        messageType = message.get('messageType') if isinstance(message, dict) else None
+        if not isinstance(messageType, str):
+            messageType = 'unknown'  # Counted as such, decoding it fails
+        if not self.rateLimiter.allow(address, 'bytes', len(encodedMessage)):
+            self.peerAccounting.refused(address, messageType)
+            return
+        if not self.rateLimiter.allow(address, messageType):
+            self.rateLimiter.refund(address, 'bytes', len(encodedMessage))
+            self.peerAccounting.refused(address, messageType)
+            return
+        try:
+            with tracer.trace('message'):
+                duplicate = self.handleMessage(connected_node, encodedMessage)
+            if duplicate:
+                self.rateLimiter.refund(address, 'bytes', len(encodedMessage))
+                self.rateLimiter.refund(address, messageType)
+        finally:
+            self.peerAccounting.received(address, messageType, len(encodedMessage), time.thread_time() - start)
+
+    def handleMessage(self, connected_node, encodedMessage):
+        """
+        Decodes a message and hands it to the node.
+
+        :param connected_node: The node from which the message was received.
+        :param encodedMessage: The jsonpickle encoded message.
+        :return: True if the message relays a block or transaction the node already knows
+        """
+        try:
+            message = BlockchainUtils.decode(encodedMessage)  # Decodes the received message into a proper format
+            messageType = message.messageType
+        except Exception:
+            self.misbehaved(connected_node, SocketCommunication.malformedPenalty, 'malformed message')
+            return False
+        if messageType == 'DISCOVERY':
             self.peerDiscoveryHandler.handleMessage(message)  # Handles discovery message to update peer list
-        elif message.messageType == 'TRANSACTION':
+        elif messageType == 'TRANSACTION':
             transaction = message.data  # Extracts transaction data from the message
+            if self.node.transactionKnown(transaction):
+                return True  # Relayed by another peer already
             self.node.handleTransaction(transaction)  # Handles the received transaction
-        elif message.messageType == 'BLOCK':
+        elif messageType == 'BLOCK':
             block = message.data  # Extracts block data from the message
-            self.node.handleBlock(block)  # Handles the received block
-        elif message.messageType == 'BLOCKCHAINREQUEST':
+            return self.node.handleBlock(block, connected_node) == 'known'  # Handles the received block
+        elif messageType == 'BLOCKREQUEST':
+            self.node.handleBlockRequest(connected_node, message.data)  # Sends the blocks the node is missing
+        elif messageType == 'BLOCKS':
+            self.node.handleBlocks(message.data, connected_node)  # Handles the blocks received on request
+        elif messageType == 'BLOCKCHAINREQUEST':
             self.node.handleBlockchainRequest(connected_node)  # Responds to a blockchain request from a node
-        elif message.messageType == 'BLOCKCHAIN':
+        elif messageType == 'BLOCKCHAIN':
             blockchain = message.data  # Extracts blockchain data from the message
             self.node.handleBlockchain(blockchain)  # Handles the received blockchain
+        else:
+            self.misbehaved(connected_node, SocketCommunication.unknownTypePenalty, 'unknown message type')
+        return False
+
+    def misbehaved(self, connected_node, points, reason):
+        """
+        Penalizes a peer, disconnecting it once it is banned.
+
+        :param connected_node: The connection of the peer.
+        :param points: The misbehavior points.
+        :param reason: Why the peer is penalized.
+        """
+        if self.peerAccounting.penalize(connected_node.host, points, reason):
+            ip = PeerAccounting.ip(connected_node.host)
+            for peer in list(self.all_nodes):
+                if PeerAccounting.ip(peer.host) == ip:
+                    peer.stop()  # Every connection of the banned IP address, whatever name it was reached under
 
     def send(self, receiver, message):
         """
@@ -85,6 +171,7 @@ class SocketCommunication(Node):
         :param receiver: The target node to receive the message.
         :param message: The message to be sent.
         """
+        self.peerAccounting.sent(PeerAccounting.address(receiver), len(message))
         self.send_to_node(receiver, message)  # Sends the message to the specified receiver node
 
     def broadcast(self, message):
@@ -93,4 +180,6 @@ class SocketCommunication(Node):
 
         :param message: The message to be broadcasted.
         """
+        for peer in self.all_nodes:
+            self.peerAccounting.sent(PeerAccounting.address(peer), len(message))
         self.send_to_nodes(message)  # Sends the message to all connected nodes in the network
@@ -0,0 +1,168 @@
+import bisect  # Range counts over the sorted leaf keys
+import hashlib  # Node hashes
+import json  # Canonical encoding of the leaf values
+
+
+class StateTree():
+    """
+    Sparse Merkle tree over the account state (balances and stakes).
+
+    Leaves are addressed by the 160-bit key digest of an account (see KeyTable.digest),
+    whose bits give the path from the root. A subtree holding a single leaf is collapsed
+    into that leaf's hash and empty subtrees hash to zero bytes, so the tree only stores
+    the internal nodes with two or more leaves below them. As digests are uniformly
+    distributed, that is less than two nodes per account and paths are O(log n) long.
+    An update only rehashes the internal nodes on the paths of the changed accounts.
+    """
+
+    DEPTH = 160  # Number of bits in a key digest
+    EMPTY = bytes(32)  # Hash of an empty subtree
+
+    def __init__(self):
+        """
+        Initializes an empty tree.
+        """
+        self.keys = []  # Sorted list of the leaf keys as integers
+        self.leaves = {}  # Maps leaf keys to their leaf hash
+        self.values = {}  # Maps leaf keys to their value
+        self.nodes = {}  # Maps (depth, prefix) of internal nodes with two or more leaves to their hash
+
+    @staticmethod
+    def leafHash(key, value):
+        """
+        Hashes a leaf.
+
+        :param key: The key of the leaf as an integer
+        :param value: The value of the leaf, a JSON serializable object
+        :return: The leaf hash
+        """
+        valueBytes = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        return hashlib.sha256(b'\x00' + key.to_bytes(StateTree.DEPTH // 8, 'big') + valueBytes).digest()
+
+    @staticmethod
+    def nodeHash(left, right):
+        """
+        Hashes an internal node.
+
+        :param left: Hash of the left subtree
+        :param right: Hash of the right subtree
+        :return: The node hash
+        """
+        return hashlib.sha256(b'\x01' + left + right).digest()
+
+    def span(self, depth, prefix):
+        """
+        Finds the leaves below a node.
+
+        :param depth: Depth of the node (0 is the root)
+        :param prefix: The first `depth` bits of the keys below the node
+        :return: A tuple (count, index) with the number of leaves and the index of the first one
+        """
+        shift = StateTree.DEPTH - depth
+        low = bisect.bisect_left(self.keys, prefix << shift)
+        high = bisect.bisect_left(self.keys, (prefix + 1) << shift)
+        return high - low, low
+
+    def subtreeHash(self, depth, prefix):
+        """
+        Returns the hash of the subtree below a node.
+
+        :param depth: Depth of the node
+        :param prefix: The first `depth` bits of the keys below the node
+        :return: The subtree hash
+        """
+        count, index = self.span(depth, prefix)
+        if count == 0:
+            return StateTree.EMPTY
+        if count == 1:
+            return self.leaves[self.keys[index]]  # A single leaf stands for its whole subtree
+        return self.nodes[(depth, prefix)]
+
+    def update(self, changes):
+        """
+        Sets or removes leaves and rehashes the affected paths.
+
+        :param changes: Dictionary mapping hex key digests to their new value, or None to remove the leaf
+        """
+        touched = []
+        for digest, value in changes.items():
+            key = int(digest, 16)
+            touched.append(key)
+            if value is None:
+                if key in self.leaves:
+                    del self.leaves[key]
+                    del self.values[key]
+                    del self.keys[bisect.bisect_left(self.keys, key)]
+            else:
+                if key not in self.leaves:
+                    bisect.insort(self.keys, key)
+                self.leaves[key] = StateTree.leafHash(key, value)
+                self.values[key] = value
+        dirty = set()
+        for key in touched:
+            depth = 0
+            while depth < StateTree.DEPTH:
+                prefix = key >> (StateTree.DEPTH - depth)
+                if self.span(depth, prefix)[0] < 2:
+                    break
+                dirty.add((depth, prefix))  # Internal node on the path of a changed leaf
+                depth += 1
+            while (depth, key >> (StateTree.DEPTH - depth)) in self.nodes:
+                del self.nodes[(depth, key >> (StateTree.DEPTH - depth))]  # No longer has two leaves
+                depth += 1
+        for depth, prefix in sorted(dirty, reverse=True):  # Children before their parents
+            left = self.subtreeHash(depth + 1, prefix << 1)
+            right = self.subtreeHash(depth + 1, (prefix << 1) | 1)
+            self.nodes[(depth, prefix)] = StateTree.nodeHash(left, right)
+
+    def root(self):
+        """
+        :return: The root hash of the tree in hex
+        """
+        return self.subtreeHash(0, 0).hex()
+
+    def get(self, digest):
+        """
+        :param digest: The hex key digest
+        :return: The value of the leaf, or None if there is no such leaf
+        """
+        return self.values.get(int(digest, 16))
+
+    def proof(self, digest):
+        """
+        Builds the inclusion proof of a leaf.
+
+        :param digest: The hex key digest of the leaf
+        :return: The sibling hashes in hex from the root down to the leaf, or None if there is no such leaf
+        """
+        key = int(digest, 16)
+        if key not in self.leaves:
+            return None
+        siblings = []
+        depth = 0
+        while self.span(depth, key >> (StateTree.DEPTH - depth))[0] >= 2:
+            depth += 1
+            siblingPrefix = (key >> (StateTree.DEPTH - depth)) ^ 1  # The other child of the node above
+            siblings.append(self.subtreeHash(depth, siblingPrefix).hex())
+        return siblings
+
+    @staticmethod
+    def verifyProof(root, digest, value, siblings):
+        """
+        Checks an inclusion proof against a state root.
+
+        :param root: The hex state root
+        :param digest: The hex key digest of the leaf
+        :param value: The claimed value of the leaf
+        :param siblings: The sibling hashes returned by `proof`
+        :return: True if the leaf with this value is part of the state with this root
+        """
+        key = int(digest, 16)
+        currentHash = StateTree.leafHash(key, value)
+        for depth in range(len(siblings), 0, -1):
+            sibling = bytes.fromhex(siblings[depth - 1])
+            if (key >> (StateTree.DEPTH - depth)) & 1:
+                currentHash = StateTree.nodeHash(sibling, currentHash)
+            else:
+                currentHash = StateTree.nodeHash(currentHash, sibling)
+        return currentHash.hex() == root
@@ -0,0 +1,274 @@
+import cProfile  # Deterministic profiler used for on-demand snapshots
+import io  # In-memory text buffer for rendering pstats output
+import pstats  # Formats and aggregates cProfile results
+import random  # Used to decide which traces are sampled
+import threading  # Thread-local storage for the active trace and locking
+import time  # High resolution clock for span timings
+from collections import deque  # Bounded buffer for the most recent traces
+from contextlib import contextmanager  # Helper to build the trace/span context managers
+from functools import wraps  # Preserves metadata of wrapped stage functions
+
+
+class Trace():
+    # A single sampled unit of work (one block or one transaction) and the time spent per stage
+
+    def __init__(self, kind, identifier=None):
+        """
+        Initializes a new trace.
+
+        :param kind: The kind of work being traced (e.g., 'block', 'transaction')
+        :param identifier: Optional identifier of the traced object (transaction id, block count)
+        """
+        self.kind = kind  # Kind of the traced work
+        self.identifier = identifier  # Identifier of the traced object
+        self.startTime = time.time()  # Wall clock time when the trace started
+        self.start = time.perf_counter()  # High resolution start used for the duration
+        self.duration = 0.0  # Total duration of the trace in seconds, set when it finishes
+        self.stages = {}  # Maps stage names to [calls, seconds]
+
+    def record(self, stage, elapsed):
+        """
+        Adds the time spent in a stage to this trace.
+
+        :param stage: The name of the stage
+        :param elapsed: The time spent in the stage in seconds
+        """
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [1, elapsed]  # First call of this stage
+        else:
+            entry[0] += 1  # Counts one more call
+            entry[1] += elapsed  # Accumulates the time spent
+
+    def toJson(self):
+        """
+        Converts the trace into a JSON-like dictionary representation.
+
+        :return: A dictionary with the per-stage breakdown in milliseconds
+        """
+        data = {}
+        data['kind'] = self.kind
+        data['id'] = self.identifier
+        data['timestamp'] = self.startTime
+        data['durationMs'] = self.duration * 1000
+        stages = {}
+        for stage, (calls, seconds) in self.stages.items():
+            stages[stage] = {'calls': calls, 'ms': seconds * 1000}
+        data['stages'] = stages
+        return data
+
+
+class Tracer():
+    # Low-overhead tracing of the node's hot paths, switchable at runtime
+
+    def __init__(self, maxTraces=256):
+        """
+        Initializes a disabled tracer.
+
+        :param maxTraces: Number of finished traces kept for inspection
+        """
+        self.enabled = False  # Tracing is off until explicitly enabled
+        self.sampleRate = 1.0  # Fraction of traces that are recorded when enabled
+        self.traces = deque(maxlen=maxTraces)  # Most recent finished traces
+        self.summary = {}  # Maps kind -> stage -> [calls, seconds, maxSeconds]
+        self.local = threading.local()  # Holds the trace active on the current thread
+        self.lock = threading.Lock()  # Protects the summary, traces and profiles
+        self.profiles = None  # List of collected profiles while a profile session is running
+
+    def configure(self, enabled=None, sampleRate=None, maxTraces=None):
+        """
+        Changes the tracer settings at runtime.
+
+        :param enabled: Turns tracing on or off
+        :param sampleRate: Fraction (0.0 - 1.0) of traces that are recorded
+        :param maxTraces: Number of finished traces kept for inspection
+        """
+        if sampleRate is not None:
+            self.sampleRate = min(max(float(sampleRate), 0.0), 1.0)  # Clamps the rate into [0, 1]
+        if maxTraces is not None:
+            with self.lock:
+                self.traces = deque(self.traces, maxlen=int(maxTraces))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def reset(self):
+        """
+        Discards all collected traces and stage statistics.
+        """
+        with self.lock:
+            self.traces.clear()
+            self.summary = {}
+
+    @contextmanager
+    def trace(self, kind, identifier=None):
+        """
+        Opens a trace for a unit of work on the current thread.
+
+        Nested calls reuse the active trace and only refine its kind and identifier,
+        so a message handler can start a trace before it knows what the message contains.
+
+        :param kind: The kind of work being traced
+        :param identifier: Optional identifier of the traced object
+        :return: The active trace, or None if this unit of work is not sampled
+        """
+        current = getattr(self.local, 'trace', None)
+        if current is not None:
+            current.kind = kind  # The innermost handler knows best what is being processed
+            if identifier is not None:
+                current.identifier = identifier
+            yield current
+            return
+        if getattr(self.local, 'active', False):
+            yield None  # Nested inside an unsampled trace
+            return
+        profiles = self.profiles
+        if not self.enabled and profiles is None:
+            yield None  # Fast path: tracing and profiling are off
+            return
+        sampled = self.enabled and random.random() < self.sampleRate
+        trace = Trace(kind, identifier) if sampled else None
+        profile = cProfile.Profile() if profiles is not None else None
+        self.local.trace = trace
+        self.local.active = True
+        if profile is not None:
+            profile.enable()
+        try:
+            yield trace
+        finally:
+            if profile is not None:
+                profile.disable()
+                self.collectProfile(profile)
+            self.local.trace = None
+            self.local.active = False
+            if trace is not None:
+                trace.duration = time.perf_counter() - trace.start
+                self.finish(trace)
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Times a block of code as a stage of the active trace.
+
+        :param stage: The name of the stage
+        """
+        trace = getattr(self.local, 'trace', None)
+        if trace is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace.record(stage, time.perf_counter() - start)
+
+    def stage(self, name):
+        """
+        Decorator that times every call of a function as a stage of the active trace.
+
+        When no trace is active the wrapped function is called directly.
+
+        :param name: The name of the stage
+        :return: The decorator
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                trace = getattr(self.local, 'trace', None)
+                if trace is None:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    trace.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def finish(self, trace):
+        """
+        Stores a finished trace and merges its stages into the summary.
+
+        :param trace: The finished trace
+        """
+        with self.lock:
+            self.traces.append(trace)
+            kindSummary = self.summary.setdefault(trace.kind, {})
+            for stage, (calls, seconds) in list(trace.stages.items()) + [('total', (1, trace.duration))]:
+                entry = kindSummary.get(stage)
+                if entry is None:
+                    kindSummary[stage] = [calls, seconds, seconds]
+                else:
+                    entry[0] += calls
+                    entry[1] += seconds
+                    entry[2] = max(entry[2], seconds)
+
+    def collectProfile(self, profile):
+        """
+        Adds a finished profile to the running profile session.
+
+        :param profile: The cProfile.Profile that was active during a trace
+        """
+        with self.lock:
+            if self.profiles is not None:
+                self.profiles.append(profile)
+
+    def profile(self, seconds, sort='cumulative', limit=40):
+        """
+        Profiles every traced unit of work for the given number of seconds.
+
+        :param seconds: Length of the profile session
+        :param sort: The pstats sort key
+        :param limit: Maximum number of functions in the report
+        :return: The pstats report as text
+        """
+        with self.lock:
+            if self.profiles is not None:
+                raise RuntimeError('A profile session is already running')
+            self.profiles = []
+        try:
+            time.sleep(seconds)
+        finally:
+            with self.lock:
+                profiles = self.profiles
+                self.profiles = None
+        if not profiles:
+            return 'No traced work was executed during the profile session\n'
+        output = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=output)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def toJson(self, kind=None, limit=None):
+        """
+        Converts the tracer state into a JSON-like dictionary representation.
+
+        :param kind: Only include traces of this kind
+        :param limit: Maximum number of recent traces to include
+        :return: A dictionary with the settings, per-stage summary and recent traces
+        """
+        with self.lock:
+            traces = [trace for trace in self.traces if kind is None or trace.kind == kind]
+            summary = {}
+            for traceKind, stages in self.summary.items():
+                if kind is not None and traceKind != kind:
+                    continue
+                summary[traceKind] = {}
+                for stage, (calls, seconds, maxSeconds) in stages.items():
+                    summary[traceKind][stage] = {
+                        'calls': calls,
+                        'totalMs': seconds * 1000,
+                        'avgMs': seconds * 1000 / calls,
+                        'maxMs': maxSeconds * 1000}
+        if limit is not None:
+            traces = traces[-limit:] if limit > 0 else []
+        data = {}
+        data['enabled'] = self.enabled
+        data['sampleRate'] = self.sampleRate
+        data['summary'] = summary
+        data['traces'] = [trace.toJson() for trace in traces]
+        return data
+
+
+tracer = Tracer()  # Process-wide tracer shared by all instrumented components
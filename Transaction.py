@@ -1,14 +1,29 @@
+import math
 import uuid
 import time
-import copy
+from KeyTable import KeyTable
 
 class Transaction():
     """
     This class represents a financial or blockchain transaction, which includes information
-    about the sender, receiver, amount, transaction type, unique ID, timestamp, and signature.
+    about the sender, receiver, amount, transaction type, nonce, unique ID, timestamp, and signature.
+
+    The nonce numbers the transactions of a sender: the first one has nonce 0, and a
+    transaction is only valid with the nonce following its sender's last confirmed one.
+    A transaction can therefore not be replayed, and duplicates are found by comparing
+    one number instead of searching the history for the id.
+
+    Instances use __slots__ instead of a per-instance dictionary. Once the transaction is
+    accepted, i.e. admitted into the pool or executed, its public keys are interned in the
+    KeyTable and referenced by id (see `intern`); until then the key slots hold the key
+    strings as received, so transactions that fail validation add nothing to the table.
+    The signature is kept as raw bytes; `toJson` and the encoded form still carry the full
+    PEM keys and the hex signature.
     """
 
-    def __init__(self, senderPublicKey, receiverPublicKey, amount, type):
+    __slots__ = ('senderKeyId', 'receiverKeyId', 'amount', 'type', 'nonce', 'id', 'timestamp', 'signatureBytes')
+
+    def __init__(self, senderPublicKey, receiverPublicKey, amount, type, nonce=0):
         """
         Initializes a new transaction with the given parameters.
 
@@ -16,22 +31,93 @@ class Transaction():
         :param receiverPublicKey: Public key of the receiver
         :param amount: The amount to be transferred in the transaction
         :param type: Type of transaction (e.g., transfer, exchange)
+        :param nonce: Sequence number of the transaction among the sender's transactions
         """
         self.senderPublicKey = senderPublicKey  # Public key of the sender
         self.receiverPublicKey = receiverPublicKey  # Public key of the receiver
         self.amount = amount  # Amount to be transferred in the transaction
         self.type = type  # Type of transaction (e.g., transfer, swap, etc.)
+        self.nonce = nonce  # Sequence number among the sender's transactions
         self.id = (uuid.uuid1()).hex  # Unique transaction ID generated using UUID1 (based on timestamp and MAC address)
         self.timestamp = time.time()  # Timestamp of the transaction creation, representing the time in seconds since the epoch
         self.signature = ''  # Placeholder for the transaction's signature (initially empty)
 
+    @property
+    def senderPublicKey(self):
+        keyId = self.senderKeyId
+        return KeyTable.keys[keyId] if keyId.__class__ is int else keyId  # Resolves the key once interned
+
+    @senderPublicKey.setter
+    def senderPublicKey(self, publicKeyString):
+        self.senderKeyId = publicKeyString if isinstance(publicKeyString, str) else None  # Malformed keys fail wellFormed
+
+    @property
+    def receiverPublicKey(self):
+        keyId = self.receiverKeyId
+        return KeyTable.keys[keyId] if keyId.__class__ is int else keyId  # Resolves the key once interned
+
+    @receiverPublicKey.setter
+    def receiverPublicKey(self, publicKeyString):
+        self.receiverKeyId = publicKeyString if isinstance(publicKeyString, str) else None  # Malformed keys fail wellFormed
+
+    def intern(self):
+        """
+        Interns the public keys of an accepted transaction, which then refers to them by id.
+        """
+        if self.senderKeyId.__class__ is not int:
+            self.senderKeyId = KeyTable.keyId(self.senderKeyId)
+        if self.receiverKeyId.__class__ is not int:
+            self.receiverKeyId = KeyTable.keyId(self.receiverKeyId)
+
+    @property
+    def signature(self):
+        signature = self.signatureBytes
+        return signature if isinstance(signature, str) else signature.hex()  # Signatures travel as hex strings
+
+    @signature.setter
+    def signature(self, signature):
+        try:
+            self.signatureBytes = bytes.fromhex(signature)  # Half the size of the hex string
+        except (TypeError, ValueError):
+            self.signatureBytes = signature  # Kept as received, signature verification rejects it
+
     def toJson(self):
         """
         Converts the transaction object to a dictionary representation suitable for JSON serialization.
 
         :return: A dictionary containing the transaction's data
         """
-        return self.__dict__  # Returns the transaction object as a dictionary (JSON format)
+        data = {}  # The keys keep the order the signed payloads have always used
+        data['senderPublicKey'] = self.senderPublicKey
+        data['receiverPublicKey'] = self.receiverPublicKey
+        data['amount'] = self.amount
+        data['type'] = self.type
+        data['nonce'] = self.nonce
+        data['id'] = self.id
+        data['timestamp'] = self.timestamp
+        data['signature'] = self.signature
+        return data  # Returns the transaction as a dictionary (JSON format)
+
+    def __getstate__(self):
+        return self.toJson()  # Encoded and copied transactions carry the full keys
+
+    def __setstate__(self, state):
+        self.nonce = None  # Required, wellFormed rejects transactions without one
+        for field in ('senderPublicKey', 'receiverPublicKey', 'amount', 'type', 'nonce', 'id', 'timestamp', 'signature'):
+            if field in state:
+                setattr(self, field, state[field])  # Compacts the signature
+
+    @staticmethod
+    def fromJson(data):
+        """
+        Creates a transaction from its JSON-like dictionary representation.
+
+        :param data: A dictionary returned by `toJson`
+        :return: The transaction
+        """
+        transaction = Transaction.__new__(Transaction)
+        transaction.__setstate__(data)
+        return transaction
 
     def sign(self, signature):
         """
@@ -48,10 +134,35 @@ class Transaction():
 
         :return: A dictionary representation of the transaction without the signature
         """
-        jsonRepresentation = copy.deepcopy(self.toJson())  # Create a copy of the transaction data
+        jsonRepresentation = self.toJson()  # Create a fresh copy of the transaction data
         jsonRepresentation['signature'] = ''  # Remove the signature from the copied data to generate the payload
         return jsonRepresentation  # Return the transaction data without the signature
 
+    def wellFormed(self):
+        """
+        Checks the structure of the transaction without looking at any chain state.
+
+        Amounts must be positive finite numbers (whole numbers for stakes, which are split into
+        one lot per unit), the nonce a non-negative whole number, and all keys, ids and
+        signatures must be strings.
+
+        :return: True if the transaction is well formed, otherwise False
+        """
+        if self.type not in ('EXCHANGE', 'TRANSFER', 'STAKE'):
+            return False  # Unknown transaction type
+        if isinstance(self.amount, bool) or not isinstance(self.amount, (int, float)) or not self.amount > 0:
+            return False  # Amount must be a positive number
+        if isinstance(self.amount, float) and not math.isfinite(self.amount):
+            return False  # Infinity, which JSON can carry, would break the balances
+        if self.type == 'STAKE' and not isinstance(self.amount, int):
+            return False  # Stakes are whole units
+        if isinstance(self.nonce, bool) or not isinstance(self.nonce, int) or self.nonce < 0:
+            return False  # Nonces count the sender's transactions
+        for field in (self.senderPublicKey, self.receiverPublicKey, self.id, self.signature):
+            if not isinstance(field, str) or not field:
+                return False  # Missing key, id or signature
+        return True
+
     def equals(self, transaction):
         """
         Compares the current transaction with another transaction to check if they are equal.
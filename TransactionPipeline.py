@@ -0,0 +1,144 @@
+import os  # Default number of verification workers
+import queue  # Bounded queues between the pipeline stages
+import threading  # Worker and sequencer threads
+import time  # Queue wait measurement
+from Tracer import tracer  # Process-wide tracer for hot-path timings
+
+
+class TransactionPipeline():
+    """
+    Staged ingest of incoming transactions.
+
+    Transactions are put on a bounded queue that feeds a pool of verification workers
+    running the stateless checks (structure, signature). Verified transactions go to a
+    single sequencer thread that runs the stateful checks (duplicates, balance coverage)
+    and inserts them into the pool, so that ordering-sensitive state is only touched by
+    one thread. When a queue is full, submitters either wait (P2P, which slows down the
+    socket reads of that peer) or are turned away (API).
+    """
+
+    def __init__(self, node, workers=None, queueSize=1024, submitTimeout=5.0):
+        """
+        Initializes a stopped pipeline.
+
+        :param node: The node providing the verification and admission steps
+        :param workers: Number of verification workers (defaults to the number of CPUs)
+        :param queueSize: Capacity of each queue between the stages
+        :param submitTimeout: Seconds a blocking submit waits for room in the queue
+        """
+        self.node = node  # Node providing transactionValid and admitTransaction
+        self.workerCount = workers or os.cpu_count() or 1  # Number of verification workers
+        self.submitTimeout = submitTimeout  # Maximum wait of a blocking submit
+        self.incoming = queue.Queue(maxsize=queueSize)  # Transactions waiting for verification
+        self.verified = queue.Queue(maxsize=queueSize)  # Transactions waiting for admission
+        self.threads = []  # Worker and sequencer threads
+        self.running = False  # Whether the stage threads are running
+        self.counters = {'submitted': 0, 'rejectedFull': 0, 'invalid': 0, 'admitted': 0, 'refused': 0}
+        self.countersLock = threading.Lock()  # Protects the counters
+
+    def start(self):
+        """
+        Starts the verification workers and the sequencer.
+        """
+        if self.running:
+            return
+        self.running = True
+        for number in range(self.workerCount):
+            self.threads.append(threading.Thread(target=self.verify, name='verify-' + str(number), daemon=True))
+        self.threads.append(threading.Thread(target=self.sequence, name='sequencer', daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stops the stage threads after the queued transactions have been processed.
+        """
+        if not self.running:
+            return
+        for _ in range(self.workerCount):
+            self.incoming.put(None)  # One stop marker per worker
+        for thread in self.threads[:-1]:
+            thread.join()
+        self.verified.put(None)  # Stop marker for the sequencer
+        self.threads[-1].join()
+        self.threads = []
+        self.running = False
+
+    def count(self, counter):
+        """
+        Increments a pipeline counter.
+
+        :param counter: Name of the counter
+        """
+        with self.countersLock:
+            self.counters[counter] += 1
+
+    def submit(self, transaction, block=True):
+        """
+        Queues a transaction for verification.
+
+        :param transaction: The received transaction
+        :param block: Waits up to `submitTimeout` seconds for room instead of failing immediately
+        :return: True if the transaction was queued, False if the pipeline is saturated
+        """
+        try:
+            self.incoming.put((transaction, time.perf_counter()), block, self.submitTimeout if block else None)
+        except queue.Full:
+            self.count('rejectedFull')
+            return False
+        self.count('submitted')
+        return True
+
+    def verify(self):
+        """
+        Verification worker: runs the stateless checks and forwards valid transactions.
+        """
+        while True:
+            item = self.incoming.get()
+            if item is None:
+                return
+            transaction, enqueued = item
+            with tracer.trace('transactionVerify', getattr(transaction, 'id', None)) as trace:
+                if trace is not None:
+                    trace.record('queueWait', time.perf_counter() - enqueued)
+                valid = self.node.transactionValid(transaction)
+            if valid:
+                self.verified.put((transaction, time.perf_counter()))  # Blocks while the sequencer is behind
+            else:
+                self.count('invalid')
+
+    def sequence(self):
+        """
+        Sequencer: runs the stateful checks and inserts transactions into the pool, one at a time.
+        """
+        while True:
+            item = self.verified.get()
+            if item is None:
+                return
+            transaction, enqueued = item
+            with tracer.trace('transactionAdmit', transaction.id) as trace:
+                if trace is not None:
+                    trace.record('queueWait', time.perf_counter() - enqueued)
+                try:
+                    admitted = self.node.admitTransaction(transaction)
+                except Exception as error:  # A failing admission must not stop the sequencer
+                    print('Transaction admission failed: ' + repr(error))
+                    admitted = False
+            self.count('admitted' if admitted else 'refused')
+
+    def toJson(self):
+        """
+        Converts the pipeline state into a JSON-like dictionary representation.
+
+        :return: A dictionary with the queue depths and counters
+        """
+        with self.countersLock:
+            counters = dict(self.counters)
+        data = {}
+        data['running'] = self.running
+        data['workers'] = self.workerCount
+        data['incoming'] = self.incoming.qsize()
+        data['verified'] = self.verified.qsize()
+        data['capacity'] = self.incoming.maxsize
+        data['counters'] = counters
+        return data
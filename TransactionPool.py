@@ -1,15 +1,32 @@
+import itertools  # Counter of pool generations
+from collections import OrderedDict  # Queued transactions are evicted oldest first
+
+
 class TransactionPool():
     """
     The TransactionPool class manages a collection of pending transactions. It allows adding,
     checking, removing, and verifying transactions in the pool, which is typically used to store 
     transactions before they are included in a block.
+
+    The transactions of every sender are kept in nonce order, so a block can take the pool
+    as it is. Transactions that arrive before the ones preceding them, which gossip can
+    deliver in any order, wait in a per-sender queue until the gap is filled. The queues
+    are bounded per sender and in total; once the total is reached, the transaction that
+    was queued first is dropped for a new one.
     """
+    maxQueuedPerSender = 64  # Number of out of sequence transactions kept per sender
+    maxQueued = 4096  # Number of out of sequence transactions kept over all senders
+    generations = itertools.count()  # Generations of the pools of the process, never handed out twice
 
     def __init__(self):
         """
         Initializes a new transaction pool to hold the pending transactions.
         """
         self.transactions = []  # List to store the pending transactions in the pool
+        self.ids = set()  # Ids of the pending transactions
+        self.queued = {}  # Maps sender public keys to {nonce: transaction} waiting for the preceding transactions
+        self.queueOrder = OrderedDict()  # The (sender public key, nonce) of the queued transactions, oldest first
+        self.generation = next(TransactionPool.generations)  # Changes whenever the pending transactions change
 
     def addTransaction(self, transaction):
         """
@@ -18,6 +35,8 @@ class TransactionPool():
         :param transaction: The transaction object to be added to the pool
         """
         self.transactions.append(transaction)  # Adds the given transaction to the pool
+        self.ids.add(transaction.id)
+        self.generation = next(TransactionPool.generations)
 
     def transactionExists(self, transaction):
         """
@@ -26,10 +45,7 @@ class TransactionPool():
         :param transaction: The transaction to check for existence in the pool
         :return: True if the transaction is already in the pool, otherwise False
         """
-        for poolTransaction in self.transactions:
-            if poolTransaction.equals(transaction):  # Checks if the current pool transaction is equal to the given one
-                return True  # Returns True if the transaction already exists in the pool
-        return False  # Returns False if the transaction is not found in the pool
+        return transaction.id in self.ids
 
     def removeFromPool(self, transactions):
         """
@@ -37,15 +53,71 @@ class TransactionPool():
 
         :param transactions: A list of transactions to be removed from the pool
         """
-        newPoolTransactions = []  # A new list to store transactions that will remain in the pool
-        for poolTransaction in self.transactions:
-            insert = True  # Flag to determine if a transaction should be inserted into the new pool
-            for transaction in transactions:
-                if poolTransaction.equals(transaction):  # If the pool transaction is in the list of transactions to be removed
-                    insert = False  # Mark the transaction to not be added to the new pool
-            if insert:
-                newPoolTransactions.append(poolTransaction)  # Keep the transaction in the pool if it was not removed
-        self.transactions = newPoolTransactions  # Update the pool with the remaining transactions
+        removedIds = {transaction.id for transaction in transactions}
+        if not removedIds & self.ids:
+            return  # None of them is in the pool
+        # Keep the transactions that were not removed
+        self.transactions = [poolTransaction for poolTransaction in self.transactions if poolTransaction.id not in removedIds]
+        self.ids -= removedIds
+        self.generation = next(TransactionPool.generations)
+
+    def queueTransaction(self, transaction):
+        """
+        Keeps a transaction whose preceding transactions have not arrived yet.
+
+        :param transaction: The transaction, whose nonce is ahead of its sender's next nonce
+        :return: True if the transaction was queued, False if the sender's queue is full or has this nonce already
+        """
+        sender = transaction.senderPublicKey
+        senderQueue = self.queued.get(sender, {})
+        if transaction.nonce in senderQueue or len(senderQueue) >= TransactionPool.maxQueuedPerSender:
+            return False
+        if len(self.queueOrder) >= TransactionPool.maxQueued:
+            oldestSender, oldestNonce = self.queueOrder.popitem(last=False)[0]
+            self.takeQueued(oldestSender, oldestNonce)  # Makes room, the oldest has waited longest for its gap
+        self.queued.setdefault(sender, {})[transaction.nonce] = transaction
+        self.queueOrder[(sender, transaction.nonce)] = None
+        return True
+
+    def takeQueued(self, senderPublicKey, nonce):
+        """
+        Takes the queued transaction with the given nonce out of its sender's queue.
+
+        :param senderPublicKey: The public key of the sender
+        :param nonce: The nonce the sender's next transaction must have
+        :return: The transaction, or None if none with this nonce is queued
+        """
+        senderQueue = self.queued.get(senderPublicKey)
+        if not senderQueue:
+            return None
+        transaction = senderQueue.pop(nonce, None)
+        self.queueOrder.pop((senderPublicKey, nonce), None)
+        if not senderQueue:
+            del self.queued[senderPublicKey]
+        return transaction
+
+    def queuedTransactions(self):
+        """
+        :return: The queued transactions of every sender, oldest first
+        """
+        return [self.queued[sender][nonce] for sender, nonce in self.queueOrder]
+
+    def replace(self, transactions, queued):
+        """
+        Replaces the content of the pool after it was checked against a new chain state.
+
+        :param transactions: The pending transactions, each sender's in nonce order
+        :param queued: The transactions waiting for their preceding transactions, oldest first
+        """
+        self.transactions = []
+        self.ids = set()
+        self.queued = {}
+        self.queueOrder = OrderedDict()
+        self.generation = next(TransactionPool.generations)
+        for transaction in transactions:
+            self.addTransaction(transaction)
+        for transaction in queued:
+            self.queueTransaction(transaction)
 
     def forgingRequired(self):
         """
@@ -0,0 +1,27 @@
+class UndoRecord():
+    """
+    Previous values of the account and stake state changed by one block.
+
+    Only the accounts the block touched are recorded, so restoring the state before the
+    block costs time proportional to the block's changes, not to the size of the state.
+    """
+
+    __slots__ = ('balances', 'stakes', 'nonces')
+
+    def __init__(self, balances, stakes, nonces):
+        """
+        Initializes an undo record.
+
+        :param balances: Dictionary mapping public keys to their balance before the block, None if the account did not exist
+        :param stakes: Dictionary mapping public keys to their stake before the block, None if they had none
+        :param nonces: Dictionary mapping the senders' public keys to their nonce before the block, None if they had none
+        """
+        self.balances = balances
+        self.stakes = stakes
+        self.nonces = nonces
+
+    def publicKeys(self):
+        """
+        :return: The public keys of every account the block changed
+        """
+        return self.balances.keys() | self.stakes.keys() | self.nonces.keys()
@@ -1,33 +1,121 @@
-from Crypto.PublicKey import RSA  # Importing RSA key generation and management functions
 from Transaction import Transaction  # Importing the Transaction class to create and manage transactions
 from Block import Block  # Importing the Block class to create and manage blocks
 from BlockchainUtils import BlockchainUtils  # Importing utility functions for blockchain-related tasks
-from Crypto.Signature import PKCS1_v1_5  # Importing the RSA signature scheme used for signing and verifying data
+from RSASignatureScheme import RSASignatureScheme  # RSA-2048 signatures
+from Ed25519SignatureScheme import Ed25519SignatureScheme  # Ed25519 signatures
+from Tracer import tracer  # Process-wide tracer for hot-path timings
 
 class Wallet():
     """
     The Wallet class represents a digital wallet that can generate key pairs, sign data, 
-    create transactions, and manage blocks. It uses RSA for cryptographic operations.
+    create transactions, and manage blocks. It signs with one of the signature schemes,
+    RSA by default.
     """
+    schemes = {scheme.name: scheme for scheme in (RSASignatureScheme(), Ed25519SignatureScheme())}  # Supported signature schemes by name
+    defaultScheme = 'rsa'  # Scheme new keys are generated with, selected per network with `useScheme`
 
-    def __init__(self):
+    def __init__(self, file=None, scheme=None):
         """
-        Initializes the wallet by generating a new RSA key pair.
-        The key pair will be used for signing transactions and blocks.
+        Initializes the wallet, optionally with a key pair loaded from a file.
+
+        Without a file, a new key pair is generated the first time the wallet needs it.
+        Generating a 2048 bit RSA key takes hundreds of milliseconds, which is wasted when a
+        key file is loaded right after, and slows down starting many nodes at once.
+
+        :param file: Optional path to the file containing the private key
+        :param scheme: Name of the signature scheme a new key pair is generated with (defaults to `defaultScheme`)
+        """
+        self.scheme = Wallet.schemeNamed(scheme or Wallet.defaultScheme)  # Signature scheme of the key pair
+        self.key = None  # The key pair, generated on first use unless loaded from a file
+        self.publicKey = None  # The exported public key string, cached
+        self.nonce = 0  # Nonce of the next transaction of the wallet
+        if file is not None:
+            self.fromKey(file)
+
+    @staticmethod
+    def schemeNamed(name):
+        """
+        :param name: The name of a signature scheme
+        :return: The signature scheme
+        :raises ValueError: If there is no scheme with this name
+        """
+        if name not in Wallet.schemes:
+            raise ValueError(f'Unknown signature scheme {name}, expected one of {", ".join(Wallet.schemes)}')
+        return Wallet.schemes[name]
+
+    @staticmethod
+    def useScheme(name):
+        """
+        Selects the signature scheme the keys of this network are generated with.
+
+        Signatures are verified with the scheme of the signer's key, whatever the selection.
+
+        :param name: The name of the signature scheme
+        """
+        Wallet.defaultScheme = Wallet.schemeNamed(name).name
+
+    @staticmethod
+    def schemeOf(publicKeyString):
         """
-        self.keyPair = RSA.generate(2048)  # Generates a new RSA key pair of 2048 bits for the wallet
+        Finds the signature scheme of a public key from the way it is written.
+
+        :param publicKeyString: The public key string
+        :return: The signature scheme
+        :raises ValueError: If no scheme writes its keys this way
+        """
+        for scheme in Wallet.schemes.values():
+            if scheme.ownsPublicKey(publicKeyString):
+                return scheme
+        raise ValueError('Public key of an unknown signature scheme')
+
+    @property
+    def keyPair(self):
+        """
+        :return: The key pair of the wallet, generating one if the wallet has none yet
+        """
+        if self.key is None:
+            self.key = self.scheme.generate()
+        return self.key
+
+    @keyPair.setter
+    def keyPair(self, key):
+        self.key = key
+        self.publicKey = None  # Exported again from the new key
+
+    def hasKey(self):
+        """
+        :return: True if the wallet already holds a key pair, loaded or generated
+        """
+        return self.key is not None
 
     def fromKey(self, file):
         """
-        Loads an RSA key pair from a file.
+        Loads a key pair from a file, in the format of any signature scheme.
 
-        :param file: The path to the file containing the RSA private key
+        :param file: The path to the file containing the private key
         """
-        key = ''
         with open(file, 'r') as keyfile:
-            key = RSA.importKey(keyfile.read())  # Imports the RSA key from the specified file
-        self.keyPair = key  # Sets the key pair of the wallet to the imported key
+            keyString = keyfile.read()
+        for scheme in Wallet.schemes.values():
+            try:
+                key = scheme.importPrivateKey(keyString)  # Imports the key from the specified file
+            except (ValueError, IndexError, TypeError):
+                continue  # Not a key of this scheme
+            self.scheme = scheme
+            self.keyPair = key  # Sets the key pair of the wallet to the imported key
+            return
+        raise ValueError(f'{file} does not hold a private key of a supported signature scheme')
+
+    def toKey(self, file):
+        """
+        Writes the private key to a file that `fromKey` can load.
 
+        :param file: The path to the file to write
+        """
+        with open(file, 'w') as keyfile:
+            keyfile.write(self.scheme.exportPrivateKey(self.keyPair))
+
+    @tracer.stage('sign')
     def sign(self, data):
         """
         Signs the given data using the wallet's private key.
@@ -36,60 +124,70 @@ class Wallet():
         :return: The signature in hexadecimal format
         """
         dataHash = BlockchainUtils.hash(data)  # Generates the hash of the data to be signed
-        signatureSchemeObject = PKCS1_v1_5.new(self.keyPair)  # Initializes the RSA signature scheme using the private key
-        signature = signatureSchemeObject.sign(dataHash)  # Signs the hash of the data
+        signature = self.scheme.sign(self.keyPair, dataHash)  # Signs the hash of the data
         return signature.hex()  # Returns the signature in hexadecimal format for easier storage and transmission
 
     @staticmethod
+    @tracer.stage('signatureValid')
     def signatureValid(data, signature, publicKeyString):
         """
         Verifies the validity of a signature using a public key.
 
+        The signature is checked with the signature scheme of the public key.
+
         :param data: The data that was signed
         :param signature: The signature to be verified (in hexadecimal format)
-        :param publicKeyString: The public key in string format (PEM)
+        :param publicKeyString: The public key in string format (PEM for RSA, hex for Ed25519)
         :return: True if the signature is valid, otherwise False
         """
+        scheme = Wallet.schemeOf(publicKeyString)  # The key tells how it signs
         signature = bytes.fromhex(signature)  # Converts the hexadecimal signature back into bytes
         dataHash = BlockchainUtils.hash(data)  # Generates the hash of the data to be verified
-        publicKey = RSA.importKey(publicKeyString)  # Imports the public key from the provided string (PEM format)
-        signatureSchemeObject = PKCS1_v1_5.new(publicKey)  # Initializes the RSA signature scheme using the public key
-        signatureValid = signatureSchemeObject.verify(dataHash, signature)  # Verifies the signature against the data hash
-        return signatureValid  # Returns True if the signature is valid, otherwise False
+        return scheme.verify(publicKeyString, dataHash, signature)  # Returns True if the signature is valid, otherwise False
 
     def publicKeyString(self):
         """
-        Exports the wallet's public key as a PEM-encoded string.
+        Exports the wallet's public key as a string.
 
-        :return: The public key in PEM format as a string
+        :return: The public key, in PEM format for RSA and in hex for Ed25519
         """
-        publicKeyString = self.keyPair.publickey().exportKey('PEM').decode('utf-8')  # Exports the public key in PEM format
-        return publicKeyString  # Returns the public key as a string
+        if self.publicKey is None:  # Exported once, every transaction and block of the wallet carries it
+            self.publicKey = self.scheme.publicKeyString(self.keyPair)
+        return self.publicKey  # Returns the public key as a string
 
-    def createTransaction(self, receiver, amount, type):
+    def createTransaction(self, receiver, amount, type, nonce=None):
         """
         Creates a new transaction, signs it, and returns the signed transaction.
 
+        Transactions are numbered by the wallet's nonce counter, which starts at 0. A wallet
+        whose key already sent transactions must have its counter set to the account's next
+        nonce first, or be given the nonce.
+
         :param receiver: The public key of the transaction receiver
         :param amount: The amount to be transferred
         :param type: The type of transaction (e.g., 'transfer', 'swap')
+        :param nonce: Optional nonce of the transaction, the counter continues after it
         :return: The signed transaction object
         """
-        transaction = Transaction(self.publicKeyString(), receiver, amount, type)  # Creates a new transaction
+        if nonce is not None:
+            self.nonce = nonce
+        transaction = Transaction(self.publicKeyString(), receiver, amount, type, self.nonce)  # Creates a new transaction
+        self.nonce += 1
         signature = self.sign(transaction.payload())  # Signs the transaction payload (without signature)
         transaction.sign(signature)  # Adds the signature to the transaction
         return transaction  # Returns the signed transaction
 
-    def createBlock(self, transactions, lastHash, blockCount):
+    def createBlock(self, transactions, lastHash, blockCount, stateRoot=''):
         """
         Creates a new block containing the given transactions, signs it, and returns the signed block.
 
         :param transactions: The list of transactions to include in the block
         :param lastHash: The hash of the previous block (used to link blocks)
         :param blockCount: The block number (or height) of the new block
+        :param stateRoot: The root of the state tree after executing the transactions
         :return: The signed block object
         """
-        block = Block(transactions, lastHash, self.publicKeyString(), blockCount)  # Creates a new block with the given parameters
+        block = Block(transactions, lastHash, self.publicKeyString(), blockCount, stateRoot)  # Creates a new block with the given parameters
         signature = self.sign(block.payload())  # Signs the block payload (without signature)
         block.sign(signature)  # Adds the signature to the block
         return block  # Returns the signed block
@@ -7,7 +7,9 @@ import pprint  # Importing pprint for pretty-printing
 from BlockchainUtils import BlockchainUtils  # Importing Blockchain utility functions
 from AccountModel import AccountModel  # Importing the AccountModel class
 from Node import Node  # Importing the Node class
+from ExecutionEngine import ExecutionEngine  # Importing the engine executing the blocks
 import sys  # Importing sys for command-line argument handling
+import os  # Importing os to read the network configuration from the environment
 
 if __name__ == '__main__':
     """
@@ -20,17 +22,22 @@ if __name__ == '__main__':
     ip = sys.argv[1]  # The IP address of the node
     port = int(sys.argv[2])  # The port for the node
     apiPort = int(sys.argv[3])  # The port for the node's API
-    keyFile = None  # Initialize the key file variable as None
+    keyFiles = sys.argv[4:]  # Optional private key files of the validators this node forges for
+    Wallet.useScheme(os.environ.get('SIGNATURE_SCHEME', Wallet.defaultScheme))  # Signature scheme of the network's new keys
 
-    # Check if a key file path was provided as an argument
-    if len(sys.argv) > 4:
-        keyFile = sys.argv[4]  # If provided, store the path to the key file
+    retention = os.environ.get('BLOCK_RETENTION')  # Number of recent blocks kept in memory, all by default
+    pruned = os.environ.get('PRUNE', '') not in ('', '0')  # Drops old blocks instead of archiving them
+    indexed = os.environ.get('ACCOUNT_INDEX', '') not in ('', '0')  # Indexes the history of every account
+    executionWorkers = os.environ.get('EXECUTION_WORKERS')  # Worker processes for large blocks, none by default
+    if executionWorkers:
+        Blockchain.executionEngine = ExecutionEngine(int(executionWorkers))
+        Blockchain.executionEngine.start()  # Before the node takes blocks and requests
 
     # Create a new instance of the Node class with the provided configuration
-    node = Node(ip, port, keyFile)
+    node = Node(ip, port, keyFiles, int(retention) if retention else None, pruned, indexed)
     
     # Start the node's peer-to-peer (P2P) service
     node.startP2P()
     
     # Start the node's API service on the specified API port
-    node.startAPI(apiPort)
+    node.startAPI(apiPort, os.environ.get('OPERATOR_TOKEN') or None)  # Staking with the node's keys needs the token
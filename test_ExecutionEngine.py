@@ -0,0 +1,94 @@
+import random
+import pytest
+from Blockchain import Blockchain
+from ExecutionEngine import ExecutionEngine
+from KeyTable import KeyTable
+from Transaction import Transaction
+
+
+def randomBlocks(seed, blockCount=6, accounts=40, transactionsPerBlock=25):
+    """
+    Builds blocks of random transactions among few accounts, so senders are shared,
+    with self-transfers, stakes, float amounts and the senders' nonces in sequence. The
+    blocks still split into several conflict groups.
+
+    :param seed: The seed of the random choices
+    :param blockCount: Number of blocks
+    :param accounts: Number of accounts the transactions are between
+    :param transactionsPerBlock: Number of transactions per block
+    :return: The blocks as lists of transactions
+    """
+    generator = random.Random(seed)
+    keys = ['differential-' + str(seed) + '-' + str(index) for index in range(accounts)]
+    nonces = dict.fromkeys(keys, 0)
+    blocks = []
+    for _ in range(blockCount):
+        transactions = []
+        for _ in range(transactionsPerBlock):
+            sender = generator.choice(keys[:accounts // 2])  # Half the accounts send everything
+            kind = generator.random()
+            if kind < 0.2:
+                receiver, type, amount = sender, 'STAKE', generator.randint(1, 20)
+            elif kind < 0.3:
+                receiver, type, amount = sender, 'TRANSFER', generator.uniform(0, 10)  # Self-transfer
+            else:
+                receiver = generator.choice(keys)
+                type = generator.choice(('TRANSFER', 'EXCHANGE'))
+                amount = generator.choice((generator.randint(1, 100), generator.uniform(0, 100), 0.1, 0.2, 0.3))
+            transactions.append(Transaction(sender, receiver, amount, type, nonces[sender]))
+            nonces[sender] += 1
+        blocks.append(transactions)
+    return blocks
+
+
+def executeSequentially(blockchain, transactions):
+    """
+    Executes transactions one after the other on the balances and stakes, like blocks
+    were executed before the execution engine.
+
+    :param blockchain: The blockchain whose state changes
+    :param transactions: The transactions of a block
+    """
+    touched = set()
+    for transaction in transactions:
+        sender, receiver, amount = transaction.senderPublicKey, transaction.receiverPublicKey, transaction.amount
+        if transaction.type == 'STAKE':
+            if sender == receiver:
+                blockchain.pos.update(sender, amount)
+                blockchain.accountModel.updateBalance(sender, -amount)
+        else:
+            blockchain.accountModel.updateBalance(sender, -amount)
+            blockchain.accountModel.updateBalance(receiver, amount)
+        blockchain.accountModel.nonces[KeyTable.digest(sender)] = transaction.nonce + 1
+        touched.update((sender, receiver))
+    blockchain.updateStateTree(touched)
+
+
+def state(blockchain):
+    """
+    :return: The balances, stakes (in the order lots are drawn in), nonces and state root of a blockchain
+    """
+    return (dict(blockchain.accountModel.balances), list(blockchain.pos.stakers.items()),
+            dict(blockchain.accountModel.nonces), blockchain.stateRoot())
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+@pytest.mark.parametrize('seed', range(4))
+def test_engine_matches_sequential_execution(monkeypatch, seed, workers):
+    engine = ExecutionEngine(workers)
+    monkeypatch.setattr(ExecutionEngine, 'parallelThreshold', 1)  # Small blocks use the workers too
+    monkeypatch.setattr(Blockchain, 'executionEngine', engine)
+    sequential, executed = Blockchain(), Blockchain()
+    initial = state(executed)
+    undoRecords = []
+    try:
+        for transactions in randomBlocks(seed):
+            executeSequentially(sequential, transactions)
+            undoRecords.append(executed.executeTransactions(transactions))
+            assert state(executed) == state(sequential)
+    finally:
+        if engine.executor is not None:
+            engine.executor.shutdown()
+    for undoRecord in reversed(undoRecords):
+        executed.restore(undoRecord)
+    assert state(executed) == initial